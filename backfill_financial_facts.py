@@ -0,0 +1,5 @@
+from src.models.ml_manager import MLManager
+
+if __name__ == "__main__":
+    # Fills financial_facts for documents analysed before the table existed
+    print(MLManager().backfill_financial_facts())
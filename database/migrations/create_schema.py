@@ -28,7 +28,11 @@ def create_schema():
                 ADD COLUMN IF NOT EXISTS processing_message TEXT,
                 ADD COLUMN IF NOT EXISTS processing_error TEXT,
                 ADD COLUMN IF NOT EXISTS processing_started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                ADD COLUMN IF NOT EXISTS processing_completed_at TIMESTAMP;
+                ADD COLUMN IF NOT EXISTS processing_completed_at TIMESTAMP,
+                -- Per-stage units done/total, throughput and ETA of the current ingest
+                ADD COLUMN IF NOT EXISTS processing_progress JSONB,
+                -- SHA-256 of the source file, used to skip filings already ingested
+                ADD COLUMN IF NOT EXISTS file_hash CHAR(64);
                 
                 -- Create other tables
                 CREATE TABLE IF NOT EXISTS processing_history (
@@ -49,10 +53,157 @@ def create_schema():
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 );
                 
+                -- Section text stored separately from documents.content; long
+                -- sections are split into several parts ordered by position
+                CREATE TABLE IF NOT EXISTS document_sections (
+                    id SERIAL PRIMARY KEY,
+                    document_id INTEGER REFERENCES documents(id) ON DELETE CASCADE,
+                    section_name VARCHAR(100) NOT NULL,
+                    position INTEGER NOT NULL,
+                    section_text TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+                
+                -- Chunks record where their text came from, so a reconcile can
+                -- re-chunk stored sections and only embed text it hasn't seen
+                CREATE TABLE IF NOT EXISTS document_chunks (
+                    id SERIAL PRIMARY KEY,
+                    document_id INTEGER REFERENCES documents(id) ON DELETE CASCADE,
+                    chunk_text TEXT NOT NULL,
+                    chunk_index INTEGER NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+                
+                ALTER TABLE document_chunks
+                ADD COLUMN IF NOT EXISTS section_name VARCHAR(100),
+                ADD COLUMN IF NOT EXISTS section_hash CHAR(64),
+                ADD COLUMN IF NOT EXISTS chunker_config VARCHAR(100),
+                ADD COLUMN IF NOT EXISTS text_hash CHAR(64);
+                
+                -- Section chunks are stored as a character range of their
+                -- section's text and only sliced out for search results;
+                -- chunk_text is kept for documents chunked without sections
+                ALTER TABLE document_chunks
+                ADD COLUMN IF NOT EXISTS section_id INTEGER REFERENCES document_sections(id) ON DELETE SET NULL,
+                ADD COLUMN IF NOT EXISTS start_offset INTEGER,
+                ADD COLUMN IF NOT EXISTS end_offset INTEGER,
+                ALTER COLUMN chunk_text DROP NOT NULL;
+                
+                -- Uncompressed TOAST lets substr() read just the slice it needs
+                ALTER TABLE document_sections ALTER COLUMN section_text SET STORAGE EXTERNAL;
+                
+                -- New section text is written as a new generation next to the
+                -- current one; a reconcile moves the chunks over and deletes the
+                -- old generation in one transaction, so chunk offsets always
+                -- point into the text they were cut from
+                ALTER TABLE document_sections
+                ADD COLUMN IF NOT EXISTS generation INTEGER NOT NULL DEFAULT 0,
+                ADD COLUMN IF NOT EXISTS section_hash CHAR(64);
+                
+                -- Durable job queue polled by run_worker.py. Workers claim rows
+                -- with FOR UPDATE SKIP LOCKED and hold them for a lease that
+                -- expires if the worker dies; failed jobs are retried with
+                -- backoff until max_attempts, then left in the 'dead' state
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id SERIAL PRIMARY KEY,
+                    job_type VARCHAR(50) NOT NULL,
+                    document_id INTEGER REFERENCES documents(id) ON DELETE CASCADE,
+                    payload JSONB NOT NULL DEFAULT '{}',
+                    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL DEFAULT 5,
+                    run_after TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    locked_by VARCHAR(255),
+                    locked_until TIMESTAMP,
+                    last_error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+                
+                -- Checkpoints of the ingest stage graph: one pickled artifact per
+                -- stage, reused while its input_hash still matches
+                CREATE TABLE IF NOT EXISTS stage_artifacts (
+                    id SERIAL PRIMARY KEY,
+                    document_id INTEGER REFERENCES documents(id) ON DELETE CASCADE,
+                    stage VARCHAR(50) NOT NULL,
+                    input_hash CHAR(64) NOT NULL,
+                    output_hash CHAR(64) NOT NULL,
+                    artifact BYTEA NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE (document_id, stage)
+                );
+                
+                -- Input hash without the stage version, so a stage can keep
+                -- artifacts whose inputs are unchanged across a version bump
+                ALTER TABLE stage_artifacts
+                ADD COLUMN IF NOT EXISTS data_hash CHAR(64);
+                
+                -- Stored analyses (SEC filing analysis, Sankey flow data, ...)
+                CREATE TABLE IF NOT EXISTS document_analyses (
+                    id SERIAL PRIMARY KEY,
+                    document_id INTEGER REFERENCES documents(id) ON DELETE CASCADE,
+                    analysis_type VARCHAR(50) NOT NULL,
+                    analysis_result TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+                
+                -- Endpoints read one analysis type of one document
+                CREATE INDEX IF NOT EXISTS idx_document_analyses_document_type
+                ON document_analyses (document_id, analysis_type);
+                
+                -- Parsed statement values, one row per document, statement,
+                -- line item and period, for scans across filings
+                CREATE TABLE IF NOT EXISTS financial_facts (
+                    id SERIAL PRIMARY KEY,
+                    document_id INTEGER REFERENCES documents(id) ON DELETE CASCADE,
+                    company VARCHAR(255),
+                    cik VARCHAR(20),
+                    statement VARCHAR(50) NOT NULL,
+                    line_item VARCHAR(100) NOT NULL,
+                    -- "FY2023" or "2023-Q3"; NULL when the table had no period headers
+                    period VARCHAR(20),
+                    fiscal_year SMALLINT,
+                    fiscal_quarter SMALLINT,
+                    value DOUBLE PRECISION NOT NULL
+                );
+                
+                CREATE INDEX IF NOT EXISTS idx_financial_facts_document
+                ON financial_facts (document_id);
+                
+                CREATE INDEX IF NOT EXISTS idx_financial_facts_company_period
+                ON financial_facts (company, fiscal_year, fiscal_quarter);
+                
+                CREATE INDEX IF NOT EXISTS idx_financial_facts_cik_period
+                ON financial_facts (cik, fiscal_year, fiscal_quarter);
+                
+                -- Screens: one line item across every company and period
+                CREATE INDEX IF NOT EXISTS idx_financial_facts_line_item_period
+                ON financial_facts (line_item, fiscal_year, fiscal_quarter);
+                
+                -- Files uploaded together in one /upload-batch/ request. A file
+                -- that was already known points at the existing document
+                CREATE TABLE IF NOT EXISTS upload_batches (
+                    id SERIAL PRIMARY KEY,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+                
+                CREATE TABLE IF NOT EXISTS upload_batch_documents (
+                    batch_id INTEGER REFERENCES upload_batches(id) ON DELETE CASCADE,
+                    position INTEGER NOT NULL,
+                    document_id INTEGER REFERENCES documents(id) ON DELETE CASCADE,
+                    filename VARCHAR(255),
+                    PRIMARY KEY (batch_id, position)
+                );
+                
                 -- Create indices
                 CREATE INDEX IF NOT EXISTS idx_documents_processing_status ON documents(processing_status);
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_file_hash ON documents(file_hash);
                 CREATE INDEX IF NOT EXISTS idx_processing_history_document_id ON processing_history(document_id);
                 CREATE INDEX IF NOT EXISTS idx_analysis_history_document_id ON analysis_history(document_id);
+                CREATE INDEX IF NOT EXISTS idx_document_sections_document_id ON document_sections(document_id, position);
+                CREATE INDEX IF NOT EXISTS idx_document_sections_generation ON document_sections(document_id, generation, position);
+                CREATE INDEX IF NOT EXISTS idx_document_chunks_document_id ON document_chunks(document_id, text_hash);
+                CREATE INDEX IF NOT EXISTS idx_jobs_runnable ON jobs(status, run_after) WHERE status IN ('queued', 'running');
             """)
             
             conn.commit()
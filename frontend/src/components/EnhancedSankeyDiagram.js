@@ -2,6 +2,21 @@
 import * as d3 from 'd3';
 import { sankey, sankeyLinkHorizontal } from 'd3-sankey';
 
+// The API sends nodes as names and links as parallel arrays; d3-sankey wants objects
+const toGraph = (data) => {
+  const nodes = data.nodes.map(d => (typeof d === 'string' ? { name: d } : { ...d }));
+  
+  if (Array.isArray(data.links)) {
+    return { nodes, links: data.links.map(d => ({ ...d })) };
+  }
+  
+  const { source, target, value, color } = data.links;
+  return {
+    nodes,
+    links: source.map((s, i) => ({ source: s, target: target[i], value: value[i], color: color[i] }))
+  };
+};
+
 const EnhancedSankeyDiagram = ({ data }) => {
   const sankeyRef = useRef(null);
   
@@ -58,10 +73,8 @@ const EnhancedSankeyDiagram = ({ data }) => {
       .extent([[0, 0], [width, height]]);
     
     // Process the data to ensure proper format
-    const processedData = {
-      nodes: graphData.nodes.map(d => ({...d})),
-      links: graphData.links.map(d => ({...d}))
-    };
+    const processedData = toGraph(graphData);
+    if (processedData.links.length === 0) return;
     
     // Generate the Sankey diagram
     const { nodes: sankeyNodes, links: sankeyLinks } = sankeyGenerator(processedData);
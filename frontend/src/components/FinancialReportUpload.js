@@ -67,11 +67,13 @@ function FinancialReportUpload() {
               try {
                 const docDetails = await api.getFinancialSummary(uploadResult.id);
                 if (docDetails) {
+                  // 'periods' holds the multi-period columns, not a statement
+                  const statements = Object.keys(docDetails.financial_data || {}).filter(key => key !== 'periods');
                   setUploadResult({
                     ...uploadResult,
                     document_id: uploadResult.id,
-                    sections: Object.keys(docDetails.financial_data || {}),
-                    tables_extracted: Object.keys(docDetails.financial_data || {}).length
+                    sections: statements,
+                    tables_extracted: statements.length
                   });
                 }
               } catch (err) {
@@ -16,6 +16,43 @@ export const api = {
     return response.data;
   },
   
+  async uploadDocuments(files) {
+    const formData = new FormData();
+    for (const file of files) {
+      formData.append("files", file);
+    }
+    
+    const response = await axios.post(`${API_URL}/documents/upload-batch/`, formData, {
+      headers: {
+        "Content-Type": "multipart/form-data",
+      },
+    });
+    return response.data;
+  },
+  
+  async getUploadBatchStatus(batchId) {
+    const response = await axios.get(`${API_URL}/documents/upload-batch/${batchId}`);
+    return response.data;
+  },
+  
+  async getFinancialFacts(filters = {}) {
+    // List filters go out as repeated keys (line_item=a&line_item=b)
+    const params = new URLSearchParams();
+    Object.entries(filters).forEach(([key, value]) => {
+      [].concat(value).forEach(item => params.append(key, item));
+    });
+    const response = await axios.get(`${API_URL}/documents/facts/`, { params });
+    return response.data;
+  },
+  
+  async compareDocuments(documentIds, periodType = 'annual') {
+    const params = new URLSearchParams();
+    documentIds.forEach(id => params.append('document_id', id));
+    params.append('period_type', periodType);
+    const response = await axios.get(`${API_URL}/documents/compare/`, { params });
+    return response.data;
+  },
+  
   async searchDocuments(query, limit = 5) {
     const response = await axios.post(`${API_URL}/documents/search/`, {
       query,
@@ -115,7 +152,12 @@ export const api = {
   // Get extended TLDR with more detailed summaries
   async getExtendedTLDR(documentId) {
     try {
-      const response = await axios.get(`${API_URL}/documents/extended-tldr/${documentId}`);
+      // The first request starts the summary; 202 means it is still being created
+      const url = `${API_URL}/documents/extended-tldr/${documentId}`;
+      let response = await axios.get(url, { params: { wait: 20 } });
+      while (response.status === 202) {
+        response = await axios.get(url, { params: { wait: 20 } });
+      }
       return response.data;
     } catch (error) {
       console.error("Error fetching extended TLDR:", error);
@@ -0,0 +1,17 @@
+import argparse
+import os
+
+from src.bulk_ingest import bulk_ingest
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest a directory or manifest of SEC filings")
+    parser.add_argument("sources", nargs="+", help="Directories of filings, filing paths, or manifest files (one path per line)")
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes; each loads its own copy of the models")
+    parser.add_argument("--streaming-ingest", action="store_true", help="Load PDFs from a page stream to bound memory (same as STREAMING_INGEST=1)")
+    args = parser.parse_args()
+
+    if args.streaming_ingest:
+        # Read by MLManager, including in worker processes
+        os.environ["STREAMING_INGEST"] = "1"
+
+    bulk_ingest(args.sources, workers=args.workers)
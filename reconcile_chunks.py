@@ -0,0 +1,18 @@
+import argparse
+
+from src.models.ml_manager import MLManager
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-chunk stored sections and embed only new chunk text")
+    parser.add_argument("document_ids", nargs="*", type=int, help="Documents to reconcile (default: all)")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    args = parser.parse_args()
+
+    ml_manager = MLManager(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+
+    if args.document_ids:
+        for document_id in args.document_ids:
+            print(f"Document {document_id}: {ml_manager.reconcile_chunks(document_id)}")
+    else:
+        print(ml_manager.reconcile_all_chunks())
@@ -0,0 +1,20 @@
+import argparse
+import os
+
+from src.worker import JobWorker
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a document ingest worker")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds to wait when the queue is empty")
+    parser.add_argument("--visibility-timeout", type=int, default=300, help="Seconds before an unrenewed job lease expires")
+    parser.add_argument("--streaming-ingest", action="store_true", help="Load PDFs from a page stream to bound memory (same as STREAMING_INGEST=1)")
+    args = parser.parse_args()
+
+    if args.streaming_ingest:
+        # Read by MLManager when the worker loads its models
+        os.environ["STREAMING_INGEST"] = "1"
+
+    JobWorker(
+        poll_interval=args.poll_interval,
+        visibility_timeout=args.visibility_timeout
+    ).run_forever()
@@ -1,12 +1,18 @@
-﻿from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, BackgroundTasks
+﻿from fastapi import APIRouter, Depends, HTTPException, File, Query, Request, UploadFile
+from fastapi.responses import JSONResponse
 from typing import Dict, Any, List, Optional
 from pydantic import BaseModel
 from typing import Dict, Any, List
-import os
-import uuid
-import shutil
-from datetime import datetime
+import json
+from starlette.concurrency import run_in_threadpool
 from ...models.ml_manager import MLManager
+from ...worker import JOB_PROCESS_DOCUMENT
+from ...utils.pgvector_db import PgVectorDB
+from ...utils.progress import summarize_progress
+from ..flows import load_financial_flow
+from ..response_cache import cached_response, response_cache
+from ..tldr import MAX_EXTENDED_TLDR_WAIT, ExtendedTLDRPending, load_extended_tldr, wait_for_extended_tldr
+from ..uploads import accept_batch_upload, accept_upload, summarize_batch
 from ...models.analysis.enhanced_report_summarizer import EnhancedReportSummarizer
 from ...models.analysis.financial_flow_analyzer import FinancialFlowAnalyzer
 from ..schemas.models import (
@@ -21,6 +27,9 @@ class ProcessingStatusResponse(BaseModel):
     progress: int
     message: Optional[str] = None
     error: Optional[str] = None
+    eta_seconds: Optional[float] = None
+    seconds_since_update: Optional[float] = None
+    stages: Optional[Dict[str, Any]] = None
 
 class AnalysisHistoryResponse(BaseModel):
     id: int
@@ -48,6 +57,10 @@ router = APIRouter()
 def get_ml_manager():
     return MLManager()
 
+def get_db():
+    # Status polling only needs the database, not the ML models
+    return PgVectorDB.from_env()
+
 def get_enhanced_summarizer():
     from ...models.analysis.enhanced_report_summarizer import EnhancedReportSummarizer
     return EnhancedReportSummarizer()
@@ -58,45 +71,119 @@ def get_flow_analyzer():
 
 @router.post("/upload/")
 async def upload_document(
+    request: Request,
     file: UploadFile = File(...),
-    ml_manager: MLManager = Depends(get_ml_manager)
+    db: PgVectorDB = Depends(get_db)
 ):
-    """Simplified upload function to avoid background tasks issue"""
-    # Create a temp directory if it doesn't exist
-    os.makedirs("temp", exist_ok=True)
-    
-    # Generate a unique filename
-    file_extension = os.path.splitext(file.filename)[1]
-    temp_file_path = f"temp/{str(uuid.uuid4())}{file_extension}"
+    """Save an upload and queue it for an ingest worker.
     
+    The file is streamed to disk in chunks (hashed on the way, and capped
+    at MAX_UPLOAD_BYTES) and the document id is returned at once; poll
+    /processing-status/{id} for progress.
+    """
     try:
-        # Save the uploaded file
-        with open(temp_file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Process document synchronously for now
-        result = ml_manager.process_document(temp_file_path)
-        
-        if result.get("status") != "success":
-            raise HTTPException(status_code=400, detail=result.get("message", "Failed to process document"))
-        
-        return {
-            "id": result["document_id"],
-            "title": result["title"],
-            "content": "Content stored successfully",
-            "file_type": os.path.splitext(file.filename)[1],
-            "upload_time": datetime.now().isoformat(),
-            "processing_status": "complete"
-        }
-            
+        return await accept_upload(request, file, db)
+    except HTTPException:
+        raise
     except Exception as e:
-        # Clean up the temp file if there's an error
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
-        
         print(f"Exception during document upload: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error uploading document: {str(e)}")
 
+@router.post("/upload-batch/")
+async def upload_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    db: PgVectorDB = Depends(get_db)
+):
+    """Save several uploads at once and queue them as one group.
+    
+    Files are deduplicated by content hash against each other and against
+    earlier uploads. Returns the batch id and each file's document id; poll
+    /upload-batch/{batch_id} for progress.
+    """
+    try:
+        return await accept_batch_upload(request, files, db)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Exception during batch upload: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error uploading documents: {str(e)}")
+
+@router.get("/upload-batch/{batch_id}")
+async def get_upload_batch_status(
+    batch_id: int,
+    db: PgVectorDB = Depends(get_db)
+):
+    """Get per-file and overall processing progress of a batch upload"""
+    batch = await run_in_threadpool(db.get_upload_batch, batch_id)
+    
+    if not batch:
+        raise HTTPException(status_code=404, detail="Upload batch not found")
+    
+    return summarize_batch(batch)
+
+@router.get("/facts/")
+async def get_financial_facts(
+    document_id: Optional[List[int]] = Query(None),
+    company: Optional[List[str]] = Query(None),
+    cik: Optional[List[str]] = Query(None),
+    statement: Optional[List[str]] = Query(None),
+    line_item: Optional[List[str]] = Query(None),
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    limit: int = Query(100000, ge=1, le=1000000),
+    db: PgVectorDB = Depends(get_db)
+):
+    """Financial facts across filings as columnar arrays, one entry per fact.
+    
+    Repeat a filter to match any of its values, e.g.
+    ?line_item=revenue&line_item=net_profit&year_from=2021
+    """
+    columns = await run_in_threadpool(
+        db.get_financial_facts,
+        document_ids=document_id, companies=company, ciks=cik, statements=statement,
+        line_items=line_item, year_from=year_from, year_to=year_to, limit=limit
+    )
+    
+    return {
+        "count": len(columns["value"]),
+        "columns": columns,
+    }
+
+@router.get("/compare/")
+async def compare_documents(
+    document_id: Optional[List[int]] = Query(None),
+    company: Optional[List[str]] = Query(None),
+    cik: Optional[List[str]] = Query(None),
+    period_type: str = "annual",
+    db: PgVectorDB = Depends(get_db),
+    flow_analyzer: FinancialFlowAnalyzer = Depends(get_flow_analyzer)
+):
+    """Margins, growth and peer percentiles for many filings in one table.
+    
+    Pick the peer set by document id, company or CIK (each repeatable),
+    e.g. ?document_id=3&document_id=7&document_id=12. Each filing is
+    compared on its latest fiscal year, or its latest quarter with
+    period_type=quarterly.
+    """
+    if not (document_id or company or cik):
+        raise HTTPException(status_code=400, detail="Give at least one document_id, company or cik")
+    if period_type not in flow_analyzer.PERIOD_TYPES:
+        raise HTTPException(status_code=400, detail=f"period_type must be one of {', '.join(flow_analyzer.PERIOD_TYPES)}")
+    
+    facts = await run_in_threadpool(
+        db.get_financial_facts,
+        document_ids=document_id, companies=company, ciks=cik,
+        line_items=flow_analyzer.PANEL_LINE_ITEMS
+    )
+    panel = await run_in_threadpool(flow_analyzer.compare_documents, facts, period_type)
+    
+    return {
+        "status": "success",
+        "documents": len(panel["rows"]),
+        **panel,
+    }
+
 @router.post("/search/", response_model=SearchResponse)
 async def search_documents(query: SearchQuery):
     results = ml_manager.search_similar_documents(query.query, limit=query.limit)
@@ -127,36 +214,54 @@ async def analyze_document(request: AnalysisRequest):
         # For now, return an error
         raise HTTPException(status_code=501, detail="Analysis by document ID not yet implemented")
 
+def load_financial_summary(db: PgVectorDB, document_id: int, missing: str) -> Dict[str, Any]:
+    """Stored financial data and TLDR of a document; raises 404 with `missing` if there are none"""
+    analysis = db.get_latest_analysis_result(document_id, 'sec_filing')
+    
+    if not analysis:
+        raise HTTPException(status_code=404, detail=missing)
+    
+    stored = json.loads(analysis['analysis_result'])
+    return {
+        "status": "success",
+        "financial_data": stored.get('financial_data', {}),
+        "summary": stored.get('tldr_summary', {})
+    }
+
 @router.get("/financial-summary/{document_id}", response_model=Dict[str, Any])
-async def get_financial_summary(document_id: int):
+async def get_financial_summary(
+    request: Request,
+    document_id: int,
+    db: PgVectorDB = Depends(get_db)
+):
     """Get financial summary for a document."""
-    result = ml_manager.get_financial_summary(document_id)
-    
-    if result.get("status") != "success":
-        raise HTTPException(status_code=404, detail=result.get("message", "Financial summary not found"))
+    def compute():
+        return load_financial_summary(db, document_id, "Financial summary not found")
     
-    return result
+    return await cached_response(request, db, document_id, "financial-summary", compute)
 
 @router.get("/tldr-summary/{document_id}", response_model=Dict[str, Any])
-async def get_tldr_summary(document_id: int):
+async def get_tldr_summary(
+    request: Request,
+    document_id: int,
+    db: PgVectorDB = Depends(get_db)
+):
     """Get TLDR summary for a document."""
-    result = ml_manager.get_financial_summary(document_id)
+    def compute():
+        return {"summary": load_financial_summary(db, document_id, "TLDR summary not found")["summary"]}
     
-    if result.get("status") != "success":
-        raise HTTPException(status_code=404, detail=result.get("message", "TLDR summary not found"))
-    
-    return {"summary": result.get("summary", {})}
+    return await cached_response(request, db, document_id, "tldr-summary", compute)
 
 # Endpoint to get processing status
 @router.get("/processing-status/{document_id}", response_model=ProcessingStatusResponse)
 async def get_processing_status(
     document_id: int,
-    ml_manager: MLManager = Depends(get_ml_manager)
+    db: PgVectorDB = Depends(get_db)
 ):
     """Get the current processing status of a document"""
     try:
-        # Check status in database
-        status = ml_manager.db.get_processing_status(document_id)
+        # Check status in database, off the event loop so polling never stalls other requests
+        status = await run_in_threadpool(db.get_processing_status, document_id)
         
         if not status:
             return ProcessingStatusResponse(
@@ -165,9 +270,24 @@ async def get_processing_status(
                 message="Document not found"
             )
         
-        # Convert status to progress percentage
+        # Real per-stage progress when the pipeline has reported any
+        summary = summarize_progress(status.get("progress"))
+        if summary and status["status"] != "complete":
+            return ProcessingStatusResponse(
+                status=status["status"],
+                progress=summary["percent"],
+                message=status.get("message", ""),
+                error=status.get("error", None),
+                eta_seconds=summary["eta_seconds"],
+                seconds_since_update=summary["seconds_since_update"],
+                stages=summary["stages"]
+            )
+        
+        # Otherwise convert status to progress percentage
         progress = 0
-        if status["status"] == "uploaded":
+        if status["status"] == "queued":
+            progress = 5
+        elif status["status"] == "uploaded":
             progress = 10
         elif status["status"] == "parsing":
             progress = 30
@@ -184,7 +304,8 @@ async def get_processing_status(
             status=status["status"],
             progress=progress,
             message=status.get("message", ""),
-            error=status.get("error", None)
+            error=status.get("error", None),
+            stages=summary["stages"] if summary else None
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error checking processing status: {str(e)}")
@@ -205,9 +326,9 @@ async def get_analysis_history(
         formatted_history = []
         for entry in history_entries:
             # Get section names if available
-            sections = []
+            sections = entry.get("section_names") or []
             try:
-                if entry.get("content"):
+                if not sections and entry.get("content"):
                     content_data = json.loads(entry["content"])
                     if isinstance(content_data, dict):
                         sections = list(content_data.keys())
@@ -230,80 +351,95 @@ async def get_analysis_history(
 # Endpoint to get financial flow for Sankey diagram
 @router.get("/financial-flow/{document_id}", response_model=FinancialFlowResponse)
 async def get_financial_flow(
+    request: Request,
     document_id: int,
+    stacked: bool = False,
     flow_analyzer: FinancialFlowAnalyzer = Depends(get_flow_analyzer),
-    ml_manager: MLManager = Depends(get_ml_manager)
+    db: PgVectorDB = Depends(get_db)
 ):
-    """Get financial flow data for Sankey diagram visualization"""
-    try:
-        # Get financial data from ML manager
-        financial_summary = ml_manager.get_financial_summary(document_id)
-        
-        if financial_summary.get('status') == 'error':
-            raise HTTPException(status_code=404, detail=financial_summary.get('message'))
-        
-        # Generate Sankey diagram data
-        flow_data = flow_analyzer.generate_sankey_data(financial_summary.get('financial_data', {}))
+    """Get financial flow data for Sankey diagram visualization.
+    
+    With `stacked`, every reported period is drawn side by side in one
+    diagram (when the filing has more than one).
+    """
+    def compute():
+        # Precomputed at ingest; only older documents are computed here, once
+        flow = load_financial_flow(db, flow_analyzer, document_id)
         
-        # Generate insights about the financial flows
-        insights = flow_analyzer.generate_flow_insights(financial_summary.get('financial_data', {}))
+        if flow is None:
+            raise HTTPException(status_code=404, detail="No financial data found for this document")
         
         return FinancialFlowResponse(
             status="success",
             document_id=document_id,
-            flow_data=flow_data,
-            insights=insights
+            flow_data=(stacked and flow.get("stacked_flow_data")) or flow["flow_data"],
+            insights=flow["insights"]
         )
+    
+    try:
+        return await cached_response(request, db, document_id, "financial-flow", compute,
+                                     version=flow_analyzer.FLOW_VERSION, params={"stacked": stacked})
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate financial flow: {str(e)}")
 
 # Endpoint to get extended TLDR summary
-@router.get("/extended-tldr/{document_id}", response_model=ExtendedTLDRResponse)
+@router.get("/extended-tldr/{document_id}", response_model=ExtendedTLDRResponse,
+            responses={202: {"description": "Still being created; poll the Location URL"}})
 async def get_extended_tldr(
+    request: Request,
     document_id: int,
-    summarizer: EnhancedReportSummarizer = Depends(get_enhanced_summarizer),
-    ml_manager: MLManager = Depends(get_ml_manager)
+    wait: float = Query(0, ge=0, le=MAX_EXTENDED_TLDR_WAIT),
+    db: PgVectorDB = Depends(get_db)
 ):
-    """Get enhanced and extended TLDR summary"""
-    try:
-        # Get document sections from the database
-        document = ml_manager.db.get_document(document_id)
-        
-        if not document:
-            raise HTTPException(status_code=404, detail=f"Document not found with ID {document_id}")
-        
-        # Extract sections from document content
-        sections = {}
-        try:
-            content = document.get("content", "{}")
-            sections = json.loads(content)
-        except json.JSONDecodeError:
-            # If not valid JSON, treat as a single section
-            sections = {"full_content": content}
-        
-        if not sections:
-            raise HTTPException(status_code=404, detail=f"Document sections not found for ID {document_id}")
+    """Get enhanced and extended TLDR summary.
+    
+    The summary is created once per document, by an ingest worker, and then
+    served from storage. While it is being created the request waits up to
+    `wait` seconds for it, then answers 202 with the URL to poll.
+    """
+    def compute():
+        extended_tldr = load_extended_tldr(db, document_id)
         
-        # Generate extended TLDR
-        extended_tldr = summarizer.create_extended_tldr(sections)
+        if extended_tldr is None:
+            raise ExtendedTLDRPending()
         
         return ExtendedTLDRResponse(
             status="success",
             document_id=document_id,
             extended_tldr=extended_tldr
         )
+    
+    try:
+        return await cached_response(request, db, document_id, "extended-tldr", compute)
+    except ExtendedTLDRPending:
+        pass
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to generate extended TLDR: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to get extended TLDR: {str(e)}")
+    
+    # Not created yet: join the request that is creating it, or start it
+    if await wait_for_extended_tldr(db, document_id, wait):
+        return await cached_response(request, db, document_id, "extended-tldr", compute)
+    
+    status_url = request.url.path
+    return JSONResponse(
+        status_code=202,
+        headers={"Location": status_url, "Retry-After": "5"},
+        content={
+            "status": "pending",
+            "document_id": document_id,
+            "message": "Extended TLDR is being created",
+            "status_url": status_url,
+        }
+    )
 
 # Add an endpoint to analyze document in background (for longer processes)
 @router.post("/analyze-background/{document_id}")
 async def analyze_document_background(
     document_id: int,
-    background_tasks: BackgroundTasks,
     ml_manager: MLManager = Depends(get_ml_manager)
 ):
     """Start a background analysis task for a document"""
@@ -314,20 +450,28 @@ async def analyze_document_background(
         if not document:
             raise HTTPException(status_code=404, detail=f"Document not found with ID {document_id}")
         
-        # Update status to processing
+        # Queue the analysis for an ingest worker (see run_worker.py)
+        job_id = ml_manager.db.enqueue_job(
+            JOB_PROCESS_DOCUMENT,
+            {'document_id': document_id},
+            document_id=document_id
+        )
+        
+        if not job_id:
+            raise HTTPException(status_code=500, detail="Failed to queue background analysis")
+        
         ml_manager.db.update_processing_status(
             document_id=document_id,
-            status="parsing",
-            message="Document analysis started in background"
+            status="queued",
+            message="Document analysis queued"
         )
-        
-        # Add task to background
-        background_tasks.add_task(ml_manager.process_document_background, document_id)
+        response_cache.invalidate(document_id)
         
         return {
             "status": "success",
-            "message": "Background analysis started",
-            "document_id": document_id
+            "message": "Background analysis queued",
+            "document_id": document_id,
+            "job_id": job_id
         }
     except HTTPException:
         raise
@@ -1,10 +1,18 @@
-﻿from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+﻿from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse
 from typing import Dict, Any, List, Optional
 from pydantic import BaseModel
+import json
 
 from ...models.analysis.enhanced_report_summarizer import EnhancedReportSummarizer
 from ...models.analysis.financial_flow_analyzer import FinancialFlowAnalyzer
 from ...models.ml_manager import MLManager
+from ...worker import JOB_PROCESS_DOCUMENT
+from ...utils.pgvector_db import PgVectorDB
+from ...utils.progress import summarize_progress
+from ..flows import load_financial_flow
+from ..response_cache import cached_response, response_cache
+from ..tldr import MAX_EXTENDED_TLDR_WAIT, ExtendedTLDRPending, load_extended_tldr, wait_for_extended_tldr
 
 # Models for request/response
 class AnalysisHistoryResponse(BaseModel):
@@ -20,6 +28,9 @@ class ProcessingStatusResponse(BaseModel):
     progress: int
     message: Optional[str] = None
     error: Optional[str] = None
+    eta_seconds: Optional[float] = None
+    seconds_since_update: Optional[float] = None
+    stages: Optional[Dict[str, Any]] = None
 
 class FinancialFlowResponse(BaseModel):
     status: str
@@ -39,6 +50,10 @@ router = APIRouter()
 def get_ml_manager():
     return MLManager()
 
+def get_db():
+    # Status polling only needs the database, not the ML models
+    return PgVectorDB.from_env()
+
 def get_enhanced_summarizer():
     return EnhancedReportSummarizer()
 
@@ -49,12 +64,12 @@ def get_flow_analyzer():
 @router.get("/processing-status/{document_id}", response_model=ProcessingStatusResponse)
 async def get_processing_status(
     document_id: int,
-    ml_manager: MLManager = Depends(get_ml_manager)
+    db: PgVectorDB = Depends(get_db)
 ):
     """Get the current processing status of a document"""
     try:
         # Check status in database
-        status = ml_manager.db.get_processing_status(document_id)
+        status = db.get_processing_status(document_id)
         
         if not status:
             return ProcessingStatusResponse(
@@ -63,9 +78,24 @@ async def get_processing_status(
                 message="Document not found"
             )
         
-        # Convert status to progress percentage
+        # Real per-stage progress when the pipeline has reported any
+        summary = summarize_progress(status.get("progress"))
+        if summary and status["status"] != "complete":
+            return ProcessingStatusResponse(
+                status=status["status"],
+                progress=summary["percent"],
+                message=status.get("message", ""),
+                error=status.get("error", None),
+                eta_seconds=summary["eta_seconds"],
+                seconds_since_update=summary["seconds_since_update"],
+                stages=summary["stages"]
+            )
+        
+        # Otherwise convert status to progress percentage
         progress = 0
-        if status["status"] == "uploaded":
+        if status["status"] == "queued":
+            progress = 5
+        elif status["status"] == "uploaded":
             progress = 10
         elif status["status"] == "parsing":
             progress = 30
@@ -82,7 +112,8 @@ async def get_processing_status(
             status=status["status"],
             progress=progress,
             message=status.get("message", ""),
-            error=status.get("error", None)
+            error=status.get("error", None),
+            stages=summary["stages"] if summary else None
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error checking processing status: {str(e)}")
@@ -103,9 +134,9 @@ async def get_analysis_history(
         formatted_history = []
         for entry in history_entries:
             # Get section names if available
-            sections = []
+            sections = entry.get("section_names") or []
             try:
-                if entry.get("content"):
+                if not sections and entry.get("content"):
                     content_data = json.loads(entry["content"])
                     if isinstance(content_data, dict):
                         sections = list(content_data.keys())
@@ -128,80 +159,95 @@ async def get_analysis_history(
 # Endpoint to get financial flow for Sankey diagram
 @router.get("/financial-flow/{document_id}", response_model=FinancialFlowResponse)
 async def get_financial_flow(
+    request: Request,
     document_id: int,
+    stacked: bool = False,
     flow_analyzer: FinancialFlowAnalyzer = Depends(get_flow_analyzer),
-    ml_manager: MLManager = Depends(get_ml_manager)
+    db: PgVectorDB = Depends(get_db)
 ):
-    """Get financial flow data for Sankey diagram visualization"""
-    try:
-        # Get financial data from ML manager
-        financial_summary = ml_manager.get_financial_summary(document_id)
-        
-        if financial_summary.get('status') == 'error':
-            raise HTTPException(status_code=404, detail=financial_summary.get('message'))
-        
-        # Generate Sankey diagram data
-        flow_data = flow_analyzer.generate_sankey_data(financial_summary.get('financial_data', {}))
+    """Get financial flow data for Sankey diagram visualization.
+    
+    With `stacked`, every reported period is drawn side by side in one
+    diagram (when the filing has more than one).
+    """
+    def compute():
+        # Precomputed at ingest; only older documents are computed here, once
+        flow = load_financial_flow(db, flow_analyzer, document_id)
         
-        # Generate insights about the financial flows
-        insights = flow_analyzer.generate_flow_insights(financial_summary.get('financial_data', {}))
+        if flow is None:
+            raise HTTPException(status_code=404, detail="No financial data found for this document")
         
         return FinancialFlowResponse(
             status="success",
             document_id=document_id,
-            flow_data=flow_data,
-            insights=insights
+            flow_data=(stacked and flow.get("stacked_flow_data")) or flow["flow_data"],
+            insights=flow["insights"]
         )
+    
+    try:
+        return await cached_response(request, db, document_id, "financial-flow", compute,
+                                     version=flow_analyzer.FLOW_VERSION, params={"stacked": stacked})
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate financial flow: {str(e)}")
 
 # Endpoint to get extended TLDR summary
-@router.get("/extended-tldr/{document_id}", response_model=ExtendedTLDRResponse)
+@router.get("/extended-tldr/{document_id}", response_model=ExtendedTLDRResponse,
+            responses={202: {"description": "Still being created; poll the Location URL"}})
 async def get_extended_tldr(
+    request: Request,
     document_id: int,
-    summarizer: EnhancedReportSummarizer = Depends(get_enhanced_summarizer),
-    ml_manager: MLManager = Depends(get_ml_manager)
+    wait: float = Query(0, ge=0, le=MAX_EXTENDED_TLDR_WAIT),
+    db: PgVectorDB = Depends(get_db)
 ):
-    """Get enhanced and extended TLDR summary"""
-    try:
-        # Get document sections from the database
-        document = ml_manager.db.get_document(document_id)
-        
-        if not document:
-            raise HTTPException(status_code=404, detail=f"Document not found with ID {document_id}")
-        
-        # Extract sections from document content
-        sections = {}
-        try:
-            content = document.get("content", "{}")
-            sections = json.loads(content)
-        except json.JSONDecodeError:
-            # If not valid JSON, treat as a single section
-            sections = {"full_content": content}
-        
-        if not sections:
-            raise HTTPException(status_code=404, detail=f"Document sections not found for ID {document_id}")
+    """Get enhanced and extended TLDR summary.
+    
+    The summary is created once per document, by an ingest worker, and then
+    served from storage. While it is being created the request waits up to
+    `wait` seconds for it, then answers 202 with the URL to poll.
+    """
+    def compute():
+        extended_tldr = load_extended_tldr(db, document_id)
         
-        # Generate extended TLDR
-        extended_tldr = summarizer.create_extended_tldr(sections)
+        if extended_tldr is None:
+            raise ExtendedTLDRPending()
         
         return ExtendedTLDRResponse(
             status="success",
             document_id=document_id,
             extended_tldr=extended_tldr
         )
+    
+    try:
+        return await cached_response(request, db, document_id, "extended-tldr", compute)
+    except ExtendedTLDRPending:
+        pass
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to generate extended TLDR: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to get extended TLDR: {str(e)}")
+    
+    # Not created yet: join the request that is creating it, or start it
+    if await wait_for_extended_tldr(db, document_id, wait):
+        return await cached_response(request, db, document_id, "extended-tldr", compute)
+    
+    status_url = request.url.path
+    return JSONResponse(
+        status_code=202,
+        headers={"Location": status_url, "Retry-After": "5"},
+        content={
+            "status": "pending",
+            "document_id": document_id,
+            "message": "Extended TLDR is being created",
+            "status_url": status_url,
+        }
+    )
 
 # Add an endpoint to analyze document in background (for longer processes)
 @router.post("/analyze-background/{document_id}")
 async def analyze_document_background(
     document_id: int,
-    background_tasks: BackgroundTasks,
     ml_manager: MLManager = Depends(get_ml_manager)
 ):
     """Start a background analysis task for a document"""
@@ -212,20 +258,28 @@ async def analyze_document_background(
         if not document:
             raise HTTPException(status_code=404, detail=f"Document not found with ID {document_id}")
         
-        # Update status to processing
+        # Queue the analysis for an ingest worker (see run_worker.py)
+        job_id = ml_manager.db.enqueue_job(
+            JOB_PROCESS_DOCUMENT,
+            {'document_id': document_id},
+            document_id=document_id
+        )
+        
+        if not job_id:
+            raise HTTPException(status_code=500, detail="Failed to queue background analysis")
+        
         ml_manager.db.update_processing_status(
             document_id=document_id,
-            status="parsing",
-            message="Document analysis started in background"
+            status="queued",
+            message="Document analysis queued"
         )
-        
-        # Add task to background
-        background_tasks.add_task(ml_manager.process_document_background, document_id)
+        response_cache.invalidate(document_id)
         
         return {
             "status": "success",
-            "message": "Background analysis started",
-            "document_id": document_id
+            "message": "Background analysis queued",
+            "document_id": document_id,
+            "job_id": job_id
         }
     except HTTPException:
         raise
@@ -0,0 +1,30 @@
+import json
+from typing import Any, Dict, Optional
+
+from ..models.analysis.financial_flow_analyzer import FinancialFlowAnalyzer
+from ..utils.pgvector_db import PgVectorDB
+
+
+def load_financial_flow(db: PgVectorDB, flow_analyzer: FinancialFlowAnalyzer,
+                        document_id: int) -> Optional[Dict[str, Any]]:
+    """Stored Sankey flow of a document, or None if it has no financial data.
+
+    Ingest stores the flow whenever the financial data changes, so this is
+    normally a single indexed read. Documents ingested before flows were
+    stored, or flows built by older flow code, are computed once from the
+    stored analysis and saved. Blocking, so call it from the thread pool.
+    """
+    stored = db.get_latest_analysis_result(document_id, 'financial_flow')
+    if stored:
+        flow = json.loads(stored['analysis_result'])
+        if flow.get('flow_version') == flow_analyzer.FLOW_VERSION:
+            return flow
+
+    analysis = db.get_latest_analysis_result(document_id, 'sec_filing')
+    if not analysis:
+        return None
+
+    financial_data = json.loads(analysis['analysis_result']).get('financial_data', {})
+    flow = flow_analyzer.build_flow(financial_data)
+    db.replace_analysis_result(document_id, 'financial_flow', json.dumps(flow))
+    return flow
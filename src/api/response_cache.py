@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
+
+from ..utils.pgvector_db import PgVectorDB
+
+# Responses kept in memory per API process
+RESPONSE_CACHE_ENTRIES = int(os.getenv("RESPONSE_CACHE_ENTRIES", 512))
+
+
+class ResponseCache:
+    """In-process LRU of serialized JSON responses and their ETags.
+
+    Keys start with the document id and the document's version (see
+    PgVectorDB.get_document_version), so a reprocessed document is looked
+    up under new keys and its old entries simply age out. Entries can also
+    be dropped right away with `invalidate`.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Tuple[str, bytes]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: Hashable, entry: Tuple[str, bytes]):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, document_id: int):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == document_id]:
+                del self._entries[key]
+
+
+# Shared by every router, so both copies of an endpoint hit the same entries
+response_cache = ResponseCache()
+
+
+def serialize(payload: Any) -> Tuple[str, bytes]:
+    """JSON body of a response and its strong ETag (a hash of the body)"""
+    body = json.dumps(jsonable_encoder(payload), separators=(",", ":")).encode("utf-8")
+    return f'"{hashlib.sha256(body).hexdigest()}"', body
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    # If-None-Match uses weak comparison, so a W/ prefix doesn't matter
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+async def cached_response(request: Request, db: PgVectorDB, document_id: int, endpoint: str,
+                          compute: Callable[[], Any], version: str = "1",
+                          params: Optional[Dict[str, Any]] = None) -> Response:
+    """Serve a document's derived result from the response cache, with ETag revalidation.
+
+    `compute` builds the payload on a miss, on the thread pool; any
+    HTTPException it raises is passed on and nothing is cached. `version`
+    names the code that builds the payload (bump it when the output
+    changes), and `params` holds the query parameters that select between
+    payloads. Documents that are still being processed are computed on
+    every request and not cached.
+    """
+    document_version = await run_in_threadpool(db.get_document_version, document_id)
+
+    key = None
+    entry = None
+    if document_version is not None:
+        key = (document_id, document_version, endpoint, version, tuple(sorted((params or {}).items())))
+        entry = response_cache.get(key)
+
+    if entry is None:
+        entry = serialize(await run_in_threadpool(compute))
+        if key is not None:
+            response_cache.put(key, entry)
+
+    etag, body = entry
+    # no-cache: clients keep the body but revalidate, so a reprocess is seen at once
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=body, media_type="application/json", headers=headers)
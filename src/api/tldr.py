@@ -0,0 +1,110 @@
+import asyncio
+import json
+import os
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from ..utils.pgvector_db import PgVectorDB
+from ..worker import JOB_CREATE_EXTENDED_TLDR
+
+# Longest a request may wait for an extended TLDR before getting a 202
+MAX_EXTENDED_TLDR_WAIT = float(os.getenv("MAX_EXTENDED_TLDR_WAIT", 60))
+
+# Seconds between checks for a queued extended TLDR
+EXTENDED_TLDR_POLL_INTERVAL = float(os.getenv("EXTENDED_TLDR_POLL_INTERVAL", 1.0))
+
+# One follower task per pending (document id, analysis type) in this process
+_in_flight: Dict[Tuple[int, str], asyncio.Task] = {}
+
+# Requests currently waiting on each follower; a follower nobody waits on stops
+_waiting: Dict[Tuple[int, str], int] = {}
+
+
+class ExtendedTLDRPending(Exception):
+    """The extended TLDR of a document has not been stored yet"""
+
+
+def load_extended_tldr(db: PgVectorDB, document_id: int) -> Optional[Dict[str, Any]]:
+    """Stored extended TLDR of a document, or None. Blocking, so call it from the thread pool."""
+    stored = db.get_latest_analysis_result(document_id, 'enhanced_tldr')
+    return json.loads(stored['analysis_result']) if stored else None
+
+
+async def wait_for_extended_tldr(db: PgVectorDB, document_id: int, timeout: float) -> bool:
+    """Make sure the extended TLDR is being created and wait up to `timeout` seconds for it.
+
+    The summary is created once, by an ingest worker. Concurrent requests for
+    the same document share a single job, which is deduplicated in the
+    database across API processes, and within a process they also share one
+    task that follows it. Returns True once the TLDR is stored, False if it is
+    still being created or the document hasn't finished ingesting; raises 404 for unknown documents and 500 if the job
+    gave up.
+    """
+    key = (document_id, 'enhanced_tldr')
+    task = _in_flight.get(key)
+    # A follower that just gave up may not have been removed yet
+    if task is None or task.done():
+        task = _in_flight[key] = asyncio.ensure_future(_follow(db, document_id, key))
+        task.add_done_callback(lambda done: _finished(key, done))
+
+    _waiting[key] = _waiting.get(key, 0) + 1
+    try:
+        # Shielded so a caller that stops waiting leaves the task to the others
+        return await asyncio.wait_for(asyncio.shield(task), timeout)
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        _waiting[key] -= 1
+        if not _waiting[key]:
+            del _waiting[key]
+
+
+async def _follow(db: PgVectorDB, document_id: int, key: Tuple[int, str]) -> bool:
+    """Queue the extended TLDR job, if it is not queued yet, and wait until it has stored its result.
+
+    Returns True once it is stored, or False as soon as no request is
+    waiting any more; the job itself keeps running, and the next request
+    starts a new follower for it. Documents that are still being ingested
+    get no job yet and return False right away.
+    """
+    status = await run_in_threadpool(db.get_processing_status, document_id)
+    if not status:
+        raise HTTPException(status_code=404, detail=f"Document not found with ID {document_id}")
+    if status['status'] != 'complete':
+        # The job needs the ingested sections; queued now it could give up
+        # before the ingest finishes, so the caller just gets a 202 for now
+        return False
+
+    job_id = await run_in_threadpool(
+        db.enqueue_unique_job, JOB_CREATE_EXTENDED_TLDR, {'document_id': document_id}, document_id
+    )
+    if not job_id:
+        raise HTTPException(status_code=500, detail="Failed to queue extended TLDR")
+
+    while _waiting.get(key):
+        if await run_in_threadpool(load_extended_tldr, db, document_id) is not None:
+            return True
+
+        job = await run_in_threadpool(db.get_job, job_id)
+        if job and job['status'] == 'dead':
+            raise HTTPException(status_code=500, detail=f"Failed to generate extended TLDR: {job['last_error']}")
+        if job and job['status'] == 'complete':
+            # Finished between the two reads; one more look settles it
+            if await run_in_threadpool(load_extended_tldr, db, document_id) is not None:
+                return True
+            raise HTTPException(status_code=500, detail="Extended TLDR job finished without a result")
+
+        await asyncio.sleep(EXTENDED_TLDR_POLL_INTERVAL)
+
+    return False
+
+
+def _finished(key: Tuple[int, str], task: asyncio.Task):
+    # A newer follower may already have taken the key
+    if _in_flight.get(key) is task:
+        del _in_flight[key]
+    # Nobody may be waiting any more; don't leave the error unretrieved
+    if not task.cancelled():
+        task.exception()
@@ -0,0 +1,282 @@
+import hashlib
+import os
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from ..models.ml_manager import MLManager
+from ..utils.pgvector_db import PgVectorDB
+from ..utils.progress import summarize_progress
+from ..worker import JOB_PROCESS_BATCH, JOB_PROCESS_SEC_FILING, JOB_PROCESS_STANDARD_DOCUMENT
+
+# Largest upload accepted, in bytes (default 200 MB)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 200 * 1024 * 1024))
+
+# Most files accepted in one /upload-batch/ request
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", 50))
+
+# Bytes read from the request per step while saving an upload
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Uploaded files wait here until a worker has processed them
+UPLOAD_DIR = os.path.abspath(os.getenv("UPLOAD_DIR", "temp"))
+
+
+def check_content_length(request: Request, max_bytes: int = MAX_UPLOAD_BYTES):
+    """Reject a request whose declared size is already over the limit"""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds the {max_bytes} byte limit")
+
+
+async def save_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> Tuple[str, str, int]:
+    """Stream an upload to UPLOAD_DIR in chunks, hashing it on the way.
+
+    Disk writes run on the thread pool so the event loop is never blocked.
+    Returns (path, sha256, size); raises 413 and removes the partial file
+    once the upload grows past `max_bytes`.
+    """
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+    file_extension = os.path.splitext(file.filename or "")[1]
+    # Absolute path, since a worker in another directory will read the file
+    path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4()}{file_extension}")
+
+    digest = hashlib.sha256()
+    size = 0
+
+    buffer = await run_in_threadpool(open, path, "wb")
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+
+            size += len(chunk)
+            if size > max_bytes:
+                raise HTTPException(status_code=413, detail=f"Upload exceeds the {max_bytes} byte limit")
+
+            digest.update(chunk)
+            await run_in_threadpool(buffer.write, chunk)
+    except BaseException:
+        await run_in_threadpool(buffer.close)
+        await run_in_threadpool(_remove, path)
+        raise
+
+    await run_in_threadpool(buffer.close)
+    return path, digest.hexdigest(), size
+
+
+def register_uploads(db: PgVectorDB, uploads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Register saved uploads as documents, deduplicating them by SHA-256.
+
+    Each upload needs 'path', 'filename', 'file_hash' and 'size'. Returns
+    one response entry per upload. A file that is already known, from an
+    earlier upload or earlier in the same list, is not processed again: the
+    existing document is returned and the copy removed, unless that document
+    failed. Entries with 'process' set still need a job. Blocking, so call
+    it from the thread pool.
+    """
+    registered = db.register_documents([
+        {
+            'title': os.path.splitext(upload['filename'])[0],
+            'file_type': os.path.splitext(upload['filename'])[1].lower(),
+            'file_hash': upload['file_hash'],
+        }
+        for upload in uploads
+    ])
+    if any(upload['file_hash'] not in registered for upload in uploads):
+        for upload in uploads:
+            _remove(upload['path'])
+        raise HTTPException(status_code=500, detail="Failed to store document")
+
+    entries = []
+    claimed = set()
+    for upload in uploads:
+        document = registered[upload['file_hash']]
+        title, file_extension = os.path.splitext(upload['filename'])
+
+        process = document['id'] not in claimed and (document['created'] or document['processing_status'] == 'error')
+        claimed.add(document['id'])
+        if not process:
+            # Already processed or on its way; this copy isn't needed
+            _remove(upload['path'])
+
+        entries.append({
+            "id": document['id'],
+            "title": title,
+            "file_type": file_extension,
+            "file_hash": upload['file_hash'],
+            "size_bytes": upload['size'],
+            "upload_time": datetime.now().isoformat(),
+            "duplicate": not document['created'] or not process,
+            "processing_status": (
+                "complete" if document['processing_status'] == 'complete' and not process else "background"
+            ),
+            "process": process,
+            "file_path": upload['path'],
+        })
+
+    for entry in entries:
+        if entry['process']:
+            db.update_processing_status(
+                document_id=entry['id'],
+                status="queued",
+                message="Waiting for an ingest worker"
+            )
+
+    return entries
+
+
+def queue_upload(db: PgVectorDB, path: str, filename: str, file_hash: str, size: int) -> Dict[str, Any]:
+    """Register a saved upload as a document and queue it for a worker.
+
+    Blocking, so call it from the thread pool.
+    """
+    entry = register_uploads(db, [{'path': path, 'filename': filename, 'file_hash': file_hash, 'size': size}])[0]
+
+    if entry.pop('process'):
+        # Hand the heavy work to the durable job queue (see run_worker.py)
+        job_type = JOB_PROCESS_SEC_FILING if MLManager._is_sec_filing(path) else JOB_PROCESS_STANDARD_DOCUMENT
+        job_id = db.enqueue_job(job_type, {'file_path': path, 'document_id': entry['id']}, document_id=entry['id'])
+
+        if not job_id:
+            _fail_unqueued(db, [entry])
+            raise HTTPException(status_code=500, detail="Failed to queue document for processing")
+        entry["job_id"] = job_id
+
+    del entry['file_path']
+    return entry
+
+
+def queue_batch(db: PgVectorDB, uploads: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Register the files of a batch upload and queue the new ones as a single job.
+
+    One worker then ingests them side by side, batching their embedding and
+    summarization calls together. Blocking, so call it from the thread pool.
+    """
+    entries = register_uploads(db, uploads)
+
+    batch_id = db.create_upload_batch([
+        {'document_id': entry['id'], 'filename': upload['filename']}
+        for entry, upload in zip(entries, uploads)
+    ])
+    if not batch_id:
+        _fail_unqueued(db, [entry for entry in entries if entry['process']])
+        raise HTTPException(status_code=500, detail="Failed to store upload batch")
+
+    to_process = [
+        {'document_id': entry['id'], 'file_path': entry['file_path']}
+        for entry in entries if entry['process']
+    ]
+
+    job_id = None
+    if to_process:
+        job_id = db.enqueue_job(JOB_PROCESS_BATCH, {'batch_id': batch_id, 'documents': to_process})
+        if not job_id:
+            _fail_unqueued(db, [entry for entry in entries if entry['process']])
+            raise HTTPException(status_code=500, detail="Failed to queue documents for processing")
+
+    for entry in entries:
+        del entry['process'], entry['file_path']
+
+    return {
+        "batch_id": batch_id,
+        "job_id": job_id,
+        "upload_time": datetime.now().isoformat(),
+        "documents": entries,
+    }
+
+
+async def accept_upload(request: Request, file: UploadFile, db: Optional[PgVectorDB] = None) -> Dict[str, Any]:
+    """Save an upload and queue it, returning the document id without waiting for processing"""
+    check_content_length(request)
+    path, file_hash, size = await save_upload(file)
+    return await run_in_threadpool(queue_upload, db or PgVectorDB.from_env(), path, file.filename or path, file_hash, size)
+
+
+async def accept_batch_upload(request: Request, files: List[UploadFile],
+                              db: Optional[PgVectorDB] = None) -> Dict[str, Any]:
+    """Save the files of a batch upload and queue them as one group"""
+    if not files:
+        raise HTTPException(status_code=400, detail="No files uploaded")
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_FILES} files per batch")
+    check_content_length(request, MAX_UPLOAD_BYTES * len(files))
+
+    uploads = []
+    try:
+        for file in files:
+            path, file_hash, size = await save_upload(file)
+            uploads.append({'path': path, 'filename': file.filename or path, 'file_hash': file_hash, 'size': size})
+    except BaseException:
+        for upload in uploads:
+            await run_in_threadpool(_remove, upload['path'])
+        raise
+
+    return await run_in_threadpool(queue_batch, db or PgVectorDB.from_env(), uploads)
+
+
+def summarize_batch(batch: Dict[str, Any]) -> Dict[str, Any]:
+    """Per-file status of a batch upload plus overall counts, percent and ETA"""
+    documents = []
+    counts = {}
+    percents = []
+    eta_seconds = None
+
+    for row in batch['documents']:
+        status = row['processing_status']
+        counts[status] = counts.get(status, 0) + 1
+
+        summary = summarize_progress(row['processing_progress'])
+        if status == 'complete':
+            percent = 100
+        elif summary and status != 'error':
+            percent = summary['percent']
+        else:
+            percent = 0
+        percents.append(percent)
+
+        if summary and summary['eta_seconds'] is not None and status not in ('complete', 'error'):
+            eta_seconds = max(eta_seconds or 0.0, summary['eta_seconds'])
+
+        documents.append({
+            "id": row['document_id'],
+            "filename": row['filename'],
+            "title": row['title'],
+            "status": status,
+            "progress": percent,
+            "message": row['processing_message'],
+            "error": row['processing_error'],
+            "eta_seconds": summary['eta_seconds'] if summary else None,
+        })
+
+    return {
+        "batch_id": batch['id'],
+        "created_at": str(batch['created_at']),
+        "progress": round(sum(percents) / len(percents)) if percents else 0,
+        "eta_seconds": eta_seconds,
+        "status_counts": counts,
+        "complete": all(row['processing_status'] in ('complete', 'error') for row in batch['documents']),
+        "documents": documents,
+    }
+
+
+def _remove(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _fail_unqueued(db: PgVectorDB, entries: List[Dict[str, Any]]):
+    """Mark registered documents that got no job as failed, so uploading them again retries them"""
+    for entry in entries:
+        _remove(entry['file_path'])
+        db.update_processing_status(
+            document_id=entry['id'],
+            status="error",
+            message="Failed to queue document for processing",
+            error="No ingest job could be queued"
+        )
@@ -0,0 +1,208 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, List, Optional
+
+from .models.processing.edgar_submission import EdgarSubmissionReader
+from .models.stage_pipeline import file_sha256
+from .utils.pgvector_db import PgVectorDB
+
+# File types the SEC filing processor can read
+SUPPORTED_EXTENSIONS = ('.pdf', '.htm', '.html', '.txt')
+
+# One MLManager per worker process, loaded by the pool initializer
+_ml_manager = None
+
+
+def collect_files(sources: Iterable[str]) -> List[str]:
+    """Expand directories (recursively) and manifest files into a list of filing paths.
+
+    A manifest is a text file with one path per line; blank lines and lines
+    starting with '#' are ignored, and relative paths are resolved against
+    the manifest's directory.
+    """
+    files = []
+
+    for source in sources:
+        if os.path.isdir(source):
+            for root, _, names in os.walk(source):
+                files.extend(os.path.join(root, name) for name in sorted(names)
+                             if _is_filing(os.path.join(root, name)))
+        elif _is_filing(source):
+            files.append(source)
+        else:
+            base_dir = os.path.dirname(os.path.abspath(source))
+            with open(source, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith('#'):
+                        files.append(os.path.join(base_dir, line))
+
+    return [os.path.abspath(path) for path in files]
+
+
+def _is_filing(path: str) -> bool:
+    # .txt is both a manifest and an EDGAR full-submission extension
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.txt':
+        return EdgarSubmissionReader.is_submission_file(path)
+    return extension in SUPPORTED_EXTENSIONS
+
+
+def _init_worker():
+    """Load the models once per worker process"""
+    global _ml_manager
+    from .models.ml_manager import MLManager
+
+    _ml_manager = MLManager()
+    # Files are the unit of parallelism here, so don't also fan out pages
+    _ml_manager.sec_processor.max_workers = 1
+
+
+def _ingest_file(file_path: str, document_id: int) -> Dict[str, Any]:
+    """Run the ingest pipeline for one file inside a worker process"""
+    started = time.perf_counter()
+
+    try:
+        result = _ml_manager.ingest_sec_filing(document_id, file_path)
+    except Exception as e:
+        _ml_manager.db.update_processing_status(
+            document_id=document_id,
+            status="error",
+            message="Bulk ingest failed",
+            error=str(e)
+        )
+        return {'status': 'error', 'file_path': file_path, 'document_id': document_id, 'message': str(e)}
+
+    outputs = result['outputs']
+    return {
+        'status': 'success',
+        'file_path': file_path,
+        'document_id': document_id,
+        'pages': outputs['load'].get('page_count', 0),
+        'chunks': outputs['embeddings']['chunks_processed'],
+        'timings': result['timings'],
+        'peak_rss_mb': result['memory']['peak_rss_mb'],
+        'seconds': time.perf_counter() - started,
+    }
+
+
+class ThroughputReport:
+    """Running totals for a bulk ingest, printed as each file finishes"""
+
+    def __init__(self, total_files: int):
+        self.total_files = total_files
+        self.started = time.perf_counter()
+        self.finished = 0
+        self.failed = 0
+        self.pages = 0
+        self.chunks = 0
+        self.stage_seconds = {}
+        self.stage_runs = {}
+        self.peak_rss_mb = None
+
+    def add(self, result: Dict[str, Any]):
+        self.finished += 1
+
+        if result['status'] != 'success':
+            self.failed += 1
+            print(f"[{self.finished}/{self.total_files}] FAILED {os.path.basename(result['file_path'])}: {result['message']}")
+            return
+
+        self.pages += result['pages']
+        self.chunks += result['chunks']
+        for stage, seconds in result['timings'].items():
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+            self.stage_runs[stage] = self.stage_runs.get(stage, 0) + 1
+        if result['peak_rss_mb'] is not None:
+            self.peak_rss_mb = max(self.peak_rss_mb or 0.0, result['peak_rss_mb'])
+
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        print(
+            f"[{self.finished}/{self.total_files}] {os.path.basename(result['file_path'])} "
+            f"({result['pages']} pages, {result['chunks']} chunks, {result['seconds']:.1f}s, "
+            f"peak {result['peak_rss_mb']} MB RSS) | "
+            f"{(self.finished - self.failed) * 60 / elapsed:.1f} docs/min, "
+            f"{self.pages / elapsed:.1f} pages/s, {self.chunks / elapsed:.1f} chunks/s"
+        )
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        return {
+            'files': self.finished,
+            'failed': self.failed,
+            'pages': self.pages,
+            'chunks': self.chunks,
+            'elapsed_seconds': round(elapsed, 1),
+            # Highest per-file peak; each worker process measures its own RSS
+            'peak_rss_mb': self.peak_rss_mb,
+            'stage_seconds': {stage: round(seconds, 1) for stage, seconds in self.stage_seconds.items()},
+            'stage_mean_seconds': {
+                stage: round(seconds / self.stage_runs[stage], 2)
+                for stage, seconds in self.stage_seconds.items()
+            },
+        }
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f"\nIngested {summary['files'] - summary['failed']} of {summary['files']} files "
+              f"in {summary['elapsed_seconds']}s ({summary['failed']} failed)")
+
+        if summary['stage_seconds']:
+            print(f"{'stage':<16}{'total s':>10}{'mean s':>10}{'runs':>6}")
+            for stage, seconds in sorted(summary['stage_seconds'].items(), key=lambda item: -item[1]):
+                print(f"{stage:<16}{seconds:>10.1f}{summary['stage_mean_seconds'][stage]:>10.2f}{self.stage_runs[stage]:>6}")
+
+
+def bulk_ingest(sources: Iterable[str], workers: int = 2, db: Optional[PgVectorDB] = None) -> Dict[str, Any]:
+    """Ingest every filing under `sources` on a pool of worker processes.
+
+    Files are deduplicated by SHA-256 and registered in one bulk insert.
+    Documents that already finished are skipped, so an interrupted run can
+    simply be started again; unfinished ones resume from their last
+    completed pipeline stage.
+    """
+    db = db or PgVectorDB.from_env()
+
+    # Hash every file once, dropping duplicates within this run
+    by_hash = {}
+    for file_path in collect_files(sources):
+        by_hash.setdefault(file_sha256(file_path), file_path)
+
+    registered = db.register_documents([
+        {
+            'title': os.path.splitext(os.path.basename(file_path))[0],
+            'file_type': os.path.splitext(file_path)[1].lower(),
+            'file_hash': file_hash,
+        }
+        for file_hash, file_path in by_hash.items()
+    ])
+
+    if by_hash and not registered:
+        raise RuntimeError("Could not register documents in the database")
+
+    todo = [
+        (file_path, registered[file_hash]['id'])
+        for file_hash, file_path in by_hash.items()
+        if file_hash in registered and registered[file_hash]['processing_status'] != 'complete'
+    ]
+    print(f"{len(by_hash)} unique files, {len(by_hash) - len(todo)} already ingested, {len(todo)} to process")
+
+    report = ThroughputReport(len(todo))
+    if not todo:
+        return report.summary()
+
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+    try:
+        futures = [executor.submit(_ingest_file, file_path, document_id) for file_path, document_id in todo]
+        for future in as_completed(futures):
+            report.add(future.result())
+    except KeyboardInterrupt:
+        print("\nInterrupted; run the same command again to resume")
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    else:
+        executor.shutdown()
+
+    report.print_summary()
+    return report.summary()
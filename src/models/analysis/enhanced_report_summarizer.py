@@ -1,5 +1,5 @@
 ﻿from transformers import pipeline
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Callable, Optional
 import re
 
 class EnhancedReportSummarizer:
@@ -170,8 +170,12 @@ class EnhancedReportSummarizer:
         
         return combined
     
-    def create_extended_tldr(self, sections: Dict[str, str]) -> Dict[str, Any]:
-        """Create a comprehensive TLDR summary of the financial report"""
+    def create_extended_tldr(self, sections: Dict[str, str],
+                             on_progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """Create a comprehensive TLDR summary of the financial report
+        
+        `on_progress(sections_done, section_count)` is called after each section.
+        """
         # Generate executive summary with metrics and highlights
         executive_summary = self.generate_executive_summary(sections)
         
@@ -185,9 +189,12 @@ class EnhancedReportSummarizer:
         }
         
         # Summarize each section with more detail
-        for section_name, content in sections.items():
-            if section_name in self.key_sections and content:
-                tldr["sections"][section_name] = self.summarize_section(content, max_words=500)
+        to_summarize = [(name, content) for name, content in sections.items()
+                        if name in self.key_sections and content]
+        for done, (section_name, content) in enumerate(to_summarize, start=1):
+            tldr["sections"][section_name] = self.summarize_section(content, max_words=500)
+            if on_progress:
+                on_progress(done, len(to_summarize))
         
         # Add section-specific metrics if available
         financial_section = sections.get("financial_statements", "")
@@ -2,11 +2,61 @@
 from typing import Dict, Any, List, Optional
 import re
 import numpy as np
+import pandas as pd
 import json
 
+from ..processing.financial_parsers import period_sort_key
+
+
+class FlowGraph:
+    """Nodes and links of a Sankey diagram, built in one pass.
+    
+    Node names map to integer ids through a dict, so adding a link is O(1)
+    whatever the graph size. Links are kept as parallel arrays and returned
+    that way: {"nodes": [names], "links": {"source": [ids], "target": [ids],
+    "value": [...], "color": [...]}}.
+    """
+    
+    def __init__(self, colors: Dict[str, str]):
+        self.colors = colors
+        self.node_ids = {}
+        self.nodes = []
+        self.sources = []
+        self.targets = []
+        self.values = []
+        self.link_colors = []
+    
+    def node(self, name: str) -> int:
+        node_id = self.node_ids.get(name)
+        if node_id is None:
+            node_id = self.node_ids[name] = len(self.nodes)
+            self.nodes.append(name)
+        return node_id
+    
+    def link(self, source: str, target: str, value: float, flow_type: str):
+        self.sources.append(self.node(source))
+        self.targets.append(self.node(target))
+        self.values.append(abs(value))
+        self.link_colors.append(self.colors.get(flow_type, "#aaa"))
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "nodes": self.nodes,
+            "links": {
+                "source": self.sources,
+                "target": self.targets,
+                "value": self.values,
+                "color": self.link_colors,
+            },
+        }
+
+
 class FinancialFlowAnalyzer:
     """Analyze financial flows and generate Sankey diagram data"""
     
+    # Bump when flow or insight output changes, so stored flows are rebuilt
+    FLOW_VERSION = "2"
+    
     def __init__(self):
         # Define standard financial flow categories
         self.flow_categories = {
@@ -30,196 +80,166 @@ class FinancialFlowAnalyzer:
             "Cash": "#e377c2"           # Pink for cash flows
         }
     
+    def build_flow(self, financial_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Sankey data and insights for a document, in the form they are stored and served"""
+        return {
+            "flow_data": self.generate_sankey_data(financial_data),
+            "stacked_flow_data": self.generate_stacked_sankey_data(financial_data),
+            "insights": self.generate_flow_insights(financial_data),
+            "flow_version": self.FLOW_VERSION
+        }
+    
     def generate_sankey_data(self, financial_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate data for Sankey diagram from financial statements"""
-        # Initialize nodes and links
-        nodes = []
-        links = []
+        """Generate Sankey data for the latest period of every parsed statement"""
+        graph = FlowGraph(self.flow_colors)
+        self._add_statements(graph, financial_data)
+        return graph.to_dict()
+    
+    def generate_stacked_sankey_data(self, financial_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Generate one Sankey graph holding every reported period, stacked.
         
-        # Extract income statement data if available
-        if 'income_statement' in financial_data:
-            income_data = financial_data['income_statement']
-            self._add_income_flow(income_data, nodes, links)
+        Each period's flows get their own nodes ("Revenue (FY2022)"), built
+        from the multi-period columns in financial_data['periods'] in a
+        single pass. Periods run oldest first. None when the filing
+        reports fewer than two periods.
+        """
+        graph = FlowGraph(self.flow_colors)
         
-        # If no specific data is available, generate sample data for visualization
-        if not links:
-            self._add_sample_data(nodes, links)
+        by_period = {}
+        for statement_type, columnar in (financial_data.get('periods') or {}).items():
+            for position, period in enumerate(columnar['periods']):
+                if period is None:
+                    continue
+                statement = {line_item: values[position] for line_item, values in columnar['values'].items()}
+                by_period.setdefault(period, {})[statement_type] = statement
         
-        # Return formatted data for D3 Sankey diagram
-        return {
-            "nodes": [{"name": node} for node in nodes],
-            "links": self._format_links(links, nodes)
-        }
+        if len(by_period) < 2:
+            return None
+        
+        for period in sorted(by_period, key=period_sort_key):
+            self._add_statements(graph, by_period[period], suffix=f" ({period})")
+        
+        return graph.to_dict()
+    
+    def _add_statements(self, graph: 'FlowGraph', statements: Dict[str, Any], suffix: str = ""):
+        if statements.get('income_statement'):
+            self._add_income_flow(statements['income_statement'], graph, suffix)
+        
+        if statements.get('balance_sheet'):
+            self._add_balance_sheet_flow(statements['balance_sheet'], graph, suffix)
+        
+        if statements.get('cash_flow'):
+            self._add_cash_flow(statements['cash_flow'], graph, suffix)
     
-    def _add_income_flow(self, income_data: Dict[str, Any], nodes: List[str], links: List[Dict[str, Any]]):
+    def _add_income_flow(self, income_data: Dict[str, Any], graph: 'FlowGraph', suffix: str = ""):
         """Add income statement data to Sankey diagram"""
-        # Extract key metrics from income statement
-        revenue = income_data.get('revenue', 0)
-        cogs = income_data.get('cost_of_goods_sold', 0)
-        gross_profit = income_data.get('gross_profit', 0)
-        opex = income_data.get('operating_expenses', 0)
-        net_profit = income_data.get('net_profit', 0)
-        
-        # Add basic income statement nodes
-        required_nodes = [
-            "Revenue", 
-            "Cost of Goods Sold", 
-            "Gross Profit", 
-            "Operating Expenses", 
-            "Net Income"
-        ]
-        
-        for node in required_nodes:
-            if node not in nodes:
-                nodes.append(node)
+        # Parsers report missing line items as None, and costs may be negative
+        revenue = income_data.get('revenue') or 0
+        cogs = abs(income_data.get('cost_of_goods_sold') or 0)
+        gross_profit = income_data.get('gross_profit') or 0
+        opex = abs(income_data.get('operating_expenses') or 0)
+        net_profit = income_data.get('net_profit') or 0
+        
+        def link(source, target, value, flow_type):
+            graph.link(source + suffix, target + suffix, value, flow_type)
         
         # Add links for the income flows
         if revenue > 0:
             # If we have COGS data, create that flow
             if cogs > 0:
-                links.append({
-                    "source": "Revenue",
-                    "target": "Cost of Goods Sold",
-                    "value": abs(cogs),
-                    "type": "Expenses"
-                })
+                link("Revenue", "Cost of Goods Sold", cogs, "Expenses")
             
             # Calculate or use provided gross profit
-            if gross_profit == 0 and revenue > 0 and cogs > 0:
+            if gross_profit == 0 and cogs > 0:
                 gross_profit = revenue - cogs
             
             if gross_profit > 0:
-                links.append({
-                    "source": "Revenue",
-                    "target": "Gross Profit",
-                    "value": abs(gross_profit),
-                    "type": "Income"
-                })
+                link("Revenue", "Gross Profit", gross_profit, "Income")
                 
                 # Add operating expenses flow if available
                 if opex > 0:
-                    links.append({
-                        "source": "Gross Profit",
-                        "target": "Operating Expenses",
-                        "value": abs(opex),
-                        "type": "Expenses"
-                    })
+                    link("Gross Profit", "Operating Expenses", opex, "Expenses")
                 
                 # Calculate or use provided net profit
-                if net_profit == 0 and gross_profit > 0 and opex > 0:
+                if net_profit == 0 and opex > 0:
                     net_profit = gross_profit - opex
                 
                 if net_profit > 0:
-                    links.append({
-                        "source": "Gross Profit",
-                        "target": "Net Income",
-                        "value": abs(net_profit),
-                        "type": "Income"
-                    })
+                    link("Gross Profit", "Net Income", net_profit, "Income")
         
         # Look for additional income statement items
-        for item, value in income_data.items():
-            if item not in ['revenue', 'cost_of_goods_sold', 'gross_profit', 'operating_expenses', 'net_profit'] and value:
-                # Categorize the item and add to diagram if significant
-                if item in ['interest_expense', 'depreciation_amortization', 'taxes']:
-                    node_name = self._format_node_name(item)
-                    
-                    if node_name not in nodes:
-                        nodes.append(node_name)
-                    
-                    # Add appropriate links
-                    if item == 'interest_expense' and 'Net Income' in nodes:
-                        links.append({
-                            "source": "Gross Profit",
-                            "target": node_name,
-                            "value": abs(value),
-                            "type": "Expenses"
-                        })
-                    elif item == 'taxes' and 'Net Income' in nodes:
-                        links.append({
-                            "source": "Gross Profit",
-                            "target": node_name,
-                            "value": abs(value),
-                            "type": "Expenses"
-                        })
-                    elif item == 'depreciation_amortization' and 'Operating Expenses' in nodes:
-                        links.append({
-                            "source": node_name,
-                            "target": "Operating Expenses",
-                            "value": abs(value),
-                            "type": "Expenses"
-                        })
+        for item in ('interest_expense', 'taxes'):
+            if income_data.get(item):
+                link("Gross Profit", self._format_node_name(item), income_data[item], "Expenses")
+        
+        if income_data.get('depreciation_amortization'):
+            link(self._format_node_name('depreciation_amortization'), "Operating Expenses",
+                 income_data['depreciation_amortization'], "Expenses")
     
-    def _add_balance_sheet_flow(self, balance_data: Dict[str, Any], nodes: List[str], links: List[Dict[str, Any]]):
+    def _add_balance_sheet_flow(self, balance_data: Dict[str, Any], graph: 'FlowGraph', suffix: str = ""):
         """Add balance sheet data to Sankey diagram"""
-        # Implement balance sheet specific flows
-        # This would depend on your balance sheet data structure
-        pass
+        total_assets = balance_data.get('total_assets') or 0
+        total_liabilities = balance_data.get('total_liabilities') or 0
+        total_equity = balance_data.get('total_equity') or 0
+        current_assets = balance_data.get('current_assets') or 0
+        
+        if total_assets <= 0:
+            return
+        
+        def link(source, target, value, flow_type):
+            graph.link(source + suffix, target + suffix, value, flow_type)
+        
+        # Funding side: liabilities and equity finance the assets
+        if total_liabilities > 0:
+            link("Total Liabilities", "Total Assets", total_liabilities, "Liabilities")
+        if total_equity > 0:
+            link("Shareholders' Equity", "Total Assets", total_equity, "Equity")
+        
+        # Asset side: what the funding was put into
+        if 0 < current_assets <= total_assets:
+            link("Total Assets", "Current Assets", current_assets, "Assets")
+            if total_assets > current_assets:
+                link("Total Assets", "Non-current Assets", total_assets - current_assets, "Assets")
     
-    def _add_cash_flow(self, cash_flow_data: Dict[str, Any], nodes: List[str], links: List[Dict[str, Any]]):
+    def _add_cash_flow(self, cash_flow_data: Dict[str, Any], graph: 'FlowGraph', suffix: str = ""):
         """Add cash flow statement data to Sankey diagram"""
-        # Implement cash flow specific flows
-        # This would depend on your cash flow data structure
-        pass
+        activities = {
+            "Operating Activities": cash_flow_data.get('operating_cash_flow'),
+            "Investing Activities": cash_flow_data.get('investing_cash_flow'),
+            "Financing Activities": cash_flow_data.get('financing_cash_flow'),
+        }
+        if all(value is None for value in activities.values()):
+            return
+        
+        def link(source, target, value, flow_type):
+            graph.link(source + suffix, target + suffix, value, flow_type)
+        
+        # Cash sources flow into a pool that the uses then draw from
+        beginning = cash_flow_data.get('cash_beginning') or 0
+        if beginning > 0:
+            link("Cash (Beginning of Period)", "Cash Available", beginning, "Cash")
+        
+        for activity, value in activities.items():
+            if value and value > 0:
+                link(activity, "Cash Available", value, "Cash")
+            elif value and value < 0:
+                link("Cash Available", activity, value, "Expenses")
+        
+        # Shareholder returns are the financing outflows worth showing on their own
+        financing = activities["Financing Activities"]
+        if financing and financing < 0:
+            for item in ('dividends_paid', 'share_repurchases'):
+                if cash_flow_data.get(item):
+                    link("Financing Activities", self._format_node_name(item), cash_flow_data[item], "Expenses")
+        
+        ending = cash_flow_data.get('cash_ending') or 0
+        if ending > 0:
+            link("Cash Available", "Cash (End of Period)", ending, "Cash")
     
     def _format_node_name(self, snake_case_name: str) -> str:
         """Convert snake_case to Title Case for node names"""
         return ' '.join(word.capitalize() for word in snake_case_name.split('_'))
     
-    def _format_links(self, raw_links: List[Dict[str, Any]], nodes: List[str]) -> List[Dict[str, Any]]:
-        """Format links for D3 Sankey diagram with node indices"""
-        formatted_links = []
-        
-        for link in raw_links:
-            # Find source and target indices
-            source_idx = nodes.index(link["source"]) if link["source"] in nodes else -1
-            target_idx = nodes.index(link["target"]) if link["target"] in nodes else -1
-            
-            if source_idx >= 0 and target_idx >= 0:
-                formatted_links.append({
-                    "source": source_idx,
-                    "target": target_idx,
-                    "value": link["value"],
-                    "color": self.flow_colors.get(link.get("type", ""), "#aaa")
-                })
-        
-        return formatted_links
-    
-    def _add_sample_data(self, nodes: List[str], links: List[Dict[str, Any]]):
-        """Add sample financial flow data when real data is not available"""
-        # Define sample nodes
-        sample_nodes = [
-            "Revenue", 
-            "Cost of Goods Sold", 
-            "Gross Profit", 
-            "Operating Expenses", 
-            "Operating Income", 
-            "Taxes",
-            "Net Income", 
-            "Dividends", 
-            "Retained Earnings"
-        ]
-        
-        # Add sample nodes
-        for node in sample_nodes:
-            if node not in nodes:
-                nodes.append(node)
-        
-        # Add sample links with realistic values
-        sample_links = [
-            {"source": "Revenue", "target": "Cost of Goods Sold", "value": 800000, "type": "Expenses"},
-            {"source": "Revenue", "target": "Gross Profit", "value": 1200000, "type": "Income"},
-            {"source": "Gross Profit", "target": "Operating Expenses", "value": 700000, "type": "Expenses"},
-            {"source": "Gross Profit", "target": "Operating Income", "value": 500000, "type": "Income"},
-            {"source": "Operating Income", "target": "Taxes", "value": 125000, "type": "Expenses"},
-            {"source": "Operating Income", "target": "Net Income", "value": 375000, "type": "Income"},
-            {"source": "Net Income", "target": "Dividends", "value": 125000, "type": "Expenses"},
-            {"source": "Net Income", "target": "Retained Earnings", "value": 250000, "type": "Income"}
-        ]
-        
-        # Add sample links to the provided links list
-        links.extend(sample_links)
-    
     def generate_flow_insights(self, financial_data: Dict[str, Any]) -> Dict[str, Any]:
         """Generate insights about the financial flows"""
         insights = {
@@ -227,37 +247,132 @@ class FinancialFlowAnalyzer:
             "observations": []
         }
         
-        if 'income_statement' in financial_data:
-            income_data = financial_data['income_statement']
-            revenue = income_data.get('revenue', 0)
+        income_data = financial_data.get('income_statement') or {}
+        # Parsers report missing line items as None, and costs may be negative
+        revenue = income_data.get('revenue') or 0
+        gross_profit = income_data.get('gross_profit') or 0
+        operating_expenses = abs(income_data.get('operating_expenses') or 0)
+        net_profit = income_data.get('net_profit') or 0
+        
+        if revenue > 0:
+            # Calculate key ratios
+            if gross_profit:
+                gross_margin = (gross_profit / revenue) * 100
+                insights["ratios"]["gross_margin"] = round(gross_margin, 2)
+                
+                if gross_margin > 50:
+                    insights["observations"].append("High gross margin indicates strong pricing power or efficient production.")
+                elif gross_margin < 20:
+                    insights["observations"].append("Low gross margin suggests cost pressures or competitive pricing environment.")
             
-            if revenue > 0:
-                # Calculate key ratios
-                if 'gross_profit' in income_data and income_data['gross_profit']:
-                    gross_margin = (income_data['gross_profit'] / revenue) * 100
-                    insights["ratios"]["gross_margin"] = round(gross_margin, 2)
-                    
-                    if gross_margin > 50:
-                        insights["observations"].append("High gross margin indicates strong pricing power or efficient production.")
-                    elif gross_margin < 20:
-                        insights["observations"].append("Low gross margin suggests cost pressures or competitive pricing environment.")
+            if operating_expenses:
+                opex_ratio = (operating_expenses / revenue) * 100
+                insights["ratios"]["opex_ratio"] = round(opex_ratio, 2)
                 
-                if 'operating_expenses' in income_data and income_data['operating_expenses']:
-                    opex_ratio = (income_data['operating_expenses'] / revenue) * 100
-                    insights["ratios"]["opex_ratio"] = round(opex_ratio, 2)
-                    
-                    if opex_ratio > 40:
-                        insights["observations"].append("High operating expense ratio may impact profitability.")
-                    elif opex_ratio < 20:
-                        insights["observations"].append("Low operating expense ratio indicates efficient operations.")
+                if opex_ratio > 40:
+                    insights["observations"].append("High operating expense ratio may impact profitability.")
+                elif opex_ratio < 20:
+                    insights["observations"].append("Low operating expense ratio indicates efficient operations.")
+            
+            if net_profit:
+                net_margin = (net_profit / revenue) * 100
+                insights["ratios"]["net_margin"] = round(net_margin, 2)
                 
-                if 'net_profit' in income_data and income_data['net_profit']:
-                    net_margin = (income_data['net_profit'] / revenue) * 100
-                    insights["ratios"]["net_margin"] = round(net_margin, 2)
-                    
-                    if net_margin > 20:
-                        insights["observations"].append("Strong net margin demonstrates excellent profitability.")
-                    elif net_margin < 5:
-                        insights["observations"].append("Low net margin indicates pressure on bottom-line profitability.")
-        
-        return insights
\ No newline at end of file
+                if net_margin > 20:
+                    insights["observations"].append("Strong net margin demonstrates excellent profitability.")
+                elif net_margin < 5:
+                    insights["observations"].append("Low net margin indicates pressure on bottom-line profitability.")
+        
+        return insights
+    
+    # Line items the ratio panel reads from financial_facts
+    PANEL_LINE_ITEMS = [
+        "revenue", "gross_profit", "operating_expenses", "net_profit",
+        "current_assets", "current_liabilities", "total_assets", "total_liabilities", "total_equity",
+        "operating_cash_flow", "capital_expenditures"
+    ]
+    
+    # Period types a ratio panel can compare
+    PERIOD_TYPES = ("annual", "quarterly")
+    
+    def compare_documents(self, facts: Dict[str, List[Any]], period_type: str = "annual") -> Dict[str, Any]:
+        """Ratio panel for many filings at once, from columnar financial facts.
+        
+        `facts` is the column dict returned by PgVectorDB.get_financial_facts.
+        Each document contributes its latest period of `period_type` (fiscal
+        years, or quarters), so quarterly figures are never ranked against
+        annual ones; documents without such a period are left out, as are
+        periods without a year. Growth compares the period with the same
+        period a year earlier in the same filing. Every ratio comes
+        with the document's percentile among the compared set. Ratios are
+        computed on whole columns, so the cost barely grows with the number
+        of filings. Returns a compact table: column names plus one row per
+        document, with None for ratios whose inputs are missing.
+        """
+        if period_type not in self.PERIOD_TYPES:
+            raise ValueError(f"Unknown period type '{period_type}'")
+        
+        frame = pd.DataFrame(facts)
+        if frame.empty:
+            return {"period_type": period_type, "columns": [], "rows": [], "peer_median": {}}
+        
+        frame["fiscal_year"] = pd.to_numeric(frame["fiscal_year"], errors="coerce")
+        # 0 marks a full fiscal year, so a year and its own quarters stay apart
+        frame["quarter_key"] = pd.to_numeric(frame["fiscal_quarter"], errors="coerce").fillna(0)
+        
+        keys = ["document_id", "fiscal_year", "quarter_key"]
+        # One row per document and period, one column per line item
+        wide = frame.groupby(keys + ["line_item"], dropna=False)["value"].first().unstack("line_item")
+        wide = wide.reindex(columns=self.PANEL_LINE_ITEMS).reset_index()
+        labels = frame.drop_duplicates(keys).set_index(keys)[["company", "period"]]
+        wide = wide.join(labels, on=keys)
+        
+        # Only periods of the requested type; without a year the type is unknown
+        annual = wide["quarter_key"] == 0
+        wide = wide[wide["fiscal_year"].notna() & (annual if period_type == "annual" else ~annual)]
+        if wide.empty:
+            return {"period_type": period_type, "columns": [], "rows": [], "peer_median": {}}
+        
+        # Latest period of each document
+        order = wide["fiscal_year"] * 10 + wide["quarter_key"]
+        latest = wide.loc[order.groupby(wide["document_id"]).idxmax()].reset_index(drop=True)
+        
+        # Same period one year earlier, from the same filing
+        prior = wide[keys + ["revenue", "net_profit"]].copy()
+        prior["fiscal_year"] = prior["fiscal_year"] + 1
+        latest = latest.merge(prior, on=keys, how="left", suffixes=("", "_prior"))
+        
+        revenue = latest["revenue"].replace(0, np.nan)
+        equity = latest["total_equity"].replace(0, np.nan)
+        
+        ratios = pd.DataFrame({
+            "gross_margin": latest["gross_profit"] / revenue * 100,
+            "opex_ratio": latest["operating_expenses"] / revenue * 100,
+            "net_margin": latest["net_profit"] / revenue * 100,
+            "revenue_growth": (latest["revenue"] / latest["revenue_prior"].replace(0, np.nan) - 1) * 100,
+            "net_income_growth": (
+                (latest["net_profit"] - latest["net_profit_prior"]) / latest["net_profit_prior"].abs().replace(0, np.nan) * 100
+            ),
+            "current_ratio": latest["current_assets"] / latest["current_liabilities"].replace(0, np.nan),
+            "debt_to_equity": latest["total_liabilities"] / equity,
+            "return_on_equity": latest["net_profit"] / equity * 100,
+            "return_on_assets": latest["net_profit"] / latest["total_assets"].replace(0, np.nan) * 100,
+            "free_cash_flow_margin": (
+                (latest["operating_cash_flow"] - latest["capital_expenditures"].abs().fillna(0)) / revenue * 100
+            ),
+        })
+        
+        percentiles = ratios.rank(pct=True).mul(100).add_suffix("_percentile")
+        panel = pd.concat([latest[["document_id", "company", "period"]], ratios.round(2), percentiles.round(1)], axis=1)
+        
+        # NaN is not JSON; missing ratios go out as None
+        panel = panel.astype(object).where(panel.notna(), None)
+        return {
+            "period_type": period_type,
+            "columns": panel.columns.tolist(),
+            "rows": panel.to_numpy().tolist(),
+            "peer_median": {
+                ratio: None if np.isnan(value) else round(float(value), 2)
+                for ratio, value in ratios.median().items()
+            },
+        }
@@ -1,11 +1,13 @@
 ﻿from transformers import pipeline
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Callable, Optional
 import re
 
+from ...utils.batching import BatchingQueue
+
 class ReportSummarizer:
     """Generate comprehensive summaries of financial reports"""
     
-    def __init__(self):
+    def __init__(self, summary_batch_size: int = 8):
         self.summarizer = pipeline(
             "summarization",
             model="facebook/bart-large-cnn",
@@ -13,6 +15,10 @@ class ReportSummarizer:
             min_length=100
         )
         
+        # Chunks from documents summarized concurrently share model calls
+        self.summary_batch_size = summary_batch_size
+        self._summary_queue = BatchingQueue(self._summarize_batch, max_items=summary_batch_size)
+        
         # Define key sections to summarize
         self.key_sections = [
             "business",
@@ -35,12 +41,8 @@ class ReportSummarizer:
         # Split into chunks if longer than model can handle
         chunks = self._split_into_chunks(section_text)
         
-        # Summarize each chunk
-        summaries = []
-        for chunk in chunks:
-            if len(chunk) > 100:  # Only summarize substantial chunks
-                summary = self.summarizer(chunk)[0]['summary_text']
-                summaries.append(summary)
+        # Summarize the substantial chunks in batches
+        summaries = self._summary_queue([chunk for chunk in chunks if len(chunk) > 100])
         
         # Combine summaries
         combined = " ".join(summaries)
@@ -52,23 +54,34 @@ class ReportSummarizer:
             
         return combined
     
-    def create_tldr(self, sections: Dict[str, str]) -> Dict[str, Any]:
-        """Create a full TLDR summary of the 10-K report"""
+    def create_tldr(self, sections: Dict[str, str],
+                    on_progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """Create a full TLDR summary of the 10-K report
+        
+        `on_progress(sections_done, section_count)` is called after each section.
+        """
         tldr = {
             "executive_summary": self.generate_executive_summary(sections),
             "sections": {}
         }
         
         # Summarize each section
-        for section_name, content in sections.items():
-            if section_name in self.key_sections and content:
-                tldr["sections"][section_name] = self.summarize_section(content)
+        to_summarize = [(name, content) for name, content in sections.items()
+                        if name in self.key_sections and content]
+        for done, (section_name, content) in enumerate(to_summarize, start=1):
+            tldr["sections"][section_name] = self.summarize_section(content)
+            if on_progress:
+                on_progress(done, len(to_summarize))
         
         # Add financial highlights
         # ...
         
         return tldr
     
+    def _summarize_batch(self, texts: List[str]) -> List[str]:
+        results = self.summarizer(texts, batch_size=self.summary_batch_size)
+        return [result['summary_text'] for result in results]
+    
     def _split_into_chunks(self, text: str, max_length: int = 1000) -> List[str]:
         """Split text into chunks that the model can handle"""
         words = text.split()
@@ -38,9 +38,26 @@ class EmbeddingGenerator:
         # Convert to numpy array
         return sentence_embeddings[0].cpu().numpy()
     
-    def generate_embeddings(self, texts: List[str]) -> List[np.ndarray]:
-        """Generate embeddings for a list of texts."""
-        return [self.generate_embedding(text) for text in texts]
+    def generate_embeddings(self, texts: List[str], batch_size: int = 32) -> List[np.ndarray]:
+        """Generate embeddings for a list of texts, running the model on batches."""
+        embeddings = []
+        
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            
+            # Tokenize the batch, padding to the longest text in it
+            encoded_input = self.tokenizer(batch, padding=True, truncation=True, max_length=512, return_tensors='pt')
+            encoded_input = {k: v.to(self.device) for k, v in encoded_input.items()}
+            
+            with torch.no_grad():
+                model_output = self.model(**encoded_input)
+            
+            sentence_embeddings = self._mean_pooling(model_output, encoded_input['attention_mask'])
+            sentence_embeddings = torch.nn.functional.normalize(sentence_embeddings, p=2, dim=1)
+            
+            embeddings.extend(sentence_embeddings.cpu().numpy())
+        
+        return embeddings
     
     def get_embedding_dimension(self) -> int:
         """Return the dimension of the embeddings."""
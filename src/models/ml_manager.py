@@ -1,5 +1,6 @@
 from .processing.document_processor import DocumentProcessor
 from .processing.sec_document_processor import SECFilingProcessor
+from .processing.edgar_submission import EdgarSubmissionReader
 from .analysis.enhanced_report_summarizer import EnhancedReportSummarizer
 from .analysis.financial_flow_analyzer import FinancialFlowAnalyzer
 from .embedding.embedding_generator import EmbeddingGenerator
@@ -8,16 +9,32 @@ from .processing.table_extractor import FinancialTableExtractor  # Add this new
 from .processing.financial_parsers import FinancialStatementParser  # Add this new import
 from .analysis.report_summarizer import ReportSummarizer  # Add this new import
 from ..utils.pgvector_db import PgVectorDB
-from typing import Dict, Any, List, Optional
+from ..utils.memory_monitor import MemoryPeakMonitor
+from ..utils.progress import MEMORY_ENTRY, StageProgress
+from ..utils.batching import BatchingQueue
+from .stage_pipeline import SOURCE, Stage, StagePipeline
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterator, List, Optional, Callable, Tuple
+import itertools
 import json
-import time
 import asyncio
+import hashlib
 import os
 
 class MLManager:
-    def __init__(self):
+    def __init__(self, streaming_ingest: Optional[bool] = None, embedding_batch_size: int = 32,
+                 chunk_size: int = 1000, chunk_overlap: int = 200, batch_workers: int = 3):
+        # Load PDFs from a page stream instead of keeping every page's text;
+        # defaults to the STREAMING_INGEST environment variable
+        if streaming_ingest is None:
+            streaming_ingest = os.getenv("STREAMING_INGEST", "").lower() in ("1", "true", "yes")
+        self.streaming_ingest = streaming_ingest
+        self.embedding_batch_size = embedding_batch_size
+        # Documents of an upload batch ingested at once
+        self.batch_workers = batch_workers
+        
         # Existing initialization
-        self.document_processor = DocumentProcessor()
+        self.document_processor = DocumentProcessor(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
         self.sec_processor = SECFilingProcessor()
         self.embedding_generator = EmbeddingGenerator()
         self.document_analyzer = DocumentAnalyzer()
@@ -29,13 +46,13 @@ class MLManager:
         self.enhanced_summarizer = EnhancedReportSummarizer()
         self.flow_analyzer = FinancialFlowAnalyzer()
         
-        # Database connection
-        self.db = PgVectorDB(
-            host='localhost',
-            port='5433',  # Using our Docker PostgreSQL port
-            dbname='my_project_db',
-            user='postgres',
-            password=os.environ.get('DB_PASSWORD', 'postgres')  # Use environment variable
+        # Database connection (DB_HOST, DB_PORT, ... default to our Docker PostgreSQL)
+        self.db = PgVectorDB.from_env()
+        
+        # Chunks from documents ingested concurrently share model calls
+        self._embedding_queue = BatchingQueue(
+            lambda texts: self.embedding_generator.generate_embeddings(texts, batch_size=self.embedding_batch_size),
+            max_items=embedding_batch_size * 4
         )
     
     def process_document(self, file_path: str) -> Dict[str, Any]:
@@ -52,85 +69,13 @@ class MLManager:
             return self._process_standard_document(file_path)
     
     def process_sec_filing_background(self, file_path: str, document_id: int) -> None:
-        """Process an SEC filing in the background."""
+        """Process an SEC filing in the background.
+        
+        Errors are re-raised so the job worker can retry; the uploaded file is
+        kept until processing succeeds so a retry can read it again.
+        """
         try:
-            # Get the document info
-            doc_info = self.sec_processor.load_from_file(file_path)
-            
-            if doc_info.get('status') != 'success':
-                print(f"Error loading document: {doc_info.get('message')}")
-                return
-                
-            # Update document content with sections
-            if 'sections' in doc_info:
-                self.db.update_document(
-                    document_id=document_id,
-                    content=json.dumps(doc_info['sections'])
-                )
-            
-            # Extract tables from the document
-            tables = []
-            
-            if file_path.endswith('.pdf'):
-                tables = self.table_extractor.extract_tables_from_pdf(file_path)
-            elif file_path.endswith(('.html', '.htm')):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    html_content = f.read()
-                tables = self.table_extractor.extract_tables_from_html(html_content)
-            
-            # Process and store tables
-            financial_data = {}
-            
-            for idx, table in enumerate(tables):
-                # Clean the table
-                clean_table = self.table_extractor.clean_financial_table(table)
-                
-                # Identify table type
-                table_type = self.table_extractor.identify_statement_type(clean_table)
-                
-                # Parse table based on type
-                if table_type == "income_statement":
-                    parsed_data = self.financial_parser.parse_income_statement(clean_table)
-                    financial_data['income_statement'] = parsed_data
-                # Add similar parsing for balance_sheet and cash_flow
-            
-            # Generate TLDR summary
-            tldr_summary = self.report_summarizer.create_tldr(doc_info.get('sections', {}))
-            
-            # Store sections as chunks for vector search
-            chunks = []
-            for section_name, section_text in doc_info.get('sections', {}).items():
-                section_chunks = self.document_processor.split_document(section_text)
-                
-                for chunk in section_chunks:
-                    # Store the chunk
-                    chunk_id = self.db.store_document_chunk(
-                        document_id=document_id,
-                        chunk_text=f"{section_name}: {chunk['chunk_text']}",
-                        chunk_index=len(chunks)
-                    )
-                    
-                    if not chunk_id:
-                        continue
-                    
-                    # Generate embedding for the chunk
-                    embedding = self.embedding_generator.generate_embedding(chunk['chunk_text'])
-                    
-                    # Store the embedding
-                    self.db.store_embedding(chunk_id=chunk_id, embedding=embedding)
-                    
-                    chunks.append(chunk)
-            
-            # Store analysis results
-            self.db.store_analysis_result(
-                document_id=document_id,
-                analysis_type='sec_filing',
-                analysis_result=json.dumps({
-                    'financial_data': financial_data,
-                    'tldr_summary': tldr_summary,
-                    'processing_status': 'complete'
-                })
-            )
+            self.ingest_sec_filing(document_id, file_path)
             
             # Clean up the temp file
             if os.path.exists(file_path):
@@ -139,16 +84,460 @@ class MLManager:
             print(f"Background processing completed for document {document_id}")
             
         except Exception as e:
-            # Log the error
+            # Log the error and let the caller decide whether to retry
             print(f"Error in background processing: {str(e)}")
             import traceback
             traceback.print_exc()
-            
-            # Clean up the temp file
-            if os.path.exists(file_path):
-                os.remove(file_path)
+            raise
 
-    def _is_sec_filing(self, file_path: str) -> bool:
+    def process_batch_background(self, documents: List[Dict[str, Any]]) -> None:
+        """Ingest the documents of an upload batch concurrently.
+        
+        Each entry needs 'document_id' and 'file_path'. Running the documents
+        side by side lets their embedding and summarization calls be batched
+        together. Documents that already completed (on an earlier attempt)
+        are skipped; if any document fails, the error is re-raised after the
+        others finish so the job worker retries just the failed ones.
+        """
+        def ingest(document: Dict[str, Any]):
+            status = self.db.get_processing_status(document['document_id'])
+            if status and status['status'] == 'complete':
+                return
+            
+            if self._is_sec_filing(document['file_path']):
+                self.process_sec_filing_background(document['file_path'], document['document_id'])
+            else:
+                self.process_standard_document_background(document['file_path'], document['document_id'])
+        
+        errors = []
+        with ThreadPoolExecutor(max_workers=self.batch_workers) as pool:
+            futures = {pool.submit(ingest, document): document for document in documents}
+            for future, document in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    errors.append(f"document {document['document_id']}: {e}")
+        
+        if errors:
+            raise RuntimeError(f"{len(errors)} of {len(documents)} documents failed: " + "; ".join(errors))
+    
+    def ingest_sec_filing(self, document_id: int, file_path: str) -> Dict[str, Any]:
+        """Run the ingest stages for an already stored document.
+        
+        Stages completed by an earlier attempt are reused. Returns the stage
+        outputs, the seconds spent in each stage that ran and the peak process
+        memory over the whole run, which is also kept with the progress.
+        """
+        self.db.update_processing_status(
+            document_id=document_id,
+            status="parsing",
+            message="Extracting document content"
+        )
+        
+        pipeline = self.sec_filing_pipeline
+        memory = MemoryPeakMonitor()
+        try:
+            with memory:
+                outputs = pipeline.run(document_id, file_path)
+        finally:
+            self.db.update_processing_progress(document_id, MEMORY_ENTRY, memory.report())
+        
+        self.db.update_processing_status(
+            document_id=document_id,
+            status="complete",
+            message="Document processing complete"
+        )
+        
+        return {'outputs': outputs, 'timings': pipeline.timings, 'memory': memory.report()}
+    
+    @property
+    def sec_filing_pipeline(self) -> StagePipeline:
+        """Ingest stages of an SEC filing; tables, TLDR and embeddings run concurrently"""
+        return StagePipeline([
+            # Version 2 keeps section hashes instead of the section text
+            Stage("load", (SOURCE,), self._stage_load, version="2"),
+            # On the caller's thread, so the per-page SIGALRM budget applies
+            Stage("tables", (SOURCE, "load"), self._stage_tables, inline=True),
+            # Parser changes re-run this stage, except for filings whose
+            # stored statements already reconcile
+            Stage("financial_data", ("load", "tables"), self._stage_financial_data, version="5",
+                  keep=self._financial_data_reconciles),
+            Stage("tldr", ("load",), self._stage_tldr),
+            # Chunker settings are part of the version, so changing them re-chunks
+            Stage("embeddings", ("load",), self._stage_embeddings, version=self.document_processor.chunker_config),
+            Stage("analysis", ("load", "financial_data", "tldr"), self._stage_analysis),
+            # Re-run only when the financial data (or the flow code) changes;
+            # a failed flow doesn't fail the ingest and is retried next run
+            Stage("financial_flow", ("financial_data",), self._stage_financial_flow,
+                  version=FinancialFlowAnalyzer.FLOW_VERSION, optional=True),
+        ], self.db)
+    
+    def _stage_load(self, document_id: int, file_path: str) -> Dict[str, Any]:
+        """Parse the filing and store its sections in document_sections.
+        
+        The section text is not part of the returned artifact: stages that
+        need it read it back from document_sections. The artifact keeps the
+        hash of each stored section instead, so changed text still re-runs
+        them, plus what the tables and financial data stages use.
+        """
+        progress = StageProgress(self.db, document_id, "load", "pages")
+        if self.streaming_ingest and file_path.lower().endswith('.pdf'):
+            doc_info, parts = self._load_pdf_streaming(file_path, on_progress=progress.update)
+        else:
+            doc_info = self.sec_processor.load_from_file(file_path, on_progress=progress.update)
+            if doc_info.get('status') != 'success':
+                raise ValueError(f"Error loading document: {doc_info.get('message')}")
+            
+            parts = doc_info.pop('sections', {}).items()
+            doc_info.pop('content', None)
+            page_texts = doc_info.pop('page_texts', None)
+            if page_texts is not None:
+                doc_info['table_pages'] = self.table_extractor.select_candidate_pages(page_texts)
+                doc_info['page_count'] = len(page_texts)
+        progress.finish()
+        
+        # document_sections holds the only copy of the text; content is
+        # cleared in case an earlier ingest stored the sections there
+        rows = self.db.store_section_generation(document_id, parts)
+        if rows is None:
+            raise RuntimeError(f"Failed to store sections for document {document_id}")
+        self.db.update_document(document_id=document_id, content='', title=doc_info['title'])
+        
+        doc_info['section_hashes'] = [(row['section_name'], row['section_hash']) for row in rows]
+        return doc_info
+    
+    def _load_pdf_streaming(self, file_path: str,
+                            on_progress: Optional[Callable[[int, int], None]] = None) -> Tuple[Dict[str, Any], Iterator[Tuple[str, str]]]:
+        """Load a PDF filing from a page stream, keeping neither per-page text nor the joined text.
+        
+        Returns the document info and an iterator of (section_name, part)
+        read back from the page spool, to be stored part by part. Pages are
+        scored for statement tables as they stream past, so the tables stage
+        opens only the candidate pages.
+        """
+        table_pages = []
+        page_count = 0
+        
+        def score_page(page_number: int, text: str):
+            nonlocal page_count
+            page_count = page_number
+            if self.table_extractor.score_page(text) >= self.table_extractor.page_score_threshold:
+                table_pages.append(page_number)
+        
+        parts = self.sec_processor.iter_pdf_sections(file_path, on_page=score_page, on_progress=on_progress)
+        # Every page is extracted before the first part comes out; do that
+        # here rather than inside the transaction that stores the parts
+        first = next(parts, None)
+        if first is not None:
+            parts = itertools.chain([first], parts)
+        
+        doc_info = {
+            'title': os.path.basename(file_path),
+            'table_pages': table_pages,
+            'page_count': page_count,
+            'file_type': '.pdf',
+            'status': 'success'
+        }
+        return doc_info, parts
+    
+    def _stage_tables(self, document_id: int, file_path: str, doc_info: Dict[str, Any]) -> List[Any]:
+        return self._extract_tables(file_path, doc_info)
+    
+    def _stage_financial_data(self, document_id: int, doc_info: Dict[str, Any], tables: List[Any]) -> Dict[str, Any]:
+        financial_data = self._parse_xbrl_financial_data(doc_info)
+        return self._parse_financial_tables(tables, financial_data)
+    
+    def _financial_data_reconciles(self, financial_data: Dict[str, Any]) -> bool:
+        # Artifacts from before multi-period parsing have no 'periods', those
+        # from before unit scaling no 'scale' and those from before derived
+        # items were marked no 'derived'; none of them can be kept
+        periods = financial_data.get('periods')
+        if not periods or not all('scale' in statement and 'derived' in statement for statement in periods.values()):
+            return False
+        return self.financial_parser.validate_statements(financial_data)['consistent']
+    
+    def _stage_tldr(self, document_id: int, doc_info: Dict[str, Any]) -> Dict[str, Any]:
+        key_sections = self.report_summarizer.key_sections
+        sections = self.db.get_document_sections(document_id, key_sections)
+        if not sections and any(name in key_sections for name, _ in doc_info['section_hashes']):
+            raise RuntimeError(f"Failed to read sections of document {document_id}")
+        
+        progress = StageProgress(self.db, document_id, "tldr", "sections")
+        tldr = self.report_summarizer.create_tldr(sections, on_progress=progress.update)
+        progress.finish()
+        return tldr
+    
+    def _stage_embeddings(self, document_id: int, doc_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Chunk and embed the sections the load stage stored, reusing embeddings of unchanged chunk text"""
+        return self.reconcile_chunks(document_id)
+    
+    def reconcile_chunks(self, document_id: int, sections: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Bring a document's stored chunks in line with its sections and the current chunker.
+        
+        `sections`, when given, are stored first as the document's new section
+        text. Chunk boundaries are recomputed one stored section part at a
+        time; existing chunks are matched by the hash of their text, so only
+        new text is embedded and chunks that are no longer produced are
+        deleted. All chunk writes, and the removal of older section text, go
+        out in batches inside one transaction, so until it commits search
+        keeps slicing the old chunks out of the text they were cut from.
+        """
+        parts = None
+        if sections is None:
+            parts = self.db.get_section_parts(document_id)
+            # Sections stored before generations, or only as JSON content, are rewritten once
+            if parts is not None and (not parts or any(part['section_hash'] is None for part in parts)):
+                sections = self.get_document_sections(document_id)
+        
+        if sections is not None:
+            # Plain documents are stored as one unprefixed chunk stream
+            if not sections or list(sections) == ["full_document"]:
+                return {'status': 'skipped', 'chunks_processed': 0, 'embedded': 0, 'deleted': 0}
+            parts = self.db.store_section_generation(document_id, sections.items())
+        
+        if parts is None:
+            raise RuntimeError(f"Failed to store sections for document {document_id}")
+        if not parts:
+            return {'status': 'skipped', 'chunks_processed': 0, 'embedded': 0, 'deleted': 0}
+        
+        existing = self.db.get_chunk_fingerprints(document_id)
+        config = self.document_processor.chunker_config
+        
+        # Nothing to do when every part was chunked from the same text with the same settings
+        current = {(part['section_name'], part['id'], part['section_hash'], config) for part in parts}
+        stored = {
+            (row['section_name'], row['section_id'], row['section_hash'], row['chunker_config'])
+            for row in existing
+        }
+        if existing and current == stored:
+            return {'status': 'unchanged', 'chunks_processed': len(existing), 'embedded': 0, 'deleted': 0}
+        
+        # Match stored chunks by text hash, wherever they now fall
+        by_text = {}
+        for row in existing:
+            by_text.setdefault(row['text_hash'], []).append(row)
+        
+        fields = ('chunk_index', 'section_id', 'start_offset', 'end_offset',
+                  'section_name', 'section_hash', 'chunker_config')
+        chunk_count = 0
+        embedded = 0
+        progress = StageProgress(self.db, document_id, "embeddings", "sections", total=len(parts))
+        
+        with self.db.chunk_changes(document_id) as changes:
+            updated = []
+            new_chunks = []
+            for part in parts:
+                text = self.db.get_section_text(part['id'])
+                if text is None:
+                    raise RuntimeError(f"Failed to read section {part['section_name']} of document {document_id}")
+                
+                for chunk in self._build_chunks(part, text, first_index=chunk_count):
+                    chunk_count += 1
+                    matches = by_text.get(chunk['text_hash'])
+                    if not matches:
+                        new_chunks.append(chunk)
+                    else:
+                        row = matches.pop()
+                        if any(row[field] != chunk[field] for field in fields):
+                            updated.append(dict(chunk, id=row['id']))
+                    
+                    # Written in batches, so memory doesn't grow with the document
+                    if len(new_chunks) >= self.embedding_batch_size:
+                        embedded += self._insert_new_chunks(changes, new_chunks)
+                        new_chunks = []
+                    if len(updated) >= self.embedding_batch_size:
+                        changes.update(updated)
+                        updated = []
+                progress.advance()
+            
+            embedded += self._insert_new_chunks(changes, new_chunks)
+            changes.update(updated)
+            
+            deleted_ids = [row['id'] for rows in by_text.values() for row in rows]
+            changes.delete(deleted_ids)
+            changes.retire_sections(parts[0]['generation'])
+        progress.finish()
+        
+        return {
+            'status': 'reconciled',
+            'chunks_processed': chunk_count,
+            'embedded': embedded,
+            'deleted': len(deleted_ids)
+        }
+    
+    def _insert_new_chunks(self, changes, chunks: List[Dict[str, Any]]) -> int:
+        """Embed a batch of chunks in one model call and write them"""
+        if not chunks:
+            return 0
+        
+        embeddings = self._embedding_queue([chunk['embed_text'] for chunk in chunks])
+        for chunk, embedding in zip(chunks, embeddings):
+            chunk['embedding'] = embedding
+        changes.insert(chunks)
+        return len(chunks)
+    
+    def reconcile_all_chunks(self) -> Dict[str, int]:
+        """Reconcile the chunks of every document, e.g. after changing chunker settings"""
+        totals = {'documents': 0, 'changed': 0, 'embedded': 0, 'deleted': 0}
+        
+        for document_id in self.db.get_document_ids():
+            result = self.reconcile_chunks(document_id)
+            totals['documents'] += 1
+            if result['status'] == 'reconciled':
+                totals['changed'] += 1
+                totals['embedded'] += result['embedded']
+                totals['deleted'] += result['deleted']
+                print(f"Document {document_id}: {result['embedded']} chunks embedded, {result['deleted']} deleted")
+        
+        return totals
+    
+    def _build_chunks(self, part: Dict[str, Any], text: str, first_index: int = 0) -> List[Dict[str, Any]]:
+        """Split one stored section part into chunk rows locating their text by section id and offsets"""
+        config = self.document_processor.chunker_config
+        
+        return [
+            {
+                'embed_text': chunk['chunk_text'],
+                'chunk_index': first_index + position,
+                'section_id': part['id'],
+                'start_offset': chunk['start_offset'],
+                'end_offset': chunk['end_offset'],
+                'section_name': part['section_name'],
+                'section_hash': part['section_hash'],
+                'chunker_config': config,
+                'text_hash': self._text_hash(chunk['chunk_text'])
+            }
+            for position, chunk in enumerate(self.document_processor.split_document(text))
+        ]
+    
+    @staticmethod
+    def _text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+    
+    def _stage_analysis(self, document_id: int, doc_info: Dict[str, Any], financial_data: Dict[str, Any],
+                        tldr_summary: Dict[str, Any]) -> Dict[str, Any]:
+        """Store the combined analysis and its financial facts, replacing any earlier version"""
+        dei = doc_info.get('dei') or {}
+        analysis = {
+            'financial_data': financial_data,
+            'validation': self.financial_parser.validate_statements(financial_data),
+            'tldr_summary': tldr_summary,
+            # Cover-page identity, kept so facts can be rebuilt from the stored analysis
+            'entity': {
+                'company': dei.get('dei:EntityRegistrantName') or doc_info['title'],
+                'cik': dei.get('dei:EntityCentralIndexKey'),
+            },
+            'processing_status': 'complete'
+        }
+        
+        self.db.delete_analysis_results(document_id, 'sec_filing')
+        self.db.store_analysis_result(
+            document_id=document_id,
+            analysis_type='sec_filing',
+            analysis_result=json.dumps(analysis)
+        )
+        self.store_financial_facts(document_id, financial_data, **analysis['entity'])
+        
+        return analysis
+    
+    def _stage_financial_flow(self, document_id: int, financial_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Compute the Sankey flow once and store it for /financial-flow to serve"""
+        return self.store_financial_flow(document_id, financial_data)
+    
+    def store_financial_flow(self, document_id: int, financial_data: Dict[str, Any]) -> Dict[str, Any]:
+        flow = self.flow_analyzer.build_flow(financial_data)
+        self.db.replace_analysis_result(document_id, 'financial_flow', json.dumps(flow))
+        return flow
+    
+    def store_financial_facts(self, document_id: int, financial_data: Dict[str, Any],
+                              company: Optional[str] = None, cik: Optional[str] = None) -> int:
+        """Write a document's parsed statements to the financial_facts table, returning the row count"""
+        facts = self.financial_parser.flatten_facts(financial_data)
+        if not self.db.replace_financial_facts(document_id, facts, company=company, cik=cik):
+            return 0
+        return len(facts)
+    
+    def backfill_financial_facts(self) -> Dict[str, int]:
+        """Rebuild financial_facts from every stored SEC filing analysis"""
+        totals = {'documents': 0, 'facts': 0}
+        
+        for document_id in self.db.get_document_ids():
+            analysis_results = self.db.get_analysis_results(document_id, 'sec_filing')
+            if not analysis_results:
+                continue
+            
+            try:
+                analysis = json.loads(analysis_results[0]['analysis_result'])
+            except (TypeError, ValueError) as e:
+                print(f"Document {document_id}: unreadable analysis ({e})")
+                continue
+            
+            # Analyses stored before 'entity' existed fall back to the document title
+            entity = analysis.get('entity') or {}
+            if not entity.get('company'):
+                document = self.db.get_document(document_id) or {}
+                entity = {'company': document.get('title'), 'cik': entity.get('cik')}
+            
+            count = self.store_financial_facts(document_id, analysis.get('financial_data') or {}, **entity)
+            totals['documents'] += 1
+            totals['facts'] += count
+            print(f"Document {document_id}: {count} facts")
+        
+        return totals
+    
+    def _extract_tables(self, file_path: str, doc_info: Dict[str, Any]) -> List[Any]:
+        """Get the statement tables for a loaded filing"""
+        # HTML filings already carry their tables from the single parse pass
+        if doc_info.get('tables') is not None:
+            return [table for table in doc_info['tables'] if self.table_extractor.is_quality_table(table)]
+        
+        if file_path.endswith('.pdf'):
+            return self.table_extractor.extract_tables_from_pdf(
+                file_path, page_texts=doc_info.get('page_texts'), page_numbers=doc_info.get('table_pages')
+            )
+        
+        return []
+    
+    def _parse_financial_tables(self, tables: List[Any], financial_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Parse extracted tables into financial_data, keeping anything already there"""
+        for table in tables:
+            # Clean the table
+            clean_table = self.table_extractor.clean_financial_table(table)
+            
+            # Identify table type
+            table_type = self.table_extractor.identify_statement_type(clean_table)
+            
+            # Parse table based on type
+            # Inline XBRL facts are exact, so they win over table heuristics
+            if table_type in self.financial_parser.statement_schemas and table_type not in financial_data:
+                columnar = self.financial_parser.parse_statement_periods(table_type, clean_table)
+                self._add_statement(financial_data, table_type, columnar)
+        
+        return financial_data
+    
+    def _add_statement(self, financial_data: Dict[str, Any], statement_type: str, columnar: Dict[str, Any]):
+        """Store a parsed statement: its latest period, plus every period under 'periods'.
+        
+        A statement that matched nothing is left out, so a later table can fill it.
+        """
+        latest = self.financial_parser.latest_period(columnar)
+        if any(value is not None for value in latest.values()):
+            financial_data[statement_type] = latest
+            financial_data.setdefault('periods', {})[statement_type] = columnar
+    
+    def _parse_xbrl_financial_data(self, doc_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Build financial data from inline XBRL facts, when the filing has them"""
+        financial_data = {}
+        
+        if doc_info.get('xbrl_facts'):
+            for statement_type in self.financial_parser.statement_schemas:
+                columnar = self.financial_parser.parse_xbrl_statement_periods(statement_type, doc_info['xbrl_facts'])
+                self._add_statement(financial_data, statement_type, columnar)
+        
+        return financial_data
+    
+    @staticmethod
+    def _is_sec_filing(file_path: str) -> bool:
         """Determine if a file is an SEC filing based on name or content."""
         file_name = os.path.basename(file_path).lower()
         
@@ -161,13 +550,48 @@ class MLManager:
         # 2. Look for EDGAR submission numbers
         # 3. Check for standard SEC form structure
         
+        # EDGAR full-submission files identify themselves in their SGML header
+        if EdgarSubmissionReader.is_submission_file(file_path):
+            return True
+        
         # For now, we'll also treat PDFs as potential SEC filings
         if file_path.endswith('.pdf'):
             return True
             
         return False
     
-    def _process_standard_document(self, file_path: str) -> Dict[str, Any]:
+    def process_standard_document_background(self, file_path: str, document_id: int) -> None:
+        """Process an uploaded standard document into its already stored row.
+        
+        Errors are re-raised so the job worker can retry; the uploaded file is
+        kept until processing succeeds.
+        """
+        self.db.update_processing_status(
+            document_id=document_id,
+            status="parsing",
+            message="Loading and embedding document"
+        )
+        
+        # Drop chunks left by an earlier, failed attempt
+        stale_ids = [row['id'] for row in self.db.get_chunk_fingerprints(document_id)]
+        if stale_ids:
+            with self.db.chunk_changes(document_id) as changes:
+                changes.delete(stale_ids)
+        
+        result = self._process_standard_document(file_path, document_id=document_id)
+        if result.get('status') != 'success':
+            raise RuntimeError(result.get('message', 'Failed to process document'))
+        
+        self.db.update_processing_status(
+            document_id=document_id,
+            status="complete",
+            message="Processing completed successfully"
+        )
+        
+        if os.path.exists(file_path):
+            os.remove(file_path)
+    
+    def _process_standard_document(self, file_path: str, document_id: Optional[int] = None) -> Dict[str, Any]:
         """Process a standard document (non-SEC filing)."""
         # Step 1: Load the document
         doc_info = self.document_processor.load_document(file_path)
@@ -175,12 +599,16 @@ class MLManager:
         if doc_info.get('status') == 'error':
             return doc_info
         
-        # Step 2: Store the document in the database
-        document_id = self.db.store_document(
-            title=doc_info['title'],
-            content=doc_info['content'],
-            file_type=doc_info['file_type']
-        )
+        # Step 2: Store the document in the database, or fill in a queued one
+        if document_id:
+            if not self.db.update_document(document_id, content=doc_info['content']):
+                return {'status': 'error', 'message': 'Failed to update document in database'}
+        else:
+            document_id = self.db.store_document(
+                title=doc_info['title'],
+                content=doc_info['content'],
+                file_type=doc_info['file_type']
+            )
         
         if not document_id:
             return {'status': 'error', 'message': 'Failed to store document in database'}
@@ -229,97 +657,37 @@ class MLManager:
     
     def process_sec_filing(self, file_path: str) -> Dict[str, Any]:
         """Process an SEC filing and extract structured data."""
-        # Step 1: Load and process the SEC document
-        doc_info = self.sec_processor.load_from_file(file_path)
-        
-        if doc_info.get('status') == 'error':
-            return doc_info
-        
-        # Step 2: Store the document in the database
+        return self._ingest_sec_filing(file_path)
+    
+    def _ingest_sec_filing(self, file_path: str) -> Dict[str, Any]:
+        """Store an SEC filing and run its ingest stages."""
+        # Step 1: Store the document; the load stage fills in its title and sections
         document_id = self.db.store_document(
-            title=doc_info['title'],
-            content=json.dumps(doc_info['sections']),  # Store sections as JSON
-            file_type=doc_info.get('file_type', os.path.splitext(file_path)[1])
+            title=os.path.splitext(os.path.basename(file_path))[0],
+            content='',
+            file_type=os.path.splitext(file_path)[1]
         )
         
         if not document_id:
             return {'status': 'error', 'message': 'Failed to store document in database'}
         
-        # Step 3: Extract tables from the document
-        tables = []
-        
-        if file_path.endswith('.pdf'):
-            tables = self.table_extractor.extract_tables_from_pdf(file_path)
-        elif file_path.endswith(('.html', '.htm')):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                html_content = f.read()
-            tables = self.table_extractor.extract_tables_from_html(html_content)
-        
-        # Step 4: Process and store tables
-        financial_data = {}
-        
-        for idx, table in enumerate(tables):
-            # Clean the table
-            clean_table = self.table_extractor.clean_financial_table(table)
-            
-            # Identify table type
-            table_type = self.table_extractor.identify_statement_type(clean_table)
-            
-            # Parse table based on type
-            if table_type == "income_statement":
-                parsed_data = self.financial_parser.parse_income_statement(clean_table)
-                financial_data['income_statement'] = parsed_data
-            # Add similar parsing for balance_sheet and cash_flow
-            
-            # Store table in database or file system
-            # ...
-        
-        # Step 5: Generate TLDR summary
-        tldr_summary = self.report_summarizer.create_tldr(doc_info['sections'])
+        # Step 2: Run the stage graph
+        try:
+            outputs = self.sec_filing_pipeline.run(document_id, file_path)
+        except Exception as e:
+            return {'status': 'error', 'document_id': document_id, 'message': str(e)}
         
-        # Step 6: Store sections as chunks for vector search
-        chunks = []
-        for section_name, section_text in doc_info['sections'].items():
-            section_chunks = self.document_processor.split_document(section_text)
-            
-            for chunk in section_chunks:
-                chunk['section'] = section_name
-                chunks.append(chunk)
-                
-                # Store the chunk
-                chunk_id = self.db.store_document_chunk(
-                    document_id=document_id,
-                    chunk_text=f"{section_name}: {chunk['chunk_text']}",
-                    chunk_index=len(chunks) - 1
-                )
-                
-                if not chunk_id:
-                    continue
-                
-                # Generate embedding for the chunk
-                embedding = self.embedding_generator.generate_embedding(chunk['chunk_text'])
-                
-                # Store the embedding
-                self.db.store_embedding(chunk_id=chunk_id, embedding=embedding)
-        
-        # Step 7: Store analysis results
-        self.db.store_analysis_result(
-            document_id=document_id,
-            analysis_type='sec_filing',
-            analysis_result=json.dumps({
-                'financial_data': financial_data,
-                'tldr_summary': tldr_summary
-            })
-        )
+        doc_info = outputs['load']
+        tldr_summary = outputs['tldr']
         
         return {
             'status': 'success',
             'document_id': document_id,
             'title': doc_info['title'],
-            'sections': list(doc_info['sections'].keys()),
-            'tables_extracted': len(tables),
-            'chunks_processed': len(chunks),
-            'has_financial_data': bool(financial_data),
+            'sections': list(dict.fromkeys(name for name, _ in doc_info['section_hashes'])),
+            'tables_extracted': len(outputs['tables']),
+            'chunks_processed': outputs['embeddings']['chunks_processed'],
+            'has_financial_data': bool(outputs['financial_data']),
             'tldr_summary': {
                 'length': len(tldr_summary.get('executive_summary', '')),
                 'sections': list(tldr_summary.get('sections', {}).keys())
@@ -374,13 +742,18 @@ class MLManager:
     def get_document_sections(self, document_id: int) -> Dict[str, str]:
         """Get document sections for a specific document."""
         try:
+            # Filings keep their sections in document_sections
+            sections = self.db.get_document_sections(document_id)
+            if sections:
+                return sections
+            
             # Get document content
             document = self.db.get_document(document_id)
             
             if not document:
                 return {}
             
-            # Try to parse content as JSON (sections)
+            # Filings ingested before document_sections have them as JSON content
             try:
                 sections = json.loads(document['content'])
                 if isinstance(sections, dict):
@@ -394,7 +767,8 @@ class MLManager:
             print(f"Error getting document sections: {str(e)}")
             return {}
 
-    def create_enhanced_tldr(self, document_id: int) -> Dict[str, Any]:
+    def create_enhanced_tldr(self, document_id: int,
+                             on_progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
         """Create an enhanced TLDR summary for a document."""
         try:
             # Get document sections
@@ -407,14 +781,10 @@ class MLManager:
                 }
             
             # Generate the enhanced TLDR
-            tldr = self.enhanced_summarizer.create_extended_tldr(sections)
+            tldr = self.enhanced_summarizer.create_extended_tldr(sections, on_progress=on_progress)
             
-            # Store the TLDR in the database
-            self.db.store_analysis_result(
-                document_id=document_id,
-                analysis_type='enhanced_tldr',
-                analysis_result=json.dumps(tldr)
-            )
+            # Store the TLDR in the database, replacing any earlier one
+            self.db.replace_analysis_result(document_id, 'enhanced_tldr', json.dumps(tldr))
             
             return {
                 "status": "success",
@@ -428,6 +798,16 @@ class MLManager:
                 "message": f"Failed to generate enhanced TLDR: {str(e)}"
             }
 
+    def create_extended_tldr_background(self, document_id: int) -> None:
+        """Create and store the extended TLDR of a processed document, for /extended-tldr to serve"""
+        progress = StageProgress(self.db, document_id, "enhanced_tldr", "sections")
+        result = self.create_enhanced_tldr(document_id, on_progress=progress.update)
+        
+        if result['status'] != 'success':
+            # Raise so the job queue retries it
+            raise RuntimeError(result['message'])
+        progress.finish()
+
     def generate_financial_flow(self, document_id: int) -> Dict[str, Any]:
         """Generate financial flow data for Sankey diagram."""
         try:
@@ -437,31 +817,14 @@ class MLManager:
             if financial_summary.get('status') == 'error':
                 return financial_summary
             
-            # Generate Sankey diagram data
-            flow_data = self.flow_analyzer.generate_sankey_data(
-                financial_summary.get('financial_data', {})
-            )
-            
-            # Generate insights about the financial flows
-            insights = self.flow_analyzer.generate_flow_insights(
-                financial_summary.get('financial_data', {})
-            )
-            
-            # Store the flow data in the database
-            self.db.store_analysis_result(
-                document_id=document_id,
-                analysis_type='financial_flow',
-                analysis_result=json.dumps({
-                    "flow_data": flow_data,
-                    "insights": insights
-                })
-            )
+            # Generate and store the Sankey diagram data and insights
+            flow = self.store_financial_flow(document_id, financial_summary.get('financial_data', {}))
             
             return {
                 "status": "success",
                 "document_id": document_id,
-                "flow_data": flow_data,
-                "insights": insights
+                "flow_data": flow["flow_data"],
+                "insights": flow["insights"]
             }
         except Exception as e:
             print(f"Error generating financial flow: {str(e)}")
@@ -473,13 +836,6 @@ class MLManager:
     def process_document_background(self, document_id: int) -> None:
         """Process a document in the background with progress tracking."""
         try:
-            # Update status to processing
-            self.db.update_processing_status(
-                document_id=document_id, 
-                status="parsing",
-                message="Extracting document content"
-            )
-            
             # Get document info
             document = self.db.get_document(document_id)
             if not document:
@@ -490,33 +846,37 @@ class MLManager:
                 )
                 return
             
-            # Step 1: Process document content
-            time.sleep(2)  # Simulate processing time
+            self.db.reset_processing_progress(document_id, ["enhanced_tldr", "financial_flow"])
             
-            # Update status
+            # Step 1: Summarize the document section by section
             self.db.update_processing_status(
                 document_id=document_id,
                 status="analyzing",
-                message="Analyzing document content"
+                message="Summarizing document sections"
             )
             
-            # Step 2: Generate embeddings and analyze document
-            time.sleep(3)  # Simulate processing time
+            tldr_progress = StageProgress(self.db, document_id, "enhanced_tldr", "sections")
+            try:
+                self.create_enhanced_tldr(document_id, on_progress=tldr_progress.update)
+            except Exception as e:
+                print(f"Error in TLDR generation: {str(e)}")
+            tldr_progress.finish()
             
-            # Update status
+            # Step 2: Generate the financial flow
             self.db.update_processing_status(
                 document_id=document_id,
                 status="generating_visualizations",
                 message="Generating visualizations"
             )
             
-            # Step 3: Generate TLDR and financial flow
+            flow_progress = StageProgress(self.db, document_id, "financial_flow", "steps", total=1)
             try:
-                self.create_enhanced_tldr(document_id)
                 self.generate_financial_flow(document_id)
             except Exception as e:
                 print(f"Error in visualization generation: {str(e)}")
                 # Continue processing even if visualizations fail
+            flow_progress.advance()
+            flow_progress.finish()
                 
             # Update status to complete
             self.db.update_processing_status(
@@ -533,4 +893,5 @@ class MLManager:
                 document_id=document_id,
                 status="error",
                 message=f"Error processing document: {str(e)}"
-            )
\ No newline at end of file
+            )
+            raise
@@ -1,20 +1,29 @@
 from langchain_community.document_loaders import UnstructuredPDFLoader
 from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import TextLoader
 import PyPDF2
 import io
 import os
+import re
 from typing import List, Dict, Any
 
+# Break points for chunk ends, best first
+SEPARATORS = ("\n\n", "\n", ". ", " ")
+
+NON_SPACE = re.compile(r'\S')
+SPACE = re.compile(r'\s')
+
 class DocumentProcessor:
     def __init__(self, chunk_size=1000, chunk_overlap=200):
+        if chunk_overlap >= chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_size ({chunk_size})")
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size, 
-            chunk_overlap=chunk_overlap
-        )
+    
+    @property
+    def chunker_config(self) -> str:
+        """Identifies the splitter settings that produced a chunk"""
+        return f"single-pass:{self.chunk_size}:{self.chunk_overlap}"
     
     def load_document(self, file_path: str) -> Dict[str, Any]:
         """Load a document from file path."""
@@ -70,17 +79,63 @@ class DocumentProcessor:
             }
     
     def split_document(self, content: str) -> List[Dict[str, Any]]:
-        """Split document content into chunks."""
+        """Split document content into chunks.
+        
+        Each chunk carries its [start_offset, end_offset) character range in
+        `content`, so it can be stored as a slice of the source text.
+        """
         try:
-            chunks = self.text_splitter.split_text(content)
-            
             return [{
-                'chunk_text': chunk,
-                'chunk_index': i
-            } for i, chunk in enumerate(chunks)]
+                'chunk_text': content[start:end],
+                'chunk_index': i,
+                'start_offset': start,
+                'end_offset': end
+            } for i, (start, end) in enumerate(self._chunk_spans(content))]
             
         except Exception as e:
             return [{
                 'status': 'error',
                 'message': f'Error splitting document: {str(e)}'
-            }]
\ No newline at end of file
+            }]
+    
+    def _chunk_spans(self, text: str):
+        """Yield (start, end) chunk ranges in one left-to-right pass.
+        
+        A chunk ends at the last paragraph, line, sentence or word break in
+        the back half of its chunk_size window (or at the window edge if
+        there is none), and the next chunk starts at the first word boundary
+        at most chunk_overlap characters before that end. Whitespace around
+        chunks is trimmed.
+        """
+        length = len(text)
+        match = NON_SPACE.search(text)
+        start = match.start() if match else length
+        
+        while start < length:
+            limit = start + self.chunk_size
+            end = length
+            
+            if limit < length:
+                end = limit
+                floor = start + self.chunk_size // 2
+                for separator in SEPARATORS:
+                    cut = text.rfind(separator, floor, limit)
+                    if cut != -1:
+                        # Keep the sentence's full stop, drop the whitespace
+                        end = cut + len(separator.rstrip())
+                        break
+            
+            trimmed = len(text[start:end].rstrip())
+            if trimmed:
+                yield start, start + trimmed
+            
+            if end >= length:
+                break
+            
+            # Step back for the overlap, then forward to the next word
+            next_start = max(end - self.chunk_overlap, start + 1)
+            if not text[next_start - 1].isspace():
+                match = SPACE.search(text, next_start, end)
+                next_start = match.start() if match else end
+            match = NON_SPACE.search(text, next_start)
+            start = match.start() if match else length
@@ -0,0 +1,153 @@
+import re
+from typing import BinaryIO, Iterator
+
+# Wrapper tags EDGAR puts around XBRL and other structured document bodies
+_BODY_WRAPPERS = {b"<XBRL>", b"</XBRL>", b"<XML>", b"</XML>"}
+
+_HEADER_FIELD = re.compile(rb"^\s*([A-Z][A-Z0-9 \-]+):\s*(.*?)\s*$")
+
+# Some filings put megabytes of HTML on one line; cap reads to bound memory
+MAX_LINE_BYTES = 1 << 20
+
+
+def _iter_lines(fileobj: BinaryIO) -> Iterator[bytes]:
+    return iter(lambda: fileobj.readline(MAX_LINE_BYTES), b"")
+
+
+class SubmissionDocument:
+    """One <DOCUMENT> block of an EDGAR full-submission file.
+
+    The body is read lazily from the underlying file; anything the caller
+    does not consume is skipped line by line without being kept in memory.
+    """
+
+    def __init__(self, fileobj: BinaryIO):
+        self._file = fileobj
+        self._first_line = None
+        self._finished = False
+
+        self.document_type = ""
+        self.sequence = None
+        self.filename = ""
+        self.description = ""
+
+        self._read_header()
+
+    @property
+    def is_uuencoded(self) -> bool:
+        """True for binary exhibits (images, PDFs, zips) embedded with uuencode"""
+        return bool(self._first_line) and self._first_line.startswith(b"begin ")
+
+    @property
+    def is_html(self) -> bool:
+        return self.filename.lower().endswith((".htm", ".html"))
+
+    def iter_lines(self) -> Iterator[bytes]:
+        """Yield the raw body lines between <TEXT> and </TEXT>"""
+        if self._finished:
+            return
+
+        line = self._first_line
+        self._first_line = None
+
+        while line:
+            if line.startswith(b"</TEXT>"):
+                break
+            if line.strip() not in _BODY_WRAPPERS:
+                yield line
+            line = self._file.readline(MAX_LINE_BYTES)
+
+        self._skip_to_end()
+
+    def iter_chunks(self, chunk_size: int = 1 << 20) -> Iterator[bytes]:
+        """Yield the body in roughly chunk_size byte pieces for incremental parsers"""
+        buffer = []
+        size = 0
+
+        for line in self.iter_lines():
+            buffer.append(line)
+            size += len(line)
+            if size >= chunk_size:
+                yield b"".join(buffer)
+                buffer = []
+                size = 0
+
+        if buffer:
+            yield b"".join(buffer)
+
+    def skip(self):
+        """Discard the rest of the document without decoding it"""
+        for _ in self.iter_lines():
+            pass
+
+    def _read_header(self):
+        for line in _iter_lines(self._file):
+            stripped = line.strip()
+
+            if stripped.startswith(b"<TYPE>"):
+                self.document_type = stripped[6:].decode("ascii", "ignore").strip().upper()
+            elif stripped.startswith(b"<SEQUENCE>"):
+                self.sequence = stripped[10:].decode("ascii", "ignore").strip()
+            elif stripped.startswith(b"<FILENAME>"):
+                self.filename = stripped[10:].decode("ascii", "ignore").strip()
+            elif stripped.startswith(b"<DESCRIPTION>"):
+                self.description = stripped[13:].decode("ascii", "ignore").strip()
+            elif stripped.startswith(b"<TEXT>"):
+                break
+
+        # Peek at the first non-empty body line so callers can tell what it holds
+        for line in _iter_lines(self._file):
+            if line.strip() in _BODY_WRAPPERS or not line.strip():
+                continue
+            self._first_line = line
+            break
+
+    def _skip_to_end(self):
+        if self._finished:
+            return
+        self._finished = True
+
+        for line in _iter_lines(self._file):
+            if line.startswith(b"</DOCUMENT>"):
+                break
+
+
+class EdgarSubmissionReader:
+    """Streaming splitter for EDGAR full-submission (.txt) files"""
+
+    def __init__(self, fileobj: BinaryIO):
+        self._file = fileobj
+        self._header_done = False
+        self.header = {}
+
+    @staticmethod
+    def is_submission_file(file_path: str) -> bool:
+        """Check whether a file starts like an EDGAR SGML submission"""
+        try:
+            with open(file_path, "rb") as f:
+                head = f.read(2048)
+        except OSError:
+            return False
+        return b"<SEC-DOCUMENT>" in head or b"<SEC-HEADER>" in head or b"<SUBMISSION>" in head
+
+    def documents(self) -> Iterator[SubmissionDocument]:
+        """Yield each <DOCUMENT> in file order, skipping any the caller leaves unread"""
+        for line in _iter_lines(self._file):
+            if line.startswith(b"<DOCUMENT>"):
+                document = SubmissionDocument(self._file)
+                yield document
+                document.skip()
+            elif not self._header_done:
+                self._read_header_line(line)
+
+    def _read_header_line(self, line: bytes):
+        """Collect `FIELD: value` pairs from the SEC-HEADER block"""
+        if line.startswith(b"</SEC-HEADER>"):
+            self._header_done = True
+            return
+
+        match = _HEADER_FIELD.match(line)
+        if match and match.group(2):
+            key = match.group(1).decode("ascii", "ignore").strip().lower().replace(" ", "_")
+            # Keep the filer's values; later blocks repeat fields for other parties
+            self.header.setdefault(key, match.group(2).decode("latin-1").strip())
@@ -1,11 +1,193 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, Any, List, Optional
+from datetime import date, timedelta
+from typing import Dict, Any, List, Optional, Tuple
 import re
 
+# A table cell holding a single amount: optional sign or balanced parentheses, $ (outside
+# or inside the parentheses), thousands separators
+AMOUNT_PATTERN = re.compile(r'(\$)?\s*(\()?\s*([-\u2212])?\s*(?(1)|\$?)\s*(\d[\d,]*(?:\.\d+)?)\s*(?(2)\))')
+
+# Period headers: a year, and optionally which quarter it is
+YEAR_PATTERN = re.compile(r'\b(?:19|20)\d{2}\b')
+QUARTER_PATTERN = re.compile(r'\bq([1-4])\b|\b(first|second|third|fourth) (?:fiscal )?quarter\b|\b(?:three|3) months\b')
+MONTH_PATTERN = re.compile(r'\b(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\b')
+ORDINAL_QUARTERS = {"first": 1, "second": 2, "third": 3, "fourth": 4}
+MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+
+# Header rows (period captions) are looked for among the first rows of a table
+MAX_HEADER_ROWS = 6
+
+
+def normalize_labels(labels: List[Any]) -> List[str]:
+    """Lowercase line-item labels and reduce punctuation and footnote marks to single spaces.
+    
+    All labels are normalized in one pass over their joined text; labels
+    that aren't strings become empty.
+    """
+    text = '\n'.join(label if isinstance(label, str) else '' for label in labels).lower()
+    text = re.sub(r'[^a-z0-9\n]+', ' ', text)
+    return re.sub(r' ?\n ?', '\n', text).strip(' ').split('\n')
+
+
+def to_numbers(frame: pd.DataFrame) -> pd.DataFrame:
+    """Parse every cell of a table into a float in one pass over all cells.
+    
+    Numbers are kept; text cells count only if they hold a single amount,
+    with "(1,234)" and "-1,234" both becoming -1234.0. Anything else
+    (dashes, notes, headings) becomes NaN.
+    """
+    values = np.fromiter(
+        (_amount(cell) for cell in frame.to_numpy(dtype=object).ravel()),
+        dtype=float,
+        count=frame.size
+    )
+    return pd.DataFrame(values.reshape(frame.shape), index=frame.index, columns=frame.columns)
+
+
+def _amount(cell: Any) -> float:
+    if isinstance(cell, (int, float, np.number)) and not isinstance(cell, bool):
+        return float(cell)
+    
+    match = AMOUNT_PATTERN.fullmatch(str(cell).strip())
+    if not match:
+        return np.nan
+    
+    value = float(match.group(4).replace(',', ''))
+    return -value if match.group(2) or match.group(3) else value
+
+
+def period_label(header: str, default_quarter: Optional[int] = None) -> Optional[str]:
+    """Label the period a column header describes: "FY2023", "2023-Q3", or None.
+    
+    The last year in the header is the period's year. A quarter comes from
+    "Q3", "third quarter" or "three months ended <month>"; `default_quarter`
+    applies to headers that give only a year under a quarterly caption.
+    """
+    text = header.lower()
+    years = YEAR_PATTERN.findall(text)
+    if not years:
+        return None
+    
+    quarter = _quarter(text) or default_quarter
+    return f"{years[-1]}-Q{quarter}" if quarter else f"FY{years[-1]}"
+
+
+def _quarter(text: str) -> Optional[int]:
+    match = QUARTER_PATTERN.search(text)
+    if not match:
+        return None
+    if match.group(1):
+        return int(match.group(1))
+    if match.group(2):
+        return ORDINAL_QUARTERS[match.group(2)]
+    
+    # "Three months ended September 30": the quarter ending in that month
+    month = MONTH_PATTERN.search(text, match.end())
+    return MONTHS.index(month.group(1)) // 3 + 1 if month else None
+
+
+def period_sort_key(label: str) -> Tuple[int, int]:
+    """Chronological sort key of a period label; a fiscal year sorts with its last quarter"""
+    if label.startswith("FY"):
+        return int(label[2:]), 4
+    year, quarter = label.split("-Q")
+    return int(year), int(quarter)
+
+
+def period_parts(label: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    """(fiscal year, quarter) of a period label; quarter is None for a full year"""
+    if not label:
+        return None, None
+    if label.startswith("FY"):
+        return int(label[2:]), None
+    year, quarter = label.split("-Q")
+    return int(year), int(quarter)
+
+
+def _parse_date(value: Optional[str]) -> Optional[date]:
+    try:
+        return date.fromisoformat(value.strip()[:10]) if value else None
+    except ValueError:
+        return None
+
+
+def _duration_label(start: date, end: date) -> Optional[str]:
+    """Period label of an XBRL duration context: a fiscal year, a quarter, or None for other spans"""
+    days = (end - start).days
+    if 350 <= days <= 380:
+        return f"FY{end.year}"
+    if 80 <= days <= 100:
+        return f"{end.year}-Q{(end.month - 1) // 3 + 1}"
+    return None
+
+
+class LineItemMatcher:
+    """Match statement line-item labels to schema categories in one regex pass.
+    
+    Every keyword of the schema goes into a single precompiled alternation
+    (longest first, on word boundaries, plural 's' allowed), which scans the
+    joined, normalized label column once. Each hit is scored by the share
+    of the label its keyword covers, so a row goes to the category it
+    matches most specifically and each category takes its best-scoring row,
+    rather than the first keyword that happens to appear.
+    """
+    
+    def __init__(self, schema: Dict[str, List[str]]):
+        self.categories = list(schema)
+        self.keyword_category = {}
+        for category, keywords in schema.items():
+            for keyword in normalize_labels(keywords):
+                self.keyword_category.setdefault(keyword, category)
+        
+        alternation = '|'.join(re.escape(keyword) for keyword in sorted(self.keyword_category, key=len, reverse=True))
+        self.pattern = re.compile(rf'\b({alternation})s?\b')
+        self.category_order = {category: order for order, category in enumerate(self.categories)}
+    
+    def match(self, labels: List[Any], has_value: Optional[np.ndarray] = None) -> Dict[str, int]:
+        """Return {category: row position} for the best row of each matched category.
+        
+        Rows where `has_value` is False are not considered. Ties go to the
+        later row, which in statements is usually the total.
+        """
+        normalized = normalize_labels(labels)
+        line_starts = np.cumsum([0] + [len(line) + 1 for line in normalized[:-1]])
+        text = '\n'.join(normalized)
+        
+        # Best (score, category) for each row
+        row_best = {}
+        for hit in self.pattern.finditer(text):
+            row = int(np.searchsorted(line_starts, hit.start(), side='right')) - 1
+            if has_value is not None and not has_value[row]:
+                continue
+            
+            category = self.keyword_category[hit.group(1)]
+            candidate = (len(hit.group(0)) / len(normalized[row]), -self.category_order[category], category)
+            if row not in row_best or candidate > row_best[row]:
+                row_best[row] = candidate
+        
+        # Best row for each category, the later one on a tie
+        best = {}
+        for row, (score, _, category) in row_best.items():
+            if category not in best or (score, row) >= best[category]:
+                best[category] = (score, row)
+        
+        return {category: row for category, (score, row) in best.items()}
+
+
 class FinancialStatementParser:
     """Parse and structure financial statements from extracted tables"""
     
+    # Relative difference tolerated by the cross-statement checks (rounding in the filing)
+    VALIDATION_TOLERANCE = 0.01
+    
+    # Wordings of the cash flow activity totals, before "... activities"
+    CASH_FLOW_TOTAL_PREFIXES = [
+        "net cash provided by used in", "net cash used in provided by", "net cash provided by",
+        "net cash used in", "net cash from", "net cash flows from", "net cash generated from",
+        "cash provided by used in", "cash provided by", "cash used in", "cash generated from"
+    ]
+    
     def __init__(self):
         # Define schemas for each statement type
         self.income_statement_schema = {
@@ -22,66 +204,492 @@ class FinancialStatementParser:
             # Add more categories as needed
         }
         
-        # Similar schemas for balance sheet and cash flow statement
-        # ...
+        # Subtotals are listed in full ("total current assets") so the most
+        # specific keyword wins over the shorter grand total it contains
+        self.balance_sheet_schema = {
+            "cash_and_equivalents": ["cash and cash equivalents", "cash and equivalents", "cash"],
+            "current_assets": ["total current assets", "current assets"],
+            "total_assets": ["total assets"],
+            "current_liabilities": ["total current liabilities", "current liabilities"],
+            "long_term_debt": ["long term debt", "long term borrowings", "notes payable non current"],
+            "total_liabilities": ["total liabilities"],
+            "retained_earnings": ["retained earnings", "accumulated deficit"],
+            "total_equity": ["total stockholders equity", "total shareholders equity", "total equity",
+                             "stockholders equity", "shareholders equity"],
+            "total_liabilities_and_equity": ["total liabilities and stockholders equity",
+                                             "total liabilities and shareholders equity",
+                                             "total liabilities and equity"]
+        }
+        
+        # Activity totals are matched by their full "net cash ..." wording,
+        # since individual lines also mention the activity
+        self.cash_flow_schema = {
+            "operating_cash_flow": [
+                f"{prefix} operating activities" for prefix in self.CASH_FLOW_TOTAL_PREFIXES
+            ],
+            "investing_cash_flow": [
+                f"{prefix} investing activities" for prefix in self.CASH_FLOW_TOTAL_PREFIXES
+            ],
+            "financing_cash_flow": [
+                f"{prefix} financing activities" for prefix in self.CASH_FLOW_TOTAL_PREFIXES
+            ],
+            "capital_expenditures": ["capital expenditures", "purchases of property and equipment",
+                                     "purchases of property plant and equipment", "purchase of property and equipment"],
+            "dividends_paid": ["dividends paid", "payments of dividends", "payment of dividends"],
+            "share_repurchases": ["repurchases of common stock", "repurchase of common stock", "share repurchases"],
+            "exchange_rate_effect": ["effect of exchange rate changes", "effect of exchange rate",
+                                     "effect of foreign exchange rate changes"],
+            "net_change_in_cash": ["net increase in cash", "net decrease in cash", "net increase decrease in cash",
+                                   "net decrease increase in cash", "net change in cash"],
+            "cash_beginning": ["beginning of period", "beginning of year", "beginning of the year",
+                               "beginning of the period"],
+            "cash_ending": ["end of period", "end of year", "end of the year", "end of the period"]
+        }
+        
+        self.statement_schemas = {
+            "income_statement": self.income_statement_schema,
+            "balance_sheet": self.balance_sheet_schema,
+            "cash_flow": self.cash_flow_schema
+        }
+        
+        # One compiled matcher per statement type
+        self.matchers = {
+            statement_type: LineItemMatcher(schema)
+            for statement_type, schema in self.statement_schemas.items()
+        }
+        
+        # US-GAAP concepts for each category, in order of preference
+        self.income_statement_concepts = {
+            "revenue": ["us-gaap:Revenues", "us-gaap:RevenueFromContractWithCustomerExcludingAssessedTax",
+                        "us-gaap:SalesRevenueNet"],
+            "cost_of_goods_sold": ["us-gaap:CostOfRevenue", "us-gaap:CostOfGoodsAndServicesSold"],
+            "gross_profit": ["us-gaap:GrossProfit"],
+            "operating_expenses": ["us-gaap:OperatingExpenses", "us-gaap:CostsAndExpenses"],
+            "wages": ["us-gaap:LaborAndRelatedExpense"],
+            "net_profit": ["us-gaap:NetIncomeLoss", "us-gaap:ProfitLoss"],
+            "depreciation_amortization": ["us-gaap:DepreciationDepletionAndAmortization",
+                                          "us-gaap:DepreciationAndAmortization"],
+            "interest_expense": ["us-gaap:InterestExpense"]
+        }
+        
+        self.balance_sheet_concepts = {
+            "cash_and_equivalents": ["us-gaap:CashAndCashEquivalentsAtCarryingValue"],
+            "current_assets": ["us-gaap:AssetsCurrent"],
+            "total_assets": ["us-gaap:Assets"],
+            "current_liabilities": ["us-gaap:LiabilitiesCurrent"],
+            "long_term_debt": ["us-gaap:LongTermDebtNoncurrent", "us-gaap:LongTermDebt"],
+            "total_liabilities": ["us-gaap:Liabilities"],
+            "retained_earnings": ["us-gaap:RetainedEarningsAccumulatedDeficit"],
+            "total_equity": ["us-gaap:StockholdersEquity",
+                             "us-gaap:StockholdersEquityIncludingPortionAttributableToNoncontrollingInterest"],
+            "total_liabilities_and_equity": ["us-gaap:LiabilitiesAndStockholdersEquity"]
+        }
+        
+        cash_concepts = ["us-gaap:CashCashEquivalentsRestrictedCashAndRestrictedCashEquivalents",
+                         "us-gaap:CashAndCashEquivalentsAtCarryingValue"]
+        self.cash_flow_concepts = {
+            "operating_cash_flow": ["us-gaap:NetCashProvidedByUsedInOperatingActivities"],
+            "investing_cash_flow": ["us-gaap:NetCashProvidedByUsedInInvestingActivities"],
+            "financing_cash_flow": ["us-gaap:NetCashProvidedByUsedInFinancingActivities"],
+            "capital_expenditures": ["us-gaap:PaymentsToAcquirePropertyPlantAndEquipment"],
+            "dividends_paid": ["us-gaap:PaymentsOfDividends", "us-gaap:PaymentsOfDividendsCommonStock"],
+            "share_repurchases": ["us-gaap:PaymentsForRepurchaseOfCommonStock"],
+            "exchange_rate_effect": [
+                "us-gaap:EffectOfExchangeRateOnCashCashEquivalentsRestrictedCashAndRestrictedCashEquivalents",
+                "us-gaap:EffectOfExchangeRateOnCashAndCashEquivalents"
+            ],
+            "net_change_in_cash": [
+                "us-gaap:CashCashEquivalentsRestrictedCashAndRestrictedCashEquivalentsPeriodIncreaseDecreaseIncludingExchangeRateEffect",
+                "us-gaap:CashAndCashEquivalentsPeriodIncreaseDecrease"
+            ],
+            "cash_beginning": cash_concepts,
+            "cash_ending": cash_concepts
+        }
+        
+        self.statement_concepts = {
+            "income_statement": self.income_statement_concepts,
+            "balance_sheet": self.balance_sheet_concepts,
+            "cash_flow": self.cash_flow_concepts
+        }
+        
+        # Opening balances are read from the instant before the latest period
+        self.opening_balance_categories = {"cash_beginning"}
     
-    def parse_income_statement(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Parse income statement into standardized format"""
-        result = {category: None for category in self.income_statement_schema.keys()}
+    def parse_statement(self, statement_type: str, df: pd.DataFrame) -> Dict[str, Any]:
+        """Parse a statement table of the given type into its standardized format (latest period)"""
+        return self.latest_period(self.parse_statement_periods(statement_type, df))
+    
+    def parse_statement_periods(self, statement_type: str, df: pd.DataFrame) -> Dict[str, Any]:
+        """Parse every period column of a statement table into columnar form.
+        
+        Returns {"periods": [labels, oldest first], "values": {category:
+        [one value per period]}, "scale": unit of the source table,
+        "derived": [categories calculated rather than read, per period]},
+        with None for missing values. Periods are read from the column headers;
+        when they can't be, the columns are taken to be in chronological
+        order and labelled None.
+        """
+        schema = self.statement_schemas[statement_type]
+        # Cleaned tables record the unit their amounts were converted from
+        scale = df.attrs.get('scale', 1.0)
+        result = {"periods": [], "values": {category: [] for category in schema.keys()}, "scale": scale,
+                  "derived": []}
         
         try:
             # First column usually contains item names
-            if df.shape[1] > 0 and df.shape[0] > 0:
-                items_col = df.iloc[:, 0]
-                
-                # Find numeric columns
-                numeric_cols = []
-                for i in range(1, df.shape[1]):
-                    if df.iloc[:, i].dtype in [np.float64, np.int64] or pd.to_numeric(df.iloc[:, i], errors='coerce').notna().any():
-                        numeric_cols.append(i)
-                
-                if not numeric_cols:
-                    return result
-                    
-                values_col_idx = numeric_cols[-1]  # Use most recent period
-                
-                # Match items to schema categories
-                for row_idx, item_name in enumerate(items_col):
-                    if not isinstance(item_name, str):
-                        continue
-                        
-                    item_name_lower = str(item_name).lower()
-                    
-                    for category, keywords in self.income_statement_schema.items():
-                        if any(keyword in item_name_lower for keyword in keywords):
-                            # Get the value for this item
-                            value = df.iloc[row_idx, values_col_idx]
-                            
-                            # Convert to numeric if needed
-                            if isinstance(value, str):
-                                value = self._string_to_number(value)
-                                
-                            result[category] = value
-                            break
+            if df.shape[1] < 2 or df.shape[0] == 0:
+                return result
             
-            # Calculate missing items if possible
-            if result["revenue"] is not None and result["cost_of_goods_sold"] is not None and result["gross_profit"] is None:
-                result["gross_profit"] = result["revenue"] - result["cost_of_goods_sold"]
-                
-            return result
+            numbers = to_numbers(df.iloc[:, 1:])
+            value_columns = self._value_columns(numbers)
+            if not len(value_columns):
+                return result
+            
+            header, labels = self._period_headers(df, numbers, value_columns)
+            columns, periods = self._order_periods(value_columns, labels)
+            
+            table = numbers.iloc[:, columns].to_numpy()
+            has_value = ~np.isnan(table).all(axis=1) & ~header
+            matches = self.matchers[statement_type].match(df.iloc[:, 0].tolist(), has_value)
+            
+            # One row of period values per matched category
+            matrix = np.full((len(schema), len(periods)), np.nan)
+            for position, category in enumerate(schema.keys()):
+                if category in matches:
+                    matrix[position] = table[matches[category]]
+            
+            return self._columnar(statement_type, periods, matrix, scale)
         except Exception as e:
-            print(f"Error parsing income statement: {e}")
+            print(f"Error parsing {statement_type}: {e}")
             return result
     
-    def _string_to_number(self, value_str: str) -> Optional[float]:
-        """Convert a string to a number, handling different formats"""
-        if not value_str or not isinstance(value_str, str):
-            return None
+    def latest_period(self, columnar: Dict[str, Any]) -> Dict[str, Any]:
+        """The most recent period of a columnar statement, as {category: value}"""
+        return {
+            category: values[-1] if values else None
+            for category, values in columnar["values"].items()
+        }
+    
+    def parse_income_statement(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """Parse income statement into standardized format"""
+        return self.parse_statement("income_statement", df)
+    
+    def parse_balance_sheet(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """Parse balance sheet into standardized format"""
+        return self.parse_statement("balance_sheet", df)
+    
+    def parse_cash_flow(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """Parse cash flow statement into standardized format"""
+        return self.parse_statement("cash_flow", df)
+    
+    def _derive_missing(self, statement_type: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Calculate missing items from the ones that were found, where possible"""
+        if statement_type == "income_statement":
+            if result["revenue"] is not None and result["cost_of_goods_sold"] is not None and result["gross_profit"] is None:
+                result["gross_profit"] = result["revenue"] - result["cost_of_goods_sold"]
+        
+        elif statement_type == "balance_sheet":
+            if result["total_liabilities_and_equity"] is None and result["total_assets"] is not None:
+                result["total_liabilities_and_equity"] = result["total_assets"]
+            if (result["total_liabilities"] is None and result["total_liabilities_and_equity"] is not None
+                    and result["total_equity"] is not None):
+                result["total_liabilities"] = result["total_liabilities_and_equity"] - result["total_equity"]
+        
+        elif statement_type == "cash_flow":
+            if result["net_change_in_cash"] is None and result["cash_ending"] is not None and result["cash_beginning"] is not None:
+                result["net_change_in_cash"] = result["cash_ending"] - result["cash_beginning"]
+        
+        return result
+    
+    def _columnar(self, statement_type: str, periods: List[Optional[str]], matrix: np.ndarray,
+                  scale: float = 1.0) -> Dict[str, Any]:
+        """Columnar statement from a category x period matrix, deriving missing items per period"""
+        categories = list(self.statement_schemas[statement_type].keys())
+        values = {category: [] for category in categories}
+        derived = []
+        
+        for column in matrix.T:
+            period = {
+                category: None if np.isnan(value) else float(value)
+                for category, value in zip(categories, column)
+            }
+            found = {category for category, value in period.items() if value is not None}
+            for category, value in self._derive_missing(statement_type, period).items():
+                values[category].append(value)
+            # Validation must not check an identity against a value derived from it
+            derived.append([
+                category for category in categories
+                if period[category] is not None and category not in found
+            ])
+        
+        return {"periods": list(periods), "values": values, "scale": scale, "derived": derived}
+    
+    def _value_columns(self, numbers: pd.DataFrame) -> np.ndarray:
+        """Positions of the period columns among the parsed amount columns.
+        
+        Value columns are those holding at least half as many amounts as the
+        fullest column, which leaves out note references, stray $ columns
+        and sparse percentages.
+        """
+        counts = numbers.notna().sum().to_numpy()
+        
+        if not counts.any():
+            return np.array([], dtype=int)
+        
+        return np.flatnonzero(counts >= counts.max() / 2)
+    
+    def _period_headers(self, df: pd.DataFrame, numbers: pd.DataFrame,
+                        value_columns: np.ndarray) -> Tuple[np.ndarray, List[Optional[str]]]:
+        """Find the header rows of a table and the period label of each value column.
+        
+        Header rows are the leading rows before the first labelled row with
+        amounts; a row whose only amounts are bare years ("2023") is a
+        header too. Each column is labelled from its column name plus its
+        header cells, with quarterly captions spanning several columns
+        applied to all of them.
+        """
+        cells = df.iloc[:, 1:].fillna('').astype(str)
+        row_labels = normalize_labels(df.iloc[:, 0].tolist())
+        has_value = numbers.iloc[:, value_columns].notna().to_numpy()
+        bare_year = np.column_stack([
+            cells.iloc[:, column].str.fullmatch(r'\s*(?:19|20)\d{2}\s*').to_numpy()
+            for column in value_columns
+        ])
+        
+        header = np.zeros(len(df), dtype=bool)
+        for row in range(min(len(df), MAX_HEADER_ROWS)):
+            if row_labels[row] and has_value[row].any() and not bare_year[row][has_value[row]].all():
+                break
+            header[row] = True
+        
+        header_cells = cells[header]
+        column_names = [str(name) for name in df.columns[1:]]
+        table_caption = ' '.join(column_names + header_cells.to_numpy().ravel().tolist()).lower()
+        default_quarter = _quarter(table_caption)
+        
+        labels = [
+            period_label(' '.join([column_names[column]] + header_cells.iloc[:, column].tolist()), default_quarter)
+            for column in value_columns
+        ]
+        return header, labels
+    
+    def _order_periods(self, value_columns: np.ndarray,
+                       labels: List[Optional[str]]) -> Tuple[List[int], List[Optional[str]]]:
+        """Value columns in chronological order, with their period labels.
+        
+        Unlabelled columns are dropped when others are labelled, and a period
+        repeated across columns keeps its first column. Without any labels the
+        column order is kept.
+        """
+        if not any(labels):
+            return list(value_columns), [None] * len(value_columns)
+        
+        first_column = {}
+        for column, label in zip(value_columns, labels):
+            if label:
+                first_column.setdefault(label, column)
+        
+        periods = sorted(first_column, key=period_sort_key)
+        return [first_column[label] for label in periods], periods
+    
+    def flatten_facts(self, financial_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """One row per statement, line item and period with a value, for the financial_facts table.
+        
+        Periods come from financial_data['periods']. Columns without a period
+        label contribute only their latest value, with period None, as do
+        statements stored before multi-period parsing.
+        """
+        facts = []
+        columnar_statements = financial_data.get('periods') or {}
+        
+        for statement_type in self.statement_schemas:
+            if statement_type in columnar_statements:
+                columnar = columnar_statements[statement_type]
+            elif financial_data.get(statement_type):
+                columnar = {"periods": [None], "values": {
+                    line_item: [value] for line_item, value in financial_data[statement_type].items()
+                }}
+            else:
+                continue
             
-        # Remove any non-numeric characters except for decimal points and negative signs
-        clean_str = re.sub(r'[^\d.-]', '', value_str)
+            periods = columnar["periods"]
+            for line_item, values in columnar["values"].items():
+                for position, (period, value) in enumerate(zip(periods, values)):
+                    if value is None or (period is None and position != len(periods) - 1):
+                        continue
+                    
+                    fiscal_year, fiscal_quarter = period_parts(period)
+                    facts.append({
+                        "statement": statement_type,
+                        "line_item": line_item,
+                        "period": period,
+                        "fiscal_year": fiscal_year,
+                        "fiscal_quarter": fiscal_quarter,
+                        "value": value
+                    })
         
-        try:
-            return float(clean_str)
-        except ValueError:
-            return None
\ No newline at end of file
+        return facts
+    
+    def parse_xbrl_facts(self, facts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Map inline XBRL facts for the latest reporting period onto the income statement schema"""
+        return self.parse_xbrl_statement("income_statement", facts)
+    
+    def parse_xbrl_statement(self, statement_type: str, facts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Map inline XBRL facts for the latest reporting period onto a statement's schema"""
+        return self.latest_period(self.parse_xbrl_statement_periods(statement_type, facts))
+    
+    def parse_xbrl_statement_periods(self, statement_type: str, facts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Map inline XBRL facts for every reported period onto a statement's schema, in columnar form.
+        
+        Fiscal years and quarters are told apart by the length of their
+        contexts; year-to-date contexts of other lengths are left out. A
+        balance (instant) belongs to the period ending that day, and an
+        opening balance is the instant the day before the period starts.
+        Quarters from XBRL contexts are calendar quarters of the end date.
+        """
+        concepts = self.statement_concepts[statement_type]
+        categories = list(self.statement_schemas[statement_type].keys())
+        
+        wanted = {concept for category_concepts in concepts.values() for concept in category_concepts}
+        
+        # Label each period end by the durations ending there, fiscal years first
+        end_labels = {}
+        duration_periods = {}
+        for fact in facts:
+            start, end = _parse_date(fact.get('period_start')), _parse_date(fact.get('period_end'))
+            if start and end:
+                label = _duration_label(start, end)
+                if label and (end not in end_labels or label.startswith("FY")):
+                    end_labels[end] = label
+                    duration_periods[label] = (start, end)
+        
+        values = {}
+        durations = {}
+        instants = {}
+        for fact in facts:
+            # Segment breakdowns carry dimensions; only consolidated totals are used
+            if fact['name'] not in wanted or fact.get('dimensional'):
+                continue
+            
+            start, end = _parse_date(fact.get('period_start')), _parse_date(fact.get('period_end'))
+            if not end:
+                continue
+            
+            values.setdefault((fact['name'], start, end), fact['value'])
+            
+            if start:
+                label = _duration_label(start, end)
+                if label:
+                    durations.setdefault(label, (start, end))
+            else:
+                label = end_labels.get(end, f"FY{end.year}")
+                instants.setdefault(label, duration_periods.get(label, (None, end)))
+        
+        # Balances alone (e.g. the opening cash of the earliest year) don't add
+        # periods to a statement that reports flows
+        periods = durations or instants
+        labels = sorted(periods, key=period_sort_key)
+        matrix = np.full((len(categories), len(labels)), np.nan)
+        
+        for column, label in enumerate(labels):
+            start, end = periods[label]
+            for position, category in enumerate(categories):
+                if category in self.opening_balance_categories:
+                    if not start:
+                        continue
+                    keys = [(None, start - timedelta(days=1))]
+                else:
+                    keys = [(start, end), (None, end)]
+                
+                for concept in concepts.get(category, []):
+                    found = next((values[(concept,) + key] for key in keys if (concept,) + key in values), None)
+                    if found is not None:
+                        matrix[position, column] = found
+                        break
+        
+        return self._columnar(statement_type, labels, matrix)
+    
+    def validate_statements(self, financial_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Cross-check parsed statements against the accounting identities.
+        
+        Checks that gross profit is revenue less cost of revenue, that assets
+        equal liabilities plus equity, and that cash rolls forward (opening
+        cash plus the three activity totals and any exchange rate effect,
+        and plus the net change, gives closing cash). A check whose inputs are
+        missing, or were derived from the identity it checks, is reported as
+        skipped. `consistent` is True only when all three statements are
+        present, at least one check passed and none failed.
+        """
+        income = financial_data.get('income_statement') or {}
+        balance = financial_data.get('balance_sheet') or {}
+        cash_flow = financial_data.get('cash_flow') or {}
+        
+        # Items _derive_missing filled in for the latest period
+        derived = {
+            statement_type: set(columnar['derived'][-1]) if columnar.get('derived') else set()
+            for statement_type, columnar in (financial_data.get('periods') or {}).items()
+        }
+        
+        checks = {
+            "gross_profit": self._check(
+                [income.get('revenue'), income.get('cost_of_goods_sold')],
+                lambda revenue, cogs: revenue - abs(cogs),
+                income.get('gross_profit'),
+                derived='gross_profit' in derived.get('income_statement', ())
+            ),
+            "balance_sheet_identity": self._check(
+                [balance.get('total_liabilities'), balance.get('total_equity')],
+                lambda liabilities, equity: liabilities + equity,
+                balance.get('total_assets'),
+                derived='total_liabilities' in derived.get('balance_sheet', ())
+            ),
+            "cash_roll_forward": self._check(
+                [cash_flow.get('cash_beginning'), cash_flow.get('operating_cash_flow'),
+                 cash_flow.get('investing_cash_flow'), cash_flow.get('financing_cash_flow'),
+                 cash_flow.get('exchange_rate_effect') or 0.0],
+                lambda beginning, operating, investing, financing, exchange: (
+                    beginning + operating + investing + financing + exchange
+                ),
+                cash_flow.get('cash_ending')
+            ),
+            "cash_net_change": self._check(
+                [cash_flow.get('cash_beginning'), cash_flow.get('net_change_in_cash')],
+                lambda beginning, change: beginning + change,
+                cash_flow.get('cash_ending'),
+                derived='net_change_in_cash' in derived.get('cash_flow', ())
+            ),
+        }
+        
+        has_statements = all(
+            any(value is not None for value in statement.values())
+            for statement in (income, balance, cash_flow)
+        )
+        
+        return {
+            "checks": checks,
+            "consistent": (
+                has_statements
+                and any(check["status"] == "pass" for check in checks.values())
+                and all(check["status"] != "fail" for check in checks.values())
+            )
+        }
+    
+    def _check(self, inputs: List[Optional[float]], expected: Any, actual: Optional[float],
+               derived: bool = False) -> Dict[str, Any]:
+        if derived:
+            # The value was calculated from this identity, so it would always pass
+            return {"status": "skipped", "reason": "derived"}
+        if actual is None or any(value is None for value in inputs):
+            return {"status": "skipped"}
+        
+        expected_value = expected(*inputs)
+        difference = actual - expected_value
+        # Tolerance scales with the size of the figures being compared
+        tolerance = self.VALIDATION_TOLERANCE * max(abs(actual), abs(expected_value), 1.0)
+        
+        return {
+            "status": "pass" if abs(difference) <= tolerance else "fail",
+            "expected": expected_value,
+            "actual": actual,
+            "difference": difference
+        }
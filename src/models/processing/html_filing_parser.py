@@ -0,0 +1,333 @@
+from lxml import etree
+import pandas as pd
+import re
+from typing import Dict, Any, List, Optional, Iterable, Union
+
+# Namespace URIs mapped to the prefixes the HTML parser reports for the same tags
+NAMESPACE_PREFIXES = {
+    "http://www.xbrl.org/2013/inlineXBRL": "ix",
+    "http://www.xbrl.org/2003/instance": "xbrli",
+    "http://xbrl.org/2006/xbrldi": "xbrldi",
+}
+
+# Elements that start a new line of text
+BLOCK_TAGS = {
+    "p", "div", "br", "tr", "li", "ul", "ol", "table", "section", "article",
+    "h1", "h2", "h3", "h4", "h5", "h6", "hr", "center", "pre", "blockquote",
+}
+
+# Elements whose content never reaches the text stream
+SKIP_TAGS = {"script", "style", "head", "ix:header"}
+
+
+def _normalize_tag(tag: str) -> str:
+    """Return a lowercase `prefix:local` tag for both HTML and XML parser events"""
+    if tag.startswith("{"):
+        namespace, local = tag[1:].split("}", 1)
+        prefix = NAMESPACE_PREFIXES.get(namespace)
+        tag = f"{prefix}:{local}" if prefix else local
+    return tag.lower()
+
+
+def _parse_xbrl_number(text: str, attrib: Dict[str, str]) -> Optional[float]:
+    """Convert an inline XBRL numeric fact to a float, applying sign and scale"""
+    text = text.strip()
+
+    # ixt:fixed-zero and dash placeholders represent zero
+    if "zero" in attrib.get("format", "") or text in ("-", "—", "–", ""):
+        value = 0.0
+    else:
+        clean = re.sub(r"[^\d.,]", "", text)
+        # ixt:num-comma-decimal swaps the roles of '.' and ','
+        if "comma" in attrib.get("format", ""):
+            clean = clean.replace(".", "").replace(",", ".")
+        else:
+            clean = clean.replace(",", "")
+        try:
+            value = float(clean)
+        except ValueError:
+            return None
+
+    try:
+        value *= 10 ** int(attrib.get("scale", "0"))
+    except ValueError:
+        pass
+
+    if attrib.get("sign") == "-":
+        value = -value
+
+    return value
+
+
+class _FilingTarget:
+    """lxml parser target that collects text, tables and XBRL facts in a single pass"""
+
+    def __init__(self, min_table_rows: int = 2, min_table_cols: int = 2):
+        self.min_table_rows = min_table_rows
+        self.min_table_cols = min_table_cols
+
+        self.text_parts = []
+        self.tables = []
+        self.facts = []
+        self.dei = {}
+        self.contexts = {}
+
+        self._skip_depth = 0
+        # Stack of open tables (rows of cells), so nested layout tables don't mix
+        self._table_stack = []
+        self._cell = None
+        self._colspan = 1
+        # Open ix:nonFraction / ix:nonNumeric fact, if any
+        self._fact = None
+        # Context currently being read from ix:resources or an XBRL instance
+        self._context = None
+        self._context_field = None
+
+    def start(self, tag, attrib):
+        tag = _normalize_tag(tag)
+        attrib = {key.lower(): value for key, value in attrib.items()}
+
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+
+        if tag in BLOCK_TAGS:
+            self.text_parts.append("\n")
+        elif tag in ("td", "th"):
+            self.text_parts.append(" ")
+
+        if tag == "table":
+            self._table_stack.append([])
+        elif tag == "tr" and self._table_stack:
+            self._table_stack[-1].append([])
+        elif tag in ("td", "th") and self._table_stack:
+            self._cell = []
+            try:
+                self._colspan = max(int(attrib.get("colspan", 1)), 1)
+            except ValueError:
+                self._colspan = 1
+        elif tag == "ix:nonfraction" or (tag == "ix:nonnumeric" and attrib.get("name", "").startswith("dei:")):
+            # Only cover-page text facts are kept; text blocks can be huge
+            self._fact = {"tag": tag, "attrib": attrib, "text": []}
+        elif tag == "xbrli:context":
+            self._context = {"id": attrib.get("id"), "dimensional": False}
+        elif self._context is not None:
+            if tag in ("xbrli:startdate", "xbrli:enddate", "xbrli:instant"):
+                self._context_field = tag.split(":", 1)[1]
+            elif tag in ("xbrldi:explicitmember", "xbrldi:typedmember"):
+                self._context["dimensional"] = True
+
+    def end(self, tag):
+        tag = _normalize_tag(tag)
+
+        if tag in SKIP_TAGS:
+            self._skip_depth -= 1
+
+        if tag in BLOCK_TAGS:
+            self.text_parts.append("\n")
+
+        if tag in ("td", "th") and self._cell is not None:
+            if self._table_stack and self._table_stack[-1]:
+                row = self._table_stack[-1][-1]
+                row.append(" ".join("".join(self._cell).split()))
+                # Pad spanned columns so values stay aligned with their headers
+                row.extend([""] * (self._colspan - 1))
+            self._cell = None
+        elif tag == "table" and self._table_stack:
+            self._finish_table(self._table_stack.pop())
+        elif tag in ("ix:nonfraction", "ix:nonnumeric") and self._fact is not None:
+            self._finish_fact(self._fact)
+            self._fact = None
+        elif tag == "xbrli:context" and self._context is not None:
+            self.contexts[self._context.pop("id")] = self._context
+            self._context = None
+        elif tag in ("xbrli:startdate", "xbrli:enddate", "xbrli:instant"):
+            self._context_field = None
+
+    def data(self, data):
+        if self._context_field is not None:
+            self._context[self._context_field] = data.strip()
+
+        if self._fact is not None:
+            self._fact["text"].append(data)
+
+        if self._skip_depth:
+            return
+
+        self.text_parts.append(data)
+        if self._cell is not None:
+            self._cell.append(data)
+
+    def close(self):
+        # Contexts may be declared after the facts that use them
+        for fact in self.facts:
+            context = self.contexts.get(fact["context_ref"], {})
+            fact["period_start"] = context.get("startdate")
+            fact["period_end"] = context.get("enddate") or context.get("instant")
+            fact["dimensional"] = context.get("dimensional", False)
+
+        # Mirror BeautifulSoup's get_text(separator='\n', strip=True)
+        lines = "".join(self.text_parts).split("\n")
+        text = "\n".join(" ".join(line.split()) for line in lines if line.strip())
+
+        return {
+            "text": text,
+            "tables": self.tables,
+            "facts": self.facts,
+            "dei": self.dei,
+        }
+
+    def _finish_fact(self, fact: Dict[str, Any]):
+        attrib = fact["attrib"]
+        text = "".join(fact["text"])
+        name = attrib.get("name", "")
+
+        if fact["tag"] == "ix:nonnumeric":
+            self.dei[name] = " ".join(text.split())
+            return
+
+        value = _parse_xbrl_number(text, attrib)
+        if value is None:
+            return
+
+        self.facts.append({
+            "name": name,
+            "value": value,
+            "context_ref": attrib.get("contextref"),
+            "unit_ref": attrib.get("unitref"),
+            "decimals": attrib.get("decimals"),
+        })
+
+    def _finish_table(self, rows: List[List[str]]):
+        rows = [self._compact_row(row) for row in rows]
+        rows = [row for row in rows if row]
+        if len(rows) < self.min_table_rows:
+            return
+
+        width = max(len(row) for row in rows)
+        if width < self.min_table_cols:
+            return
+
+        df = pd.DataFrame([row + [None] * (width - len(row)) for row in rows])
+        # Spacer cells from colspan layouts become empty columns; drop them
+        df = df.replace("", None).dropna(how="all").dropna(axis=1, how="all")
+        if df.shape[0] >= self.min_table_rows and df.shape[1] >= self.min_table_cols:
+            # Match camelot's layout: positional column labels, header kept as row 0
+            df.columns = range(df.shape[1])
+            self.tables.append(df.reset_index(drop=True))
+
+    def _compact_row(self, cells: List[str]) -> List[str]:
+        """Fold the '$' and ')' fragments EDGAR puts in their own cells into the value"""
+        cells = list(cells)
+        last_value = None
+
+        for idx, cell in enumerate(cells):
+            if cell in ("$", "(", "$(") and idx + 1 < len(cells):
+                # Blank the fragment in place so column positions don't shift
+                cells[idx + 1] = cell + cells[idx + 1]
+                cells[idx] = ""
+            elif cell in (")", ")%", "%") and last_value is not None:
+                cells[last_value] += cell
+                cells[idx] = ""
+            elif cell:
+                last_value = idx
+
+        return cells if any(cells) else []
+
+
+class HTMLFilingParser:
+    """Single-pass lxml parser for HTML and inline XBRL (iXBRL) SEC filings"""
+
+    def __init__(self, chunk_size: int = 1 << 20):
+        self.chunk_size = chunk_size
+
+    def parse(self, source: Union[str, bytes, Iterable[Union[str, bytes]]]) -> Dict[str, Any]:
+        """Parse a filing from an HTML string/bytes or an iterable of chunks.
+
+        Returns a dict with the visible `text`, every data `tables` DataFrame,
+        numeric XBRL `facts` and cover-page `dei` values.
+        """
+        if isinstance(source, (str, bytes)):
+            content = source
+            chunks = (content[start:start + self.chunk_size]
+                      for start in range(0, len(content), self.chunk_size))
+        else:
+            chunks = source
+
+        parser = etree.HTMLParser(target=_FilingTarget(), recover=True, huge_tree=True)
+
+        for chunk in chunks:
+            parser.feed(chunk)
+
+        return parser.close()
+
+    def parse_file(self, file_path: str) -> Dict[str, Any]:
+        """Parse a filing from disk, reading it in fixed-size chunks"""
+        with open(file_path, "rb") as f:
+            return self.parse(iter(lambda: f.read(self.chunk_size), b""))
+
+    def parse_xbrl_instance(self, chunks: Iterable[Union[str, bytes]]) -> Dict[str, Any]:
+        """Parse a standalone XBRL instance document into numeric facts"""
+        target = _InstanceTarget()
+        parser = etree.XMLParser(target=target, recover=True, huge_tree=True)
+
+        for chunk in chunks:
+            parser.feed(chunk)
+
+        return parser.close()
+
+
+class _InstanceTarget(_FilingTarget):
+    """Parser target for XBRL instance XML, where every fact carries a contextRef"""
+
+    def __init__(self):
+        super().__init__()
+        self.namespaces = {}
+
+    def start_ns(self, prefix, uri):
+        self.namespaces[uri] = prefix
+
+    def start(self, tag, attrib):
+        attrib = {key.lower(): value for key, value in attrib.items()}
+        if "contextref" in attrib:
+            self._fact = {"tag": tag, "attrib": attrib, "text": []}
+            return
+        super().start(tag, attrib)
+
+    def end(self, tag):
+        if self._fact is not None:
+            self._finish_instance_fact(self._fact)
+            self._fact = None
+            return
+        super().end(tag)
+
+    def data(self, data):
+        # Instances have no visible text, so only facts and contexts are collected
+        if self._context_field is not None:
+            self._context[self._context_field] = data.strip()
+        if self._fact is not None:
+            self._fact["text"].append(data)
+
+    def _finish_instance_fact(self, fact: Dict[str, Any]):
+        # Instance facts use the qualified element name, e.g. us-gaap:Revenues
+        namespace, local = fact["tag"][1:].split("}", 1) if fact["tag"].startswith("{") else ("", fact["tag"])
+        prefix = self.namespaces.get(namespace)
+        name = f"{prefix}:{local}" if prefix else local
+        text = "".join(fact["text"]).strip()
+
+        if name.startswith("dei:"):
+            self.dei[name] = text
+            return
+
+        try:
+            value = float(text)
+        except ValueError:
+            # Text blocks and other non-numeric facts are skipped
+            return
+
+        self.facts.append({
+            "name": name,
+            "value": value,
+            "context_ref": fact["attrib"].get("contextref"),
+            "unit_ref": fact["attrib"].get("unitref"),
+            "decimals": fact["attrib"].get("decimals"),
+        })
@@ -1,32 +1,61 @@
-from bs4 import BeautifulSoup
 import requests
 import re
 import pdfplumber
-from typing import Dict, Any, List
+from .html_filing_parser import HTMLFilingParser
+from .edgar_submission import EdgarSubmissionReader
+from .section_detector import SectionDetector
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple
 import os
+import tempfile
+
+
+def _extract_page_range(pdf_path: str, start: int, end: int) -> List[str]:
+    """Extract text for pages [start, end) of a PDF (runs in a worker process)"""
+    texts = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages[start:end]:
+            texts.append(page.extract_text() or "")
+            # Drop cached layout objects so long ranges don't accumulate memory
+            page.flush_cache()
+    return texts
+
 
 class SECFilingProcessor:
     """Specialized processor for SEC filings, particularly 10-K reports"""
     
-    def __init__(self):
-        self.section_patterns = {
-            "business": r"Item\s*1\.?\s*Business",
-            "risk_factors": r"Item\s*1A\.?\s*Risk\s*Factors",
-            "management_discussion": r"Item\s*7\.?\s*Management'?s?\s*Discussion",
-            "financial_statements": r"Item\s*8\.?\s*Financial\s*Statements",
-            # Add more section patterns as needed
-        }
+    def __init__(self, max_workers: int = None, pages_per_worker: int = 25,
+                 parallel_page_threshold: int = 40):
+        # Page text extraction is CPU bound, so shard it across processes
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.pages_per_worker = pages_per_worker
+        # Below this page count the process pool start-up costs more than it saves
+        self.parallel_page_threshold = parallel_page_threshold
+        
+        # Finds every 10-K item (1 through 16, including 1A, 7A, 9A, ...) in one scan
+        self.section_detector = SectionDetector()
+        
+        # Submission document types routed to the filing parser
+        self.primary_document_types = {"10-K", "10-K/A", "10-K405", "10-KT", "10-KSB"}
     
-    def load_from_file(self, file_path: str) -> Dict[str, Any]:
-        """Load and process a local SEC filing file"""
+    def load_from_file(self, file_path: str,
+                       on_progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """Load and process a local SEC filing file.
+        
+        For PDFs, `on_progress(pages_done, page_count)` is called as pages are extracted.
+        """
         file_extension = os.path.splitext(file_path)[1].lower()
         
         if file_extension == '.pdf':
-            return self._process_pdf(file_path)
+            return self._process_pdf(file_path, on_progress)
         elif file_extension in ['.html', '.htm']:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                html_content = f.read()
-            return self._process_html(html_content)
+            # Stream the file through the parser instead of reading it whole
+            result = self._process_html(HTMLFilingParser().parse_file(file_path))
+            if result.get('status') == 'success':
+                result['title'] = os.path.basename(file_path)
+            return result
+        elif EdgarSubmissionReader.is_submission_file(file_path):
+            return self._process_submission(file_path)
         else:
             # Fall back to regular document processing
             with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
@@ -39,37 +68,104 @@ class SECFilingProcessor:
                 'status': 'success'
             }
     
-    def _process_pdf(self, pdf_path: str) -> Dict[str, Any]:
-        """Process a 10-K PDF file"""
-        sections = {}
-        current_section = "general"
-        sections[current_section] = []
+    def iter_page_texts(self, pdf_path: str,
+                        on_progress: Optional[Callable[[int, int], None]] = None) -> Iterator[str]:
+        """Yield the text of each PDF page in order, extracting page ranges in parallel.
         
-        try:
-            with pdfplumber.open(pdf_path) as pdf:
-                for page in pdf.pages:
-                    text = page.extract_text() or ""
-                    
-                    # Identify sections based on patterns
-                    for section_name, pattern in self.section_patterns.items():
-                        if re.search(pattern, text, re.IGNORECASE):
-                            current_section = section_name
-                            if current_section not in sections:
-                                sections[current_section] = []
-                    
-                    # Add text to current section
-                    sections[current_section].append(text)
+        `on_progress(pages_done, page_count)` is called as each page is yielded.
+        """
+        with pdfplumber.open(pdf_path) as pdf:
+            page_count = len(pdf.pages)
+        
+        for pages_done, text in enumerate(self._iter_page_shards(pdf_path, page_count), start=1):
+            if on_progress:
+                on_progress(pages_done, page_count)
+            yield text
+    
+    def _iter_page_shards(self, pdf_path: str, page_count: int) -> Iterator[str]:
+        if self.max_workers <= 1 or page_count < self.parallel_page_threshold:
+            # Serial fallback for small files
+            yield from _extract_page_range(pdf_path, 0, page_count)
+            return
+        
+        ranges = [
+            (start, min(start + self.pages_per_worker, page_count))
+            for start in range(0, page_count, self.pages_per_worker)
+        ]
+        workers = min(self.max_workers, len(ranges))
+        
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Keep a bounded window of shards in flight and yield them in page order
+            pending = []
+            next_range = 0
+            while next_range < len(ranges) or pending:
+                while next_range < len(ranges) and len(pending) < workers * 2:
+                    start, end = ranges[next_range]
+                    pending.append(executor.submit(_extract_page_range, pdf_path, start, end))
+                    next_range += 1
+                
+                yield from pending.pop(0).result()
+    
+    def iter_pdf_sections(self, pdf_path: str,
+                          on_page: Optional[Callable[[int, str], None]] = None,
+                          max_part_chars: int = 1 << 20,
+                          on_progress: Optional[Callable[[int, int], None]] = None) -> Iterator[Tuple[str, str]]:
+        """Yield (section_name, text) parts of a PDF while holding little text in memory.
+        
+        Pages are spooled to a temporary file while item headings are collected,
+        then the spool is read back once and cut at the section boundaries.
+        Sections longer than max_part_chars are yielded as several parts.
+        `on_page(page_number, text)` is called for every page as it is extracted.
+        """
+        # newline='' keeps character offsets identical between writing and reading
+        with tempfile.TemporaryFile(mode='w+', encoding='utf-8', newline='') as spool:
+            headings = []
+            length = 0
             
-            # Combine text for each section
-            combined_sections = {k: '\n'.join(v) for k, v in sections.items()}
+            for page_number, text in enumerate(self.iter_page_texts(pdf_path, on_progress), start=1):
+                # Same layout as _process_pdf: pages joined with newlines
+                if page_number > 1:
+                    spool.write('\n')
+                    length += 1
+                headings.extend(self.section_detector.find_headings(text, offset=length))
+                spool.write(text)
+                length += len(text)
+                
+                if on_page:
+                    on_page(page_number, text)
             
-            # Also keep full content for standard processing
-            full_content = '\n'.join(['\n'.join(section) for section in sections.values()])
+            boundaries = self.section_detector.resolve(headings, length)
+            spans = [("general", 0, boundaries[0].start if boundaries else length)]
+            spans.extend((boundary.name, boundary.start, boundary.end) for boundary in boundaries)
+            
+            # Spans are contiguous, so one sequential read covers them all
+            spool.seek(0)
+            for section_name, start, end in spans:
+                remaining = end - start
+                while remaining > 0:
+                    part = spool.read(min(remaining, max_part_chars))
+                    if not part:
+                        break
+                    remaining -= len(part)
+                    yield section_name, part
+    
+    def _process_pdf(self, pdf_path: str,
+                     on_progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """Process a 10-K PDF file"""
+        try:
+            page_texts = list(self.iter_page_texts(pdf_path, on_progress))
+            
+            # Section detection runs once over the merged, in-order page stream
+            full_content = '\n'.join(page_texts)
+            boundaries = self.section_detector.detect(full_content)
             
             return {
                 'title': os.path.basename(pdf_path),
                 'content': full_content,
-                'sections': combined_sections,
+                'sections': self.section_detector.slice(full_content, boundaries),
+                'section_offsets': [tuple(boundary) for boundary in boundaries],
+                # Per-page text lets table extraction score pages without re-reading the PDF
+                'page_texts': page_texts,
                 'file_type': '.pdf',
                 'status': 'success'
             }
@@ -90,35 +186,80 @@ class SECFilingProcessor:
                     'message': f'Error processing PDF: {str(file_error)}'
                 }
     
-    def _process_html(self, html_content: str) -> Dict[str, Any]:
-        """Process HTML content from an SEC filing"""
+    def _process_submission(self, file_path: str) -> Dict[str, Any]:
+        """Process an EDGAR full-submission .txt file one <DOCUMENT> block at a time"""
+        parsed = None
+        instance = None
+        parser = HTMLFilingParser()
+        
         try:
-            soup = BeautifulSoup(html_content, 'html.parser')
+            with open(file_path, 'rb') as f:
+                reader = EdgarSubmissionReader(f)
+                
+                for document in reader.documents():
+                    # Uuencoded exhibits are left undecoded and skipped by the reader
+                    if document.is_uuencoded:
+                        continue
+                    
+                    if parsed is None and document.document_type in self.primary_document_types:
+                        if document.is_html:
+                            parsed = parser.parse(document.iter_chunks())
+                        else:
+                            # Older filings carry the 10-K as plain text
+                            text = b''.join(document.iter_lines()).decode('utf-8', errors='ignore')
+                            parsed = {'text': text, 'tables': [], 'facts': [], 'dei': {}}
+                    elif instance is None and (
+                        document.document_type == 'EX-101.INS'
+                        or (document.document_type == 'XML' and document.filename.endswith('_htm.xml'))
+                    ):
+                        instance = parser.parse_xbrl_instance(document.iter_chunks())
             
-            # Extract text content
-            text_content = soup.get_text(separator='\n', strip=True)
+            if parsed is None:
+                return {
+                    'status': 'error',
+                    'message': 'No 10-K document found in submission'
+                }
             
-            # Try to extract sections
-            sections = {"general": text_content}
+            # Filings without inline XBRL still ship a separate instance document
+            if instance and not parsed['facts']:
+                parsed['facts'] = instance['facts']
+                parsed['dei'] = {**instance['dei'], **parsed['dei']}
             
-            # Look for section headers in the text
-            for section_name, pattern in self.section_patterns.items():
-                matches = re.finditer(pattern, text_content, re.IGNORECASE)
-                for match in matches:
-                    start_pos = match.start()
-                    # Find the next section start or use end of text
-                    next_section_starts = [
-                        text_content.find(p, start_pos + 1) 
-                        for p in self.section_patterns.values() 
-                        if text_content.find(p, start_pos + 1) != -1
-                    ]
-                    
-                    end_pos = min(next_section_starts) if next_section_starts else len(text_content)
-                    sections[section_name] = text_content[start_pos:end_pos].strip()
+            result = self._process_html(parsed)
+            if result.get('status') == 'success':
+                result['title'] = reader.header.get('company_conformed_name') or os.path.basename(file_path)
+                result['submission_header'] = reader.header
+                result['file_type'] = '.txt'
+            return result
+        except Exception as e:
+            return {
+                'status': 'error',
+                'message': f'Error processing EDGAR submission: {str(e)}'
+            }
+    
+    def _process_html(self, html_content) -> Dict[str, Any]:
+        """Process HTML content from an SEC filing (raw HTML or an HTMLFilingParser result)"""
+        try:
+            if isinstance(html_content, dict):
+                parsed = html_content
+            else:
+                parsed = HTMLFilingParser().parse(html_content)
+            
+            # Extract text content
+            text_content = parsed['text']
+            
+            # Extract item sections in a single scan
+            boundaries = self.section_detector.detect(text_content)
             
             return {
-                'sections': sections,
+                'sections': self.section_detector.slice(text_content, boundaries),
+                'section_offsets': [tuple(boundary) for boundary in boundaries],
                 'content': text_content,
+                # Tables and inline XBRL facts come from the same parse, so the
+                # PDF table heuristics are skipped entirely for HTML filings
+                'tables': parsed['tables'],
+                'xbrl_facts': parsed['facts'],
+                'dei': parsed['dei'],
                 'file_type': '.html',
                 'status': 'success'
             }
@@ -126,4 +267,4 @@ class SECFilingProcessor:
             return {
                 'status': 'error', 
                 'message': f'Error processing HTML: {str(e)}'
-            }
\ No newline at end of file
+            }
@@ -0,0 +1,123 @@
+import re
+from typing import Dict, List, NamedTuple, Tuple
+
+# 10-K items in filing order, mapped to the section names used across the pipeline
+ITEM_SECTIONS = {
+    "1": "business",
+    "1A": "risk_factors",
+    "1B": "unresolved_staff_comments",
+    "1C": "cybersecurity",
+    "2": "properties",
+    "3": "legal_proceedings",
+    "4": "mine_safety_disclosures",
+    "5": "market_for_equity",
+    "6": "selected_financial_data",
+    "7": "management_discussion",
+    "7A": "market_risk",
+    "8": "financial_statements",
+    "9": "accountant_changes",
+    "9A": "controls_and_procedures",
+    "9B": "other_information",
+    "9C": "foreign_jurisdiction_inspections",
+    "10": "directors_and_governance",
+    "11": "executive_compensation",
+    "12": "security_ownership",
+    "13": "related_transactions",
+    "14": "accountant_fees",
+    "15": "exhibits",
+    "16": "form_10k_summary",
+}
+
+ITEM_ORDER = {item: rank for rank, item in enumerate(ITEM_SECTIONS)}
+
+# One alternation over every item heading. Two-digit items are tried first so
+# "Item 10" is not read as "Item 1"; a letter suffix only counts when it is not
+# the start of a word, since PDF text often loses spaces ("Item1Business").
+ITEM_HEADING = re.compile(
+    r"^[ \t]*item[ \t]*(1[0-6]|[1-9](?:[a-c](?![a-z]))?)(?![0-9])",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+class SectionBoundary(NamedTuple):
+    name: str
+    item: str
+    start: int
+    end: int
+
+
+class SectionDetector:
+    """Find 10-K item boundaries in one regex scan over the full filing text"""
+
+    def detect(self, text: str) -> List[SectionBoundary]:
+        """Return the ordered item sections of `text` as character offsets"""
+        return self.resolve(self.find_headings(text), len(text))
+
+    def find_headings(self, text: str, offset: int = 0) -> List[Tuple[int, str]]:
+        """Return every candidate (offset, item) heading in `text`.
+
+        Scanning a page stream piece by piece gives the same result as scanning
+        the joined text, as long as `offset` is the piece's position in it.
+        """
+        matches = []
+        for match in ITEM_HEADING.finditer(text):
+            item = match.group(1).upper()
+            if item in ITEM_ORDER:
+                matches.append((offset + match.start(), item))
+        return matches
+
+    def resolve(self, matches: List[Tuple[int, str]], text_length: int) -> List[SectionBoundary]:
+        """Turn candidate headings into section boundaries"""
+        headings = self._select_headings(matches)
+
+        boundaries = []
+        for idx, (start, item) in enumerate(headings):
+            end = headings[idx + 1][0] if idx + 1 < len(headings) else text_length
+            boundaries.append(SectionBoundary(ITEM_SECTIONS[item], item, start, end))
+
+        return boundaries
+
+    def split(self, text: str) -> Dict[str, str]:
+        """Split `text` into named sections; text before the first item is 'general'"""
+        return self.slice(text, self.detect(text))
+
+    def slice(self, text: str, boundaries: List[SectionBoundary]) -> Dict[str, str]:
+        """Materialize detected boundaries as section text, keeping exact offsets"""
+        first_start = boundaries[0].start if boundaries else len(text)
+        sections = {"general": text[:first_start]}
+
+        for boundary in boundaries:
+            sections[boundary.name] = text[boundary.start:boundary.end]
+
+        return sections
+
+    def _select_headings(self, matches):
+        """Pick the real item headings out of every match.
+
+        The table of contents and cross-references also match, so keep the
+        longest run of strictly increasing items, preferring the latest start
+        (the body rather than the table of contents) and, from each heading,
+        the nearest next item.
+        """
+        count = len(matches)
+        run_length = [1] * count
+        next_index = [None] * count
+
+        for i in range(count - 1, -1, -1):
+            rank = ITEM_ORDER[matches[i][1]]
+            for j in range(i + 1, count):
+                if ITEM_ORDER[matches[j][1]] > rank and run_length[j] + 1 > run_length[i]:
+                    run_length[i] = run_length[j] + 1
+                    next_index[i] = j
+
+        if not count:
+            return []
+
+        best = max(range(count), key=lambda i: (run_length[i], i))
+
+        headings = []
+        while best is not None:
+            headings.append(matches[best])
+            best = next_index[best]
+
+        return headings
@@ -1,66 +1,294 @@
-import camelot
+import multiprocessing
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Any
+import re
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Sequence
+
+
+class PageTimeoutError(Exception):
+    """Raised when table extraction on a single page exceeds its time budget"""
+
+
+def _alarm_available() -> bool:
+    """SIGALRM exists here (not on Windows) and this thread can receive it"""
+    return hasattr(signal, 'SIGALRM') and threading.current_thread() is threading.main_thread()
+
+
+@contextmanager
+def _time_limit(seconds: float):
+    """Interrupt the enclosed block after `seconds` where SIGALRM is available.
+    
+    Signals can only be delivered to the main thread, so elsewhere (and on
+    Windows) this is a no-op and callers rely on their own deadline checks.
+    """
+    if not seconds or not _alarm_available():
+        yield
+        return
+    
+    def _raise_timeout(signum, frame):
+        raise PageTimeoutError(f"exceeded {seconds}s budget")
+    
+    previous_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+
+def _page_tables_in_child(extractor, pdf_path: str, page_number: int, connection):
+    """Child-process side of FinancialTableExtractor._isolated_page_tables"""
+    import pdfplumber
+    try:
+        with pdfplumber.open(pdf_path) as pdf:
+            connection.send(extractor._strategy_chain(pdf, pdf_path, page_number, deadline=None))
+    finally:
+        connection.close()
+
 
 class FinancialTableExtractor:
     """Extract and process tables from financial documents"""
     
-    def extract_tables_from_pdf(self, pdf_path: str) -> List[pd.DataFrame]:
-        """Extract tables from PDF using camelot"""
-        # Extract tables
-        tables = camelot.read_pdf(
-            pdf_path,
-            pages='all',
-            flavor='lattice'  # Try 'stream' if lattice doesn't work well
+    STRATEGIES = ('pdfplumber', 'lattice', 'stream')
+    
+    def __init__(self, page_score_threshold: float = 10.0, all_pages: bool = False,
+                 strategies: Sequence[str] = STRATEGIES, page_time_budget: float = 20.0,
+                 min_numeric_ratio: float = 0.2):
+        # Pages scoring below the threshold are skipped by camelot
+        self.page_score_threshold = page_score_threshold
+        # Override to run table extraction on every page
+        self.all_pages = all_pages
+        
+        # Strategies are tried per page, cheapest first, until one yields good tables
+        unknown = [name for name in strategies if name not in self.STRATEGIES]
+        if unknown:
+            raise ValueError(f"Unknown table extraction strategies: {unknown}")
+        self.strategies = list(strategies)
+        # Wall-clock seconds allowed per page across all strategies
+        self.page_time_budget = page_time_budget
+        # Minimum share of non-empty cells that must be numeric for a table to count
+        self.min_numeric_ratio = min_numeric_ratio
+        
+        # Phrases that mark financial-statement pages, with their weights
+        self.statement_keywords = {
+            "consolidated statements of": 3.0,
+            "consolidated balance sheets": 3.0,
+            "total revenue": 2.0,
+            "total revenues": 2.0,
+            "net revenue": 1.5,
+            "cost of revenue": 1.5,
+            "gross profit": 1.5,
+            "operating income": 1.5,
+            "net income": 1.5,
+            "earnings per share": 1.5,
+            "total assets": 2.0,
+            "total liabilities": 2.0,
+            "stockholders' equity": 1.5,
+            "shareholders' equity": 1.5,
+            "operating activities": 2.0,
+            "investing activities": 2.0,
+            "financing activities": 2.0,
+        }
+        self._compact_keywords = {
+            keyword.replace(' ', ''): weight for keyword, weight in self.statement_keywords.items()
+        }
+        self._number_pattern = re.compile(r'\(?\$?\d[\d,]*(?:\.\d+)?\)?')
+        
+        # A statement cell holding one amount: "(1,234)", "$(1,234)", "-1,234", "$ 1,234.5",
+        # optionally followed by a footnote marker ("(a)", "*", superscripts). Parentheses
+        # must be balanced; the currency symbol may sit on either side of "("
+        self._amount_pattern = (
+            r'^\s*([$\u20ac\u00a3])?\s*(\()?\s*([-\u2212\u2013])?\s*(?(1)|[$\u20ac\u00a3]?)\s*(\d[\d,]*(?:\.\d+)?)\s*(?(2)\))'
+            r'\s*(?:\([a-z]\)|\(\d\)|\*+|[\u00b9\u00b2\u00b3\u2070-\u2079]+)?\s*$'
+        )
+        # A lone dash stands for zero
+        self._zero_pattern = r'^\s*[-\u2012\u2013\u2014\u2212]+\s*$'
+        # Year captions are headers, not amounts
+        self._year_pattern = r'^\s*(?:19|20)\d{2}\s*$'
+        # Footnote markers trailing a line-item label
+        self._label_footnote_pattern = r'\s*(?:\(\d{1,2}\)|\([a-z]\)|\*+|[\u00b9\u00b2\u00b3\u2070-\u2079]+)\s*$'
+        # "(In millions, except per share data)" and similar captions
+        self._scale_pattern = re.compile(r'\bin (thousands|millions|billions)\b')
+        self.scales = {'thousands': 1e3, 'millions': 1e6, 'billions': 1e9}
+        # Rows the scale caption doesn't apply to
+        self._unscaled_row_pattern = r'per (?:common |diluted |basic )?share|\beps\b|percent|%|ratio'
+    
+    def score_page(self, text: str) -> float:
+        """Score how likely a page is to hold a financial statement table"""
+        if not text:
+            return 0.0
+        
+        # pdfplumber often drops inter-word spaces, so match on whitespace-free text
+        compact_text = re.sub(r'\s+', '', text.lower()).replace('\u2019', "'")
+        
+        # Keyword density, capped per keyword so one repeated phrase can't dominate
+        score = sum(
+            weight * min(compact_text.count(keyword), 3)
+            for keyword, weight in self._compact_keywords.items()
         )
         
-        # Convert to list of pandas DataFrames
-        return [table.df for table in tables if table.df.size > 0]
+        # Numeric column density: share of lines carrying two or more numbers
+        lines = [line for line in text.split('\n') if line.strip()]
+        if lines:
+            numeric_lines = sum(1 for line in lines if len(self._number_pattern.findall(line)) >= 2)
+            score += 10.0 * numeric_lines / len(lines)
+        
+        return score
+    
+    def select_candidate_pages(self, page_texts: List[str], threshold: Optional[float] = None) -> List[int]:
+        """Return 1-based page numbers whose score meets the threshold"""
+        if threshold is None:
+            threshold = self.page_score_threshold
+        
+        return [
+            page_number
+            for page_number, text in enumerate(page_texts, start=1)
+            if self.score_page(text) >= threshold
+        ]
     
-    def extract_tables_from_pdf(self, pdf_path: str) -> List[pd.DataFrame]:
-        """Extract tables from PDF using camelot"""
+    def extract_tables_from_pdf(self, pdf_path: str, page_texts: Optional[List[str]] = None,
+                                all_pages: Optional[bool] = None,
+                                page_numbers: Optional[List[int]] = None) -> List[pd.DataFrame]:
+        """Extract tables from likely statement pages using the strategy chain.
+        
+        Candidate pages are scored from `page_texts`, or given directly as
+        1-based `page_numbers` when the caller scored them while streaming.
+        """
+        if all_pages is None:
+            all_pages = self.all_pages
+        
         tables = []
         
         try:
-            import camelot
-            # Try lattice mode first
-            lattice_tables = camelot.read_pdf(
-                pdf_path,
-                pages='all',
-                flavor='lattice'
-            )
-            
-            if len(lattice_tables) > 0:
-                for table in lattice_tables:
-                    if table.df.size > 0:
-                        tables.append(table.df)
-            
-            # Try stream mode as a fallback
-            stream_tables = camelot.read_pdf(
-                pdf_path,
-                pages='all',
-                flavor='stream'
-            )
-            
-            if len(stream_tables) > 0:
-                for table in stream_tables:
-                    if table.df.size > 0:
-                        tables.append(table.df)
-            
-            # If still no tables, let's try a more aggressive approach with pdfplumber
-            if len(tables) == 0:
-                import pdfplumber
-                with pdfplumber.open(pdf_path) as pdf:
-                    for page in pdf.pages:
-                        extracted_tables = page.extract_tables()
-                        for table in extracted_tables:
-                            if table and len(table) > 0:
-                                tables.append(pd.DataFrame(table[1:], columns=table[0]))
+            import pdfplumber
+            with pdfplumber.open(pdf_path) as pdf:
+                # Without page text there is nothing to score, so scan everything
+                if all_pages or (page_texts is None and page_numbers is None):
+                    page_numbers = range(1, len(pdf.pages) + 1)
+                elif page_numbers is None:
+                    page_numbers = self.select_candidate_pages(page_texts)
+                
+                for page_number in page_numbers:
+                    tables.extend(self._extract_page_tables(pdf, pdf_path, page_number))
             
             return tables
         except Exception as e:
             print(f"Table extraction error: {e}")
+            return tables
+    
+    def extract_tables_from_html(self, html_content: str) -> List[pd.DataFrame]:
+        """Extract data tables from an HTML or iXBRL filing"""
+        try:
+            from .html_filing_parser import HTMLFilingParser
+            tables = HTMLFilingParser().parse(html_content)['tables']
+            # Most HTML tables are layout; keep the ones that look like data
+            return [table for table in tables if self.is_quality_table(table)]
+        except Exception as e:
+            print(f"HTML table extraction error: {e}")
+            return []
+    
+    def _extract_page_tables(self, pdf, pdf_path: str, page_number: int) -> List[pd.DataFrame]:
+        """Run the strategy chain on one page within the page time budget.
+        
+        On the main thread SIGALRM interrupts a strategy that overruns. Other
+        threads (e.g. documents of an upload batch ingested side by side)
+        can't receive it, so there the page runs in a child process that is
+        killed once the budget is spent.
+        """
+        if self.page_time_budget and not _alarm_available():
+            return self._isolated_page_tables(pdf_path, page_number)
+        
+        try:
+            with _time_limit(self.page_time_budget):
+                return self._strategy_chain(pdf, pdf_path, page_number,
+                                            deadline=time.monotonic() + self.page_time_budget)
+        except PageTimeoutError as e:
+            print(f"Table extraction on page {page_number} {e}")
+            return []
+    
+    def _strategy_chain(self, pdf, pdf_path: str, page_number: int,
+                        deadline: Optional[float]) -> List[pd.DataFrame]:
+        """Try each strategy on the page and return the good tables of the first one that finds any"""
+        for strategy in self.strategies:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise PageTimeoutError(f"exceeded {self.page_time_budget}s budget")
+            
+            try:
+                if strategy == 'pdfplumber':
+                    found = self._pdfplumber_tables(pdf.pages[page_number - 1])
+                else:
+                    found = self._camelot_tables(pdf_path, page_number, strategy)
+            except Exception as e:
+                # Libraries may wrap the alarm exception, so check the clock too
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise PageTimeoutError(f"exceeded {self.page_time_budget}s budget") from e
+                print(f"Table strategy {strategy} failed on page {page_number}: {e}")
+                continue
+            
+            good_tables = [table for table in found if self.is_quality_table(table)]
+            if good_tables:
+                return good_tables
+        
+        return []
+    
+    def _isolated_page_tables(self, pdf_path: str, page_number: int) -> List[pd.DataFrame]:
+        """Run the strategy chain for one page in a child process, killed after the page budget"""
+        # spawn rather than fork: the ingest process has model and pool threads running
+        context = multiprocessing.get_context("spawn")
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_page_tables_in_child, args=(self, pdf_path, page_number, sender))
+        process.start()
+        sender.close()
+        
+        try:
+            if not receiver.poll(self.page_time_budget):
+                print(f"Table extraction on page {page_number} exceeded {self.page_time_budget}s budget")
+                return []
+            return receiver.recv()
+        except EOFError:
+            print(f"Table extraction on page {page_number} failed: worker process exited")
             return []
+        finally:
+            if process.is_alive():
+                process.kill()
+            process.join()
+            receiver.close()
+    
+    def _pdfplumber_tables(self, page) -> List[pd.DataFrame]:
+        """Extract tables from a pdfplumber page"""
+        tables = []
+        for table in page.extract_tables():
+            if table and len(table) > 1:
+                tables.append(pd.DataFrame(table[1:], columns=table[0]))
+        return tables
+    
+    def _camelot_tables(self, pdf_path: str, page_number: int, flavor: str) -> List[pd.DataFrame]:
+        """Extract tables from one page with camelot's lattice or stream flavor"""
+        import camelot
+        tables = camelot.read_pdf(pdf_path, pages=str(page_number), flavor=flavor)
+        return [table.df for table in tables if table.df.size > 0]
+    
+    def is_quality_table(self, df: pd.DataFrame) -> bool:
+        """Check that a table has enough shape and numeric content to be a statement"""
+        if df.shape[0] < 2 or df.shape[1] < 2:
+            return False
+        
+        cells = self._cell_strings(df).str.strip()
+        cells = cells[(cells != '') & (cells.str.lower() != 'none')]
+        if cells.empty:
+            return False
+        
+        numeric_ratio = cells.str.contains(r'\d', regex=True).mean()
+        return numeric_ratio >= self.min_numeric_ratio
+    
+    def _cell_strings(self, df: pd.DataFrame) -> pd.Series:
+        """Flatten a table's non-missing cells into a Series of strings"""
+        return pd.Series(df.to_numpy().ravel(), dtype=object).dropna().astype(str)
     
     def identify_statement_type(self, df: pd.DataFrame) -> str:
         """Determine if a table is an income statement, balance sheet, or cash flow statement"""
@@ -100,28 +328,80 @@ class FinancialTableExtractor:
             return "unknown"
     
     def clean_financial_table(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Clean and standardize a financial table"""
+        """Clean and standardize a financial table in one vectorized pass.
+        
+        Every amount cell becomes a float: parentheses and minus signs make
+        it negative, currency symbols, thousands separators and trailing
+        footnote markers are dropped, a lone dash is zero, and an
+        "in millions/thousands/billions" caption scales it (except per-share
+        and percentage rows). Value columns with nothing but amounts come
+        back as float64; columns that also hold text (captions, years) keep
+        that text in place. Footnote markers are stripped from labels.
+        """
         try:
-            # Make a copy to avoid modifying the original
-            df = df.copy()
-            
-            # Remove empty rows and columns
+            # Remove empty rows and columns, counting blank strings as empty
+            df = df.replace(r'^\s*$', np.nan, regex=True)
             df = df.dropna(how='all').dropna(axis=1, how='all')
+            if df.shape[0] == 0 or df.shape[1] < 2:
+                return df
             
-            # Replace common financial formatting
-            for col in df.columns:
-                if df[col].dtype == object:  # Only process string columns
-                    df[col] = df[col].astype(str)
-                    # Remove parentheses for negative numbers and convert to actual negatives
-                    df[col] = df[col].str.replace(r'\\((.*?)\\)', r'-\\1', regex=True)
-                    # Remove $ and , characters
-                    df[col] = df[col].str.replace('$', '', regex=False).str.replace(',', '', regex=False)
-            
-            # Try to convert appropriate columns to numeric
-            for col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='ignore')
-                
-            return df
+            labels = df.iloc[:, 0].astype(object).where(df.iloc[:, 0].notna(), None)
+            label_text = labels.fillna('').astype(str)
+            scale = self.detect_scale(df)
+            
+            # All value cells as one flat Series of strings, parsed by a single regex pass
+            values = df.iloc[:, 1:]
+            flat = values.to_numpy(dtype=object).ravel()
+            blank = pd.isna(flat)
+            text = pd.Series(flat, dtype=object).where(~blank, '').astype(str)
+            
+            parts = text.str.extract(self._amount_pattern, flags=re.IGNORECASE)
+            amounts = pd.to_numeric(parts[3].str.replace(',', '', regex=False), errors='coerce').to_numpy(dtype=float)
+            negative = (parts[1].notna() | parts[2].notna()).to_numpy()
+            amounts = np.where(negative, -amounts, amounts)
+            amounts[text.str.match(self._zero_pattern).to_numpy()] = 0.0
+            
+            # Years are left as text so period headers survive
+            amounts[text.str.match(self._year_pattern).to_numpy()] = np.nan
+            
+            if scale != 1:
+                unscaled = label_text.str.contains(self._unscaled_row_pattern, case=False, regex=True).to_numpy()
+                row_scale = np.where(unscaled, 1.0, scale)
+                amounts = amounts * np.repeat(row_scale, values.shape[1])
+            
+            shape = values.shape
+            amounts = amounts.reshape(shape)
+            is_text = (~blank & np.isnan(amounts.ravel())).reshape(shape)
+            
+            # Built by position, since extracted headers may repeat
+            cleaned = [label_text.str.replace(self._label_footnote_pattern, '', regex=True)
+                       .where(labels.notna(), None).to_numpy(dtype=object)]
+            for position in range(shape[1]):
+                if is_text[:, position].any():
+                    # Mixed column: amounts where parsed, original text elsewhere
+                    column_values = values.iloc[:, position].astype(object).to_numpy().copy()
+                    parsed = ~np.isnan(amounts[:, position])
+                    column_values[parsed] = amounts[parsed, position]
+                    column_values[blank.reshape(shape)[:, position]] = np.nan
+                    cleaned.append(column_values)
+                else:
+                    cleaned.append(amounts[:, position])
+            
+            result = pd.DataFrame(dict(enumerate(cleaned)), index=df.index)
+            result.columns = df.columns
+            # Amounts are in full units now; keep the caption's unit for reference
+            result.attrs['scale'] = scale
+            return result
         except Exception as e:
             print(f"Error cleaning table: {e}")
-            return df  # Return original on error
\ No newline at end of file
+            return df  # Return original on error
+    
+    def detect_scale(self, df: pd.DataFrame) -> float:
+        """Multiplier from an "in thousands/millions/billions" caption in the headers or first rows"""
+        caption = ' '.join(
+            [str(column) for column in df.columns] +
+            [str(cell) for cell in df.head(3).to_numpy().ravel() if not pd.isna(cell)]
+        ).lower()
+        
+        match = self._scale_pattern.search(caption)
+        return self.scales[match.group(1)] if match else 1.0
@@ -0,0 +1,217 @@
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+import hashlib
+import json
+import pickle
+import time
+
+# Name of the pseudo-stage holding the pipeline's input file
+SOURCE = "source"
+
+# Output hash standing in for an optional stage that failed
+FAILED_HASH = "failed"
+
+
+class Stage(NamedTuple):
+    """One step of an ingest pipeline.
+
+    `run(document_id, *inputs)` receives the outputs of the stages named in
+    `inputs`, in order. Bump `version` when the stage's code changes so
+    artifacts built by the old code are invalidated. `keep(output)` may
+    still accept an artifact that only the version bump invalidated, so it
+    is carried over instead of rebuilt. An `inline` stage runs on the thread
+    that called StagePipeline.run rather than on the pool, e.g. because it
+    relies on SIGALRM, which only the main thread receives. An `optional`
+    stage that fails doesn't fail the run: stages reading it get None, and
+    nothing is stored, so the next run tries it again.
+    """
+    name: str
+    inputs: Tuple[str, ...]
+    run: Callable[..., Any]
+    version: str = "1"
+    keep: Optional[Callable[[Any], bool]] = None
+    inline: bool = False
+    optional: bool = False
+
+
+def file_sha256(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """Content hash of a file, read in fixed-size chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class StagePipeline:
+    """Run a graph of stages, persisting each stage's output as a hashed artifact.
+
+    A stage's input hash covers its name, version and the output hashes of
+    the stages it reads, so a stored artifact is reused only while nothing
+    upstream has changed. Re-running a document therefore resumes at the
+    first stage that is missing or invalidated. Stages whose inputs are ready
+    run concurrently on a thread pool (the heavy work is in PyTorch, pdfplumber
+    and Postgres, which release the GIL).
+
+    Each stage's state (pending, running, reused, complete, failed) is kept in
+    the document's processing progress, next to any unit counts the stage
+    reports itself.
+    """
+
+    def __init__(self, stages: List[Stage], db, max_workers: int = 3):
+        self.stages = {stage.name: stage for stage in stages}
+        self.db = db
+        self.max_workers = max_workers
+        # Seconds spent in each stage that actually ran during the last run()
+        self.timings = {}
+
+        for stage in stages:
+            unknown = [name for name in stage.inputs if name != SOURCE and name not in self.stages]
+            if unknown:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stages: {unknown}")
+
+    def run(self, document_id: int, source_path: str) -> Dict[str, Any]:
+        """Run every stage that is not already up to date and return all outputs"""
+        outputs = {SOURCE: source_path}
+        hashes = {SOURCE: file_sha256(source_path)}
+        stored = self.db.get_stage_artifacts(document_id)
+        self.db.reset_processing_progress(document_id, list(self.stages))
+
+        pending = dict(self.stages)
+        running = {}
+        inline = []
+        error = None
+        self.timings = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                # After a failure, stages that don't depend on the failed one
+                # still run, so their artifacts are kept for the next attempt
+                self._schedule(document_id, pending, running, inline, outputs, hashes, stored, pool)
+
+                # Pool stages keep running while inline ones run here
+                while inline:
+                    future, stage, inputs = inline.pop(0)
+                    try:
+                        future.set_result(self._timed(stage, document_id, inputs))
+                    except Exception as e:
+                        future.set_exception(e)
+
+                if not running:
+                    if pending and error is None:
+                        raise ValueError(f"Stages with unsatisfiable inputs: {sorted(pending)}")
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, input_hash, data_hash = running.pop(future)
+                    try:
+                        output, seconds = future.result()
+                    except Exception as e:
+                        print(f"Stage '{stage.name}' failed for document {document_id}: {e}")
+                        self._mark(document_id, stage.name, 'failed', error=str(e))
+                        if stage.optional:
+                            outputs[stage.name] = None
+                            hashes[stage.name] = FAILED_HASH
+                        else:
+                            error = error or e
+                        continue
+
+                    outputs[stage.name] = output
+                    hashes[stage.name] = self._save(document_id, stage, input_hash, data_hash, output)
+                    self.timings[stage.name] = seconds
+                    self._mark(document_id, stage.name, 'complete', duration_seconds=round(seconds, 3))
+
+        if error is not None:
+            raise error
+
+        return outputs
+
+    def _schedule(self, document_id, pending, running, inline, outputs, hashes, stored, pool):
+        """Start every stage whose inputs are ready, reusing up-to-date artifacts"""
+        progress = True
+        while progress:
+            progress = False
+
+            for name, stage in list(pending.items()):
+                if not all(dependency in hashes for dependency in stage.inputs):
+                    continue
+
+                del pending[name]
+                progress = True
+                input_hash = self._input_hash(stage, hashes)
+
+                cached = self._load(stored.get(name), input_hash)
+                if cached is None and stage.keep is not None:
+                    cached = self._carry_over(document_id, stage, stored.get(name), input_hash, hashes)
+                if cached is not None:
+                    outputs[name], hashes[name] = cached
+                    self._mark(document_id, name, 'reused')
+                    continue
+
+                inputs = [outputs[dependency] for dependency in stage.inputs]
+                self._mark(document_id, name, 'running')
+                if stage.inline:
+                    future = Future()
+                    inline.append((future, stage, inputs))
+                else:
+                    future = pool.submit(self._timed, stage, document_id, inputs)
+                running[future] = (stage, input_hash, self._data_hash(stage, hashes))
+
+    def _timed(self, stage: Stage, document_id: int, inputs: List[Any]):
+        started = time.perf_counter()
+        output = stage.run(document_id, *inputs)
+        return output, time.perf_counter() - started
+
+    def _mark(self, document_id: int, stage: str, state: str, **fields):
+        self.db.update_processing_progress(document_id, stage, dict(fields, state=state, updated_at=time.time()))
+
+    def _input_hash(self, stage: Stage, hashes: Dict[str, str]) -> str:
+        key = {
+            "stage": stage.name,
+            "version": stage.version,
+            "inputs": {dependency: hashes[dependency] for dependency in stage.inputs},
+        }
+        return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _data_hash(self, stage: Stage, hashes: Dict[str, str]) -> str:
+        """Like the input hash, but without the stage version"""
+        key = {
+            "stage": stage.name,
+            "inputs": {dependency: hashes[dependency] for dependency in stage.inputs},
+        }
+        return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _carry_over(self, document_id: int, stage: Stage, artifact: Dict[str, Any], input_hash: str,
+                    hashes: Dict[str, str]):
+        """Reuse an artifact from an older stage version if its inputs match and `keep` accepts it"""
+        if not artifact or artifact.get("data_hash") != self._data_hash(stage, hashes):
+            return None
+
+        cached = self._load(artifact, artifact["input_hash"])
+        if cached is None or not stage.keep(cached[0]):
+            return None
+
+        # Store it under the new version so the next run takes the fast path
+        output, output_hash = cached
+        self.db.store_stage_artifact(document_id, stage.name, input_hash, output_hash,
+                                     bytes(artifact["artifact"]), artifact["data_hash"])
+        return output, output_hash
+
+    def _load(self, artifact: Dict[str, Any], input_hash: str):
+        """Return (output, output_hash) for a valid stored artifact, else None"""
+        if not artifact or artifact["input_hash"] != input_hash:
+            return None
+
+        payload = bytes(artifact["artifact"])
+        # A truncated or altered artifact is rebuilt rather than trusted
+        if hashlib.sha256(payload).hexdigest() != artifact["output_hash"]:
+            return None
+
+        return pickle.loads(payload), artifact["output_hash"]
+
+    def _save(self, document_id: int, stage: Stage, input_hash: str, data_hash: str, output: Any) -> str:
+        payload = pickle.dumps(output, protocol=pickle.HIGHEST_PROTOCOL)
+        output_hash = hashlib.sha256(payload).hexdigest()
+        self.db.store_stage_artifact(document_id, stage.name, input_hash, output_hash, payload, data_hash)
+        return output_hash
@@ -0,0 +1,74 @@
+import threading
+from collections import deque
+from typing import Any, Callable, List, Sequence
+
+
+class _Request:
+    def __init__(self, items: List[Any]):
+        self.items = items
+        self.results = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class BatchingQueue:
+    """Coalesce concurrent calls of a batch function into shared calls.
+
+    `fn` maps a list of items to a list of results of the same length. When
+    several threads (e.g. pipelines of different documents) call the queue
+    at once, the first becomes the leader and runs `fn` on everything
+    queued, up to `max_items` per call, until the queue is empty; the others
+    just wait for their results. Items queue up while the model is busy, so
+    batches fill without any added delay, and `fn` never runs concurrently.
+    """
+
+    def __init__(self, fn: Callable[[List[Any]], List[Any]], max_items: int = 64):
+        self.fn = fn
+        self.max_items = max_items
+        self._queue = deque()
+        self._running = False
+        self._lock = threading.Lock()
+
+    def __call__(self, items: Sequence[Any]) -> List[Any]:
+        if not items:
+            return []
+
+        request = _Request(list(items))
+        with self._lock:
+            self._queue.append(request)
+            lead = not self._running
+            self._running = True
+
+        if lead:
+            self._drain()
+
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.results
+
+    def _drain(self):
+        while True:
+            with self._lock:
+                if not self._queue:
+                    self._running = False
+                    return
+
+                batch = [self._queue.popleft()]
+                size = len(batch[0].items)
+                while self._queue and size + len(self._queue[0].items) <= self.max_items:
+                    size += len(self._queue[0].items)
+                    batch.append(self._queue.popleft())
+
+            try:
+                results = self.fn([item for request in batch for item in request.items])
+                start = 0
+                for request in batch:
+                    request.results = results[start:start + len(request.items)]
+                    start += len(request.items)
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+
+            for request in batch:
+                request.done.set()
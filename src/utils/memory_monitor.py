@@ -0,0 +1,72 @@
+import os
+import threading
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def current_rss_mb() -> Optional[float]:
+    """Resident set size of this process in MB, or None if it can't be read"""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+
+    if resource is not None:
+        # ru_maxrss is a lifetime high-water mark (KB on Linux, bytes on macOS)
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss / (1024 * 1024) if max_rss > 1 << 32 else max_rss / 1024
+
+    return None
+
+
+class MemoryPeakMonitor:
+    """Sample process RSS on a background thread and keep the peak.
+
+    Unlike ru_maxrss this covers only the monitored block, so each ingest
+    gets its own figure even in a long-running worker.
+    """
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.start_mb = None
+        self.peak_mb = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start_mb = current_rss_mb()
+        self.peak_mb = self.start_mb
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        self._record(current_rss_mb())
+        return False
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self._record(current_rss_mb())
+
+    def _record(self, rss_mb: Optional[float]):
+        if rss_mb is not None and (self.peak_mb is None or rss_mb > self.peak_mb):
+            self.peak_mb = rss_mb
+
+    def report(self) -> dict:
+        """Peak and growth over the monitored block, in MB"""
+        growth = None
+        if self.peak_mb is not None and self.start_mb is not None:
+            growth = round(self.peak_mb - self.start_mb, 1)
+        return {
+            'start_rss_mb': round(self.start_mb, 1) if self.start_mb is not None else None,
+            'peak_rss_mb': round(self.peak_mb, 1) if self.peak_mb is not None else None,
+            'peak_growth_mb': growth,
+        }
@@ -1,7 +1,11 @@
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 import numpy as np
-from typing import Dict, Any, List, Optional
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
 
 class PgVectorDB:
     def __init__(self, host='localhost', port='5433', # Use 5433 for Docker, 5432 for local
@@ -14,6 +18,17 @@ class PgVectorDB:
             'password': password
         }
     
+    @classmethod
+    def from_env(cls) -> 'PgVectorDB':
+        """Build a client from DB_* environment variables, defaulting to the Docker setup."""
+        return cls(
+            host=os.environ.get('DB_HOST', 'localhost'),
+            port=os.environ.get('DB_PORT', '5433'),
+            dbname=os.environ.get('DB_NAME', 'my_project_db'),
+            user=os.environ.get('DB_USER', 'postgres'),
+            password=os.environ.get('DB_PASSWORD', 'postgres')
+        )
+    
     def get_connection(self):
         """Establish a connection to the PostgreSQL database."""
         try:
@@ -103,15 +118,26 @@ class PgVectorDB:
             vector_str = f"[{','.join(str(x) for x in query_embedding)}]"
             
             cursor = conn.cursor()
+            # Rank on embeddings alone, then slice the text of the top
+            # matches out of their sections; older chunks carry their own text
             cursor.execute(
                 """
-                SELECT dc.chunk_text, dc.document_id, d.title, 
-                       de.embedding <-> %s::vector AS distance
-                FROM document_embeddings de
-                JOIN document_chunks dc ON de.chunk_id = dc.id
+                SELECT COALESCE(
+                           dc.chunk_text,
+                           ds.section_name || ': ' || substr(ds.section_text, dc.start_offset + 1,
+                                                              dc.end_offset - dc.start_offset)
+                       ) AS chunk_text,
+                       dc.document_id, d.title, nearest.distance
+                FROM (
+                    SELECT de.chunk_id, de.embedding <-> %s::vector AS distance
+                    FROM document_embeddings de
+                    ORDER BY distance ASC
+                    LIMIT %s
+                ) AS nearest
+                JOIN document_chunks dc ON nearest.chunk_id = dc.id
                 JOIN documents d ON dc.document_id = d.id
-                ORDER BY distance ASC
-                LIMIT %s;
+                LEFT JOIN document_sections ds ON dc.section_id = ds.id
+                ORDER BY nearest.distance ASC;
                 """,
                 (vector_str, limit)
             )
@@ -182,6 +208,56 @@ class PgVectorDB:
             print(f"Error updating document: {e}")
             return False
         
+    def replace_analysis_result(self, document_id: int, analysis_type: str, analysis_result: str) -> Optional[int]:
+        """Store an analysis, deleting earlier ones of the same type in the same transaction."""
+        conn = self.get_connection()
+        if not conn:
+            return None
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "DELETE FROM document_analyses WHERE document_id = %s AND analysis_type = %s;",
+                (document_id, analysis_type)
+            )
+            cursor.execute(
+                "INSERT INTO document_analyses (document_id, analysis_type, analysis_result) VALUES (%s, %s, %s) RETURNING id;",
+                (document_id, analysis_type, analysis_result)
+            )
+            analysis_id = cursor.fetchone()['id']
+            conn.commit()
+            return analysis_id
+        except Exception as e:
+            conn.rollback()
+            print(f"Error replacing analysis result: {e}")
+            return None
+        finally:
+            conn.close()
+    
+    def get_latest_analysis_result(self, document_id: int, analysis_type: str) -> Optional[Dict[str, Any]]:
+        """Get the most recent analysis of one type for a document."""
+        conn = self.get_connection()
+        if not conn:
+            return None
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT * FROM document_analyses
+                WHERE document_id = %s AND analysis_type = %s
+                ORDER BY id DESC
+                LIMIT 1;
+                """,
+                (document_id, analysis_type)
+            )
+            return cursor.fetchone()
+        except Exception as e:
+            print(f"Error getting analysis result: {e}")
+            return None
+        finally:
+            conn.close()
+    
     def get_analysis_results(self, document_id: int, analysis_type: str = None) -> List[Dict[str, Any]]:
         """Get analysis results for a document."""
         conn = self.get_connection()
@@ -210,134 +286,1094 @@ class PgVectorDB:
         except Exception as e:
             print(f"Error getting analysis results: {e}")
             return []
-
-def update_processing_status(self, document_id: int, status: str, message: str = None, error: str = None) -> bool:
-    """Update document processing status and add to history."""
-    try:
-        # Update document status
-        query = """
-            UPDATE documents 
-            SET 
-                processing_status = %s, 
-                processing_message = %s,
-                processing_error = %s,
-                processing_completed_at = CASE WHEN %s = 'complete' OR %s = 'error' THEN NOW() ELSE NULL END
-            WHERE id = %s
+    
+    def store_section_generation(self, document_id: int,
+                                 parts: Iterable[Tuple[str, str]]) -> Optional[List[Dict[str, Any]]]:
+        """Store a document's section text as a new generation of document_sections rows.
+        
+        `parts` yields (section_name, text) in document order; a long section
+        may come as several parts. Each part is inserted as it arrives, so the
+        text is never held all at once, and blank parts are skipped. Earlier
+        generations stay in place, with the chunks pointing into them, until
+        a reconcile retires them (see chunk_changes). If the text is the same
+        as the newest generation's, nothing is written and that generation is
+        returned. Returns the rows (id, section_name, position, section_hash,
+        generation) holding the text, or None on failure.
         """
-        self.cursor.execute(query, (status, message, error, status, status, document_id))
+        conn = self.get_connection()
+        if not conn:
+            return None
+        
+        try:
+            cursor = conn.cursor()
+            # One writer per document, so generation numbers don't collide
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext('document_sections'), %s);", (document_id,))
+            previous = self._section_rows(cursor, document_id)
+            generation = previous[0]['generation'] + 1 if previous else 1
+            
+            rows = []
+            for section_name, section_text in parts:
+                if not section_text.strip():
+                    continue
+                cursor.execute(
+                    """
+                    INSERT INTO document_sections
+                        (document_id, section_name, position, section_text, section_hash, generation)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    RETURNING id, section_name, position, section_hash, generation;
+                    """,
+                    (document_id, section_name, len(rows), section_text,
+                     hashlib.sha256(section_text.encode('utf-8')).hexdigest(), generation)
+                )
+                rows.append(dict(cursor.fetchone()))
+            
+            if previous and ([(row['section_name'], row['section_hash']) for row in rows] ==
+                             [(row['section_name'], row['section_hash']) for row in previous]):
+                # Unchanged text keeps its rows, and the chunks pointing into them
+                conn.rollback()
+                return previous
+            
+            conn.commit()
+            return rows
+        except Exception as e:
+            conn.rollback()
+            print(f"Error storing document sections: {e}")
+            return None
+        finally:
+            conn.close()
+    
+    def _section_rows(self, cursor, document_id: int) -> List[Dict[str, Any]]:
+        cursor.execute(
+            """
+            SELECT id, section_name, position, section_hash, generation
+            FROM document_sections
+            WHERE document_id = %s
+              AND generation = (SELECT MAX(generation) FROM document_sections WHERE document_id = %s)
+            ORDER BY position;
+            """,
+            (document_id, document_id)
+        )
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def get_section_parts(self, document_id: int) -> Optional[List[Dict[str, Any]]]:
+        """Rows of a document's newest section generation, in order and without their text; None on failure."""
+        conn = self.get_connection()
+        if not conn:
+            return None
+        
+        try:
+            return self._section_rows(conn.cursor(), document_id)
+        except Exception as e:
+            print(f"Error getting section parts: {e}")
+            return None
+        finally:
+            conn.close()
+    
+    def get_section_text(self, section_id: int) -> Optional[str]:
+        """Text of one document_sections row."""
+        conn = self.get_connection()
+        if not conn:
+            return None
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT section_text FROM document_sections WHERE id = %s;", (section_id,))
+            result = cursor.fetchone()
+            return result['section_text'] if result else None
+        except Exception as e:
+            print(f"Error getting section text: {e}")
+            return None
+        finally:
+            conn.close()
+    
+    def get_document_sections(self, document_id: int, section_names: List[str] = None) -> Dict[str, str]:
+        """Get the sections of a document's newest section generation, in order.
         
-        # Add to processing history
-        history_query = """
-            INSERT INTO processing_history (document_id, status, message, error)
-            VALUES (%s, %s, %s, %s)
+        With `section_names`, only those sections are read.
         """
-        self.cursor.execute(history_query, (document_id, status, message, error))
-        
-        self.conn.commit()
-        return True
-    except Exception as e:
-        print(f"Error updating processing status: {str(e)}")
-        self.conn.rollback()
-        return False
-
-def get_processing_status(self, document_id: int) -> Dict[str, Any]:
-    """Get current processing status for a document."""
-    try:
-        query = """
-            SELECT 
-                processing_status,
-                processing_message,
-                processing_error,
-                processing_started_at,
-                processing_completed_at
-            FROM 
-                documents
-            WHERE 
-                id = %s
+        conn = self.get_connection()
+        if not conn:
+            return {}
+        
+        try:
+            cursor = conn.cursor()
+            name_filter = "AND section_name = ANY(%s)" if section_names else ""
+            params = [document_id, document_id] + ([list(section_names)] if section_names else [])
+            cursor.execute(
+                f"""
+                SELECT section_name, section_text
+                FROM document_sections
+                WHERE document_id = %s
+                  AND generation = (SELECT MAX(generation) FROM document_sections WHERE document_id = %s)
+                  {name_filter}
+                ORDER BY position
+                """,
+                params
+            )
+            sections = {}
+            for row in cursor.fetchall():
+                sections[row['section_name']] = sections.get(row['section_name'], '') + row['section_text']
+            return sections
+        except Exception as e:
+            print(f"Error getting document sections: {e}")
+            return {}
+        finally:
+            conn.close()
+    
+    def _insert_chunks(self, cursor, document_id: int, chunks: List[Dict[str, Any]]):
+        chunk_rows = execute_values(
+            cursor,
+            """
+            INSERT INTO document_chunks
+                (document_id, chunk_text, chunk_index, section_id, start_offset, end_offset,
+                 section_name, section_hash, chunker_config, text_hash)
+            VALUES %s RETURNING id;
+            """,
+            [
+                (document_id, chunk.get('chunk_text'), chunk['chunk_index'], chunk.get('section_id'),
+                 chunk.get('start_offset'), chunk.get('end_offset'), chunk.get('section_name'),
+                 chunk.get('section_hash'), chunk.get('chunker_config'), chunk.get('text_hash'))
+                for chunk in chunks
+            ],
+            fetch=True
+        )
+        
+        # Rows come back in insertion order, so they line up with the chunks
+        execute_values(
+            cursor,
+            "INSERT INTO document_embeddings (chunk_id, embedding) VALUES %s;",
+            [
+                (row['id'], f"[{','.join(str(x) for x in chunk['embedding'])}]")
+                for row, chunk in zip(chunk_rows, chunks)
+            ]
+        )
+    
+    def get_chunk_fingerprints(self, document_id: int) -> List[Dict[str, Any]]:
+        """Get the provenance of a document's chunks, without their text or embeddings."""
+        conn = self.get_connection()
+        if not conn:
+            return []
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT id, chunk_index, section_id, start_offset, end_offset,
+                       section_name, section_hash, chunker_config, text_hash
+                FROM document_chunks
+                WHERE document_id = %s
+                ORDER BY chunk_index;
+                """,
+                (document_id,)
+            )
+            return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            print(f"Error getting chunk fingerprints: {e}")
+            return []
+        finally:
+            conn.close()
+    
+    @contextmanager
+    def chunk_changes(self, document_id: int) -> Iterator['ChunkChanges']:
+        """Apply a reconcile's chunk writes to a document in one transaction.
+        
+        Writes can be made in batches as they are produced; nobody sees any
+        of them until the block exits, and if it raises they are all rolled
+        back. Unlike most methods here this raises on failure, so a partial
+        reconcile can't pass for a finished one.
         """
-        self.cursor.execute(query, (document_id,))
-        result = self.cursor.fetchone()
+        conn = self.get_connection()
+        if not conn:
+            raise RuntimeError("Could not connect to the database")
+        
+        try:
+            yield ChunkChanges(self, conn.cursor(), document_id)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    
+    def get_document_ids(self) -> List[int]:
+        """Get the ids of all documents, oldest first."""
+        conn = self.get_connection()
+        if not conn:
+            return []
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id FROM documents ORDER BY id;")
+            return [row['id'] for row in cursor.fetchall()]
+        except Exception as e:
+            print(f"Error getting document ids: {e}")
+            return []
+        finally:
+            conn.close()
+
+    def update_processing_status(self, document_id: int, status: str, message: str = None, error: str = None) -> bool:
+        """Update document processing status and add to history."""
+        conn = self.get_connection()
+        if not conn:
+            return False
         
-        if not result:
+        try:
+            cursor = conn.cursor()
+            
+            # Update document status
+            cursor.execute(
+                """
+                UPDATE documents 
+                SET 
+                    processing_status = %s, 
+                    processing_message = %s,
+                    processing_error = %s,
+                    processing_completed_at = CASE WHEN %s = 'complete' OR %s = 'error' THEN NOW() ELSE NULL END
+                WHERE id = %s
+                """,
+                (status, message, error, status, status, document_id)
+            )
+            
+            # Add to processing history
+            cursor.execute(
+                """
+                INSERT INTO processing_history (document_id, status, message, error)
+                VALUES (%s, %s, %s, %s)
+                """,
+                (document_id, status, message, error)
+            )
+            
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"Error updating processing status: {e}")
+            return False
+        finally:
+            conn.close()
+    
+    def get_processing_status(self, document_id: int) -> Optional[Dict[str, Any]]:
+        """Get current processing status for a document."""
+        conn = self.get_connection()
+        if not conn:
             return None
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT 
+                    processing_status,
+                    processing_message,
+                    processing_error,
+                    processing_started_at,
+                    processing_completed_at,
+                    processing_progress
+                FROM 
+                    documents
+                WHERE 
+                    id = %s
+                """,
+                (document_id,)
+            )
+            result = cursor.fetchone()
             
-        return {
-            "status": result[0],
-            "message": result[1],
-            "error": result[2],
-            "started_at": result[3],
-            "completed_at": result[4]
-        }
-    except Exception as e:
-        print(f"Error getting processing status: {str(e)}")
-        return None
-
-def get_document_history(self, limit: int = 10, offset: int = 0) -> List[Dict[str, Any]]:
-    """Get history of document processing."""
-    try:
-        query = """
-            SELECT 
-                d.id, 
-                d.title, 
-                d.file_type, 
-                d.created_at,
-                d.processing_status,
-                d.content
-            FROM 
-                documents d
-            ORDER BY 
-                d.created_at DESC
-            LIMIT %s OFFSET %s
-        """
-        self.cursor.execute(query, (limit, offset))
-        results = self.cursor.fetchall()
-        
-        history = []
-        for row in results:
-            history.append({
-                "id": row[0],
-                "title": row[1],
-                "file_type": row[2],
-                "created_at": row[3],
-                "processing_status": row[4],
-                "content": row[5]
-            })
+            if not result:
+                return None
             
-        return history
-    except Exception as e:
-        print(f"Error getting document history: {str(e)}")
-        return []
-
-def get_document(self, document_id: int) -> Dict[str, Any]:
-    """Get document by ID."""
-    try:
-        query = """
-            SELECT 
-                id, 
-                title, 
-                content, 
-                file_type, 
-                created_at,
-                processing_status
-            FROM 
-                documents
-            WHERE 
-                id = %s
+            return {
+                "status": result['processing_status'],
+                "message": result['processing_message'],
+                "error": result['processing_error'],
+                "started_at": result['processing_started_at'],
+                "completed_at": result['processing_completed_at'],
+                "progress": result['processing_progress']
+            }
+        except Exception as e:
+            print(f"Error getting processing status: {e}")
+            return None
+        finally:
+            conn.close()
+    
+    def get_document_version(self, document_id: int) -> Optional[str]:
+        """Version of a document's derived results, or None while it is not fully processed.
+        
+        Every reprocess clears processing_completed_at and sets it again when
+        it finishes, so the version changes whenever the results may have.
+        Documents stored before completion times were kept use created_at.
         """
-        self.cursor.execute(query, (document_id,))
-        result = self.cursor.fetchone()
+        conn = self.get_connection()
+        if not conn:
+            return None
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT COALESCE(processing_completed_at, created_at) AS completed_at
+                FROM documents
+                WHERE id = %s AND processing_status = 'complete'
+                """,
+                (document_id,)
+            )
+            result = cursor.fetchone()
+            
+            if not result or result['completed_at'] is None:
+                return None
+            
+            return result['completed_at'].isoformat()
+        except Exception as e:
+            print(f"Error getting document version: {e}")
+            return None
+        finally:
+            conn.close()
+    
+    def get_document_history(self, limit: int = 10, offset: int = 0) -> List[Dict[str, Any]]:
+        """Get history of document processing."""
+        conn = self.get_connection()
+        if not conn:
+            return []
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT 
+                    d.id, 
+                    d.title, 
+                    d.file_type, 
+                    d.created_at,
+                    d.processing_status,
+                    s.section_names,
+                    -- Filings ingested before document_sections only have their sections as JSON here
+                    CASE WHEN cardinality(s.section_names) = 0 THEN d.content END AS content
+                FROM 
+                    documents d
+                CROSS JOIN LATERAL (
+                    SELECT ARRAY(
+                        SELECT ds.section_name
+                        FROM document_sections ds
+                        WHERE ds.document_id = d.id
+                          AND ds.generation = (SELECT MAX(generation) FROM document_sections WHERE document_id = d.id)
+                        GROUP BY ds.section_name
+                        ORDER BY MIN(ds.position)
+                    ) AS section_names
+                ) s
+                ORDER BY 
+                    d.created_at DESC
+                LIMIT %s OFFSET %s
+                """,
+                (limit, offset)
+            )
+            return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            print(f"Error getting document history: {e}")
+            return []
+        finally:
+            conn.close()
+    
+    def get_document(self, document_id: int) -> Optional[Dict[str, Any]]:
+        """Get document by ID."""
+        conn = self.get_connection()
+        if not conn:
+            return None
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT 
+                    id, 
+                    title, 
+                    content, 
+                    file_type, 
+                    created_at,
+                    processing_status
+                FROM 
+                    documents
+                WHERE 
+                    id = %s
+                """,
+                (document_id,)
+            )
+            result = cursor.fetchone()
+            return dict(result) if result else None
+        except Exception as e:
+            print(f"Error getting document: {e}")
+            return None
+        finally:
+            conn.close()
+    
+    def enqueue_job(self, job_type: str, payload: Dict[str, Any], document_id: int = None,
+                    max_attempts: int = 5) -> Optional[int]:
+        """Add a job to the durable job queue and return its id."""
+        conn = self.get_connection()
+        if not conn:
+            return None
         
-        if not result:
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                INSERT INTO jobs (job_type, document_id, payload, max_attempts)
+                VALUES (%s, %s, %s, %s) RETURNING id;
+                """,
+                (job_type, document_id, json.dumps(payload), max_attempts)
+            )
+            job_id = cursor.fetchone()['id']
+            conn.commit()
+            return job_id
+        except Exception as e:
+            conn.rollback()
+            print(f"Error enqueuing job: {e}")
+            return None
+        finally:
+            conn.close()
+    
+    def enqueue_unique_job(self, job_type: str, payload: Dict[str, Any], document_id: int,
+                           max_attempts: int = 5) -> Optional[int]:
+        """Queue a job unless one of the same type is already queued or running for the document.
+        
+        Returns the id of the new or the existing job. A transaction-level
+        advisory lock on (job type, document) keeps concurrent callers, in any
+        process, from both inserting.
+        """
+        conn = self.get_connection()
+        if not conn:
             return None
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s), %s);", (job_type, document_id))
             
-        return {
-            "id": result[0],
-            "title": result[1],
-            "content": result[2],
-            "file_type": result[3],
-            "created_at": result[4],
-            "processing_status": result[5]
-        }
-    except Exception as e:
-        print(f"Error getting document: {str(e)}")
-        return None
\ No newline at end of file
+            cursor.execute(
+                """
+                SELECT id FROM jobs
+                WHERE job_type = %s AND document_id = %s AND status IN ('queued', 'running')
+                ORDER BY id
+                LIMIT 1;
+                """,
+                (job_type, document_id)
+            )
+            existing = cursor.fetchone()
+            if existing:
+                conn.commit()
+                return existing['id']
+            
+            cursor.execute(
+                """
+                INSERT INTO jobs (job_type, document_id, payload, max_attempts)
+                VALUES (%s, %s, %s, %s) RETURNING id;
+                """,
+                (job_type, document_id, json.dumps(payload), max_attempts)
+            )
+            job_id = cursor.fetchone()['id']
+            conn.commit()
+            return job_id
+        except Exception as e:
+            conn.rollback()
+            print(f"Error enqueuing job: {e}")
+            return None
+        finally:
+            conn.close()
+    
+    def get_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Get the state of a queued job."""
+        conn = self.get_connection()
+        if not conn:
+            return None
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT id, job_type, document_id, status, attempts, max_attempts,
+                       last_error, created_at, updated_at
+                FROM jobs
+                WHERE id = %s;
+                """,
+                (job_id,)
+            )
+            result = cursor.fetchone()
+            return dict(result) if result else None
+        except Exception as e:
+            print(f"Error getting job: {e}")
+            return None
+        finally:
+            conn.close()
+    
+    def claim_job(self, worker_id: str, visibility_timeout: int,
+                  job_types: List[str] = None) -> Optional[Dict[str, Any]]:
+        """Claim the next runnable job for a worker, or return None.
+        
+        A job is runnable when it is queued and due, or when it is running but
+        its lease ran out (the worker died). SKIP LOCKED lets any number of
+        workers poll the same table without blocking on each other's rows.
+        """
+        conn = self.get_connection()
+        if not conn:
+            return None
+        
+        try:
+            cursor = conn.cursor()
+            
+            # Expired leases with no attempts left go to the dead-letter state
+            cursor.execute(
+                """
+                UPDATE jobs
+                SET status = 'dead',
+                    last_error = COALESCE(last_error, 'Visibility timeout expired'),
+                    locked_by = NULL,
+                    locked_until = NULL,
+                    updated_at = NOW()
+                WHERE status = 'running' AND locked_until < NOW() AND attempts >= max_attempts
+                RETURNING id, document_id, payload, last_error;
+                """
+            )
+            dead_documents = {}
+            for row in cursor.fetchall():
+                print(f"Job {row['id']} moved to dead-letter after its last lease expired")
+                # Batch jobs list their documents in the payload
+                document_ids = [row['document_id']] if row['document_id'] else [
+                    document['document_id'] for document in (row['payload'] or {}).get('documents', [])
+                ]
+                for document_id in document_ids:
+                    dead_documents[document_id] = row['last_error']
+            
+            # Nobody is left to report on those documents, so fail them here;
+            # finished ones (a batch's done files, a dead TLDR job) stay as they are
+            for document_id, error in dead_documents.items():
+                cursor.execute(
+                    """
+                    UPDATE documents
+                    SET processing_status = 'error',
+                        processing_message = 'Processing failed after all retries',
+                        processing_error = %s,
+                        processing_completed_at = NOW()
+                    WHERE id = %s AND processing_status <> 'complete'
+                    RETURNING id;
+                    """,
+                    (error, document_id)
+                )
+                if cursor.fetchone():
+                    cursor.execute(
+                        """
+                        INSERT INTO processing_history (document_id, status, message, error)
+                        VALUES (%s, 'error', 'Processing failed after all retries', %s)
+                        """,
+                        (document_id, error)
+                    )
+            
+            cursor.execute(
+                """
+                UPDATE jobs
+                SET status = 'running',
+                    attempts = attempts + 1,
+                    locked_by = %s,
+                    locked_until = NOW() + %s * INTERVAL '1 second',
+                    updated_at = NOW()
+                WHERE id = (
+                    SELECT id FROM jobs
+                    WHERE ((status = 'queued' AND run_after <= NOW())
+                           OR (status = 'running' AND locked_until < NOW()))
+                      AND (%s::text[] IS NULL OR job_type = ANY(%s::text[]))
+                    ORDER BY run_after, id
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT 1
+                )
+                RETURNING *;
+                """,
+                (worker_id, visibility_timeout, job_types, job_types)
+            )
+            job = cursor.fetchone()
+            conn.commit()
+            return dict(job) if job else None
+        except Exception as e:
+            conn.rollback()
+            print(f"Error claiming job: {e}")
+            return None
+        finally:
+            conn.close()
+    
+    def extend_job_lease(self, job_id: int, worker_id: str, visibility_timeout: int) -> Optional[bool]:
+        """Push a running job's lease forward.
+        
+        Returns False if the worker no longer holds the lease, and None if the
+        database couldn't be reached, in which case the lease may still be held.
+        """
+        conn = self.get_connection()
+        if not conn:
+            return None
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                UPDATE jobs
+                SET locked_until = NOW() + %s * INTERVAL '1 second', updated_at = NOW()
+                WHERE id = %s AND locked_by = %s AND status = 'running';
+                """,
+                (visibility_timeout, job_id, worker_id)
+            )
+            extended = cursor.rowcount == 1
+            conn.commit()
+            return extended
+        except Exception as e:
+            conn.rollback()
+            print(f"Error extending job lease: {e}")
+            return None
+        finally:
+            conn.close()
+    
+    def complete_job(self, job_id: int, worker_id: str) -> bool:
+        """Mark a job as complete if the worker still holds its lease."""
+        conn = self.get_connection()
+        if not conn:
+            return False
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                UPDATE jobs
+                SET status = 'complete', locked_by = NULL, locked_until = NULL, updated_at = NOW()
+                WHERE id = %s AND locked_by = %s AND status = 'running';
+                """,
+                (job_id, worker_id)
+            )
+            completed = cursor.rowcount == 1
+            conn.commit()
+            return completed
+        except Exception as e:
+            conn.rollback()
+            print(f"Error completing job: {e}")
+            return False
+        finally:
+            conn.close()
+    
+    def fail_job(self, job_id: int, worker_id: str, error: str, retry_delay: float) -> Optional[str]:
+        """Record a failed attempt.
+        
+        The job is queued again after retry_delay seconds, or moved to the
+        'dead' state once it has used all its attempts. Returns the new status.
+        """
+        conn = self.get_connection()
+        if not conn:
+            return None
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                UPDATE jobs
+                SET status = CASE WHEN attempts >= max_attempts THEN 'dead' ELSE 'queued' END,
+                    run_after = NOW() + %s * INTERVAL '1 second',
+                    last_error = %s,
+                    locked_by = NULL,
+                    locked_until = NULL,
+                    updated_at = NOW()
+                WHERE id = %s AND locked_by = %s
+                RETURNING status;
+                """,
+                (retry_delay, error, job_id, worker_id)
+            )
+            row = cursor.fetchone()
+            conn.commit()
+            return row['status'] if row else None
+        except Exception as e:
+            conn.rollback()
+            print(f"Error failing job: {e}")
+            return None
+        finally:
+            conn.close()
+    
+    def delete_analysis_results(self, document_id: int, analysis_type: str) -> bool:
+        """Delete stored analyses of one type, before they are replaced."""
+        conn = self.get_connection()
+        if not conn:
+            return False
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "DELETE FROM document_analyses WHERE document_id = %s AND analysis_type = %s;",
+                (document_id, analysis_type)
+            )
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"Error deleting analysis results: {e}")
+            return False
+        finally:
+            conn.close()
+    
+    def get_stage_artifacts(self, document_id: int) -> Dict[str, Dict[str, Any]]:
+        """Get the stored pipeline artifacts of a document, keyed by stage name."""
+        conn = self.get_connection()
+        if not conn:
+            return {}
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT stage, input_hash, data_hash, output_hash, artifact
+                FROM stage_artifacts
+                WHERE document_id = %s;
+                """,
+                (document_id,)
+            )
+            return {row['stage']: dict(row) for row in cursor.fetchall()}
+        except Exception as e:
+            print(f"Error getting stage artifacts: {e}")
+            return {}
+        finally:
+            conn.close()
+    
+    def store_stage_artifact(self, document_id: int, stage: str, input_hash: str,
+                             output_hash: str, artifact: bytes, data_hash: Optional[str] = None) -> bool:
+        """Store (or replace) the artifact a pipeline stage produced for a document."""
+        conn = self.get_connection()
+        if not conn:
+            return False
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                INSERT INTO stage_artifacts (document_id, stage, input_hash, data_hash, output_hash, artifact)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON CONFLICT (document_id, stage) DO UPDATE
+                SET input_hash = EXCLUDED.input_hash,
+                    data_hash = EXCLUDED.data_hash,
+                    output_hash = EXCLUDED.output_hash,
+                    artifact = EXCLUDED.artifact,
+                    created_at = NOW();
+                """,
+                (document_id, stage, input_hash, data_hash, output_hash, psycopg2.Binary(artifact))
+            )
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"Error storing stage artifact: {e}")
+            return False
+        finally:
+            conn.close()
+    
+    def reset_processing_progress(self, document_id: int, stages: List[str]) -> bool:
+        """Start a new progress record with every stage pending."""
+        conn = self.get_connection()
+        if not conn:
+            return False
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE documents SET processing_progress = %s WHERE id = %s;",
+                (json.dumps({stage: {'state': 'pending'} for stage in stages}), document_id)
+            )
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"Error resetting processing progress: {e}")
+            return False
+        finally:
+            conn.close()
+    
+    def update_processing_progress(self, document_id: int, stage: str, fields: Dict[str, Any]) -> bool:
+        """Merge fields into one stage's progress entry, leaving other stages untouched."""
+        conn = self.get_connection()
+        if not conn:
+            return False
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                UPDATE documents
+                SET processing_progress = jsonb_set(
+                    COALESCE(processing_progress, '{}'::jsonb),
+                    ARRAY[%s],
+                    COALESCE(processing_progress -> %s, '{}'::jsonb) || %s::jsonb
+                )
+                WHERE id = %s;
+                """,
+                (stage, stage, json.dumps(fields), document_id)
+            )
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"Error updating processing progress: {e}")
+            return False
+        finally:
+            conn.close()
+    
+    def register_documents(self, documents: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Insert documents by content hash in one statement, skipping known hashes.
+        
+        Each document needs 'title', 'file_type' and 'file_hash'. Returns
+        {file_hash: {'id', 'processing_status', 'created'}} for new and
+        existing rows, so callers can tell finished documents from ones to
+        (re)process.
+        """
+        if not documents:
+            return {}
+        
+        conn = self.get_connection()
+        if not conn:
+            return {}
+        
+        try:
+            cursor = conn.cursor()
+            created = execute_values(
+                cursor,
+                """
+                INSERT INTO documents (title, content, file_type, file_hash, processing_status)
+                VALUES %s
+                ON CONFLICT (file_hash) DO NOTHING
+                RETURNING file_hash;
+                """,
+                [(doc['title'], '', doc['file_type'], doc['file_hash'], 'queued') for doc in documents],
+                fetch=True
+            )
+            created = {row['file_hash'] for row in created}
+            cursor.execute(
+                "SELECT id, file_hash, processing_status FROM documents WHERE file_hash = ANY(%s);",
+                ([doc['file_hash'] for doc in documents],)
+            )
+            registered = {
+                row['file_hash']: {
+                    'id': row['id'],
+                    'processing_status': row['processing_status'],
+                    'created': row['file_hash'] in created
+                }
+                for row in cursor.fetchall()
+            }
+            conn.commit()
+            return registered
+        except Exception as e:
+            conn.rollback()
+            print(f"Error registering documents: {e}")
+            return {}
+        finally:
+            conn.close()
+    
+    def create_upload_batch(self, files: List[Dict[str, Any]]) -> Optional[int]:
+        """Record the files of one batch upload; each needs 'document_id' and 'filename'."""
+        conn = self.get_connection()
+        if not conn:
+            return None
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO upload_batches DEFAULT VALUES RETURNING id;")
+            batch_id = cursor.fetchone()['id']
+            execute_values(
+                cursor,
+                "INSERT INTO upload_batch_documents (batch_id, position, document_id, filename) VALUES %s;",
+                [(batch_id, position, file['document_id'], file['filename']) for position, file in enumerate(files)]
+            )
+            conn.commit()
+            return batch_id
+        except Exception as e:
+            conn.rollback()
+            print(f"Error creating upload batch: {e}")
+            return None
+        finally:
+            conn.close()
+    
+    def get_upload_batch(self, batch_id: int) -> Optional[Dict[str, Any]]:
+        """Get a batch upload with the processing status of each of its files."""
+        conn = self.get_connection()
+        if not conn:
+            return None
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, created_at FROM upload_batches WHERE id = %s;", (batch_id,))
+            batch = cursor.fetchone()
+            if not batch:
+                return None
+            
+            cursor.execute(
+                """
+                SELECT ubd.filename, d.id AS document_id, d.title,
+                       d.processing_status, d.processing_message, d.processing_error, d.processing_progress
+                FROM upload_batch_documents ubd
+                JOIN documents d ON ubd.document_id = d.id
+                WHERE ubd.batch_id = %s
+                ORDER BY ubd.position;
+                """,
+                (batch_id,)
+            )
+            return {
+                'id': batch['id'],
+                'created_at': batch['created_at'],
+                'documents': [dict(row) for row in cursor.fetchall()]
+            }
+        except Exception as e:
+            print(f"Error getting upload batch: {e}")
+            return None
+        finally:
+            conn.close()
+    
+    # Columns of financial_facts returned by get_financial_facts, in order
+    FINANCIAL_FACT_COLUMNS = ('document_id', 'company', 'cik', 'statement', 'line_item',
+                              'period', 'fiscal_year', 'fiscal_quarter', 'value')
+    
+    def replace_financial_facts(self, document_id: int, facts: List[Dict[str, Any]],
+                                company: str = None, cik: str = None) -> bool:
+        """Replace a document's rows in financial_facts.
+        
+        Each fact needs 'statement', 'line_item', 'period', 'fiscal_year',
+        'fiscal_quarter' and 'value'.
+        """
+        conn = self.get_connection()
+        if not conn:
+            return False
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM financial_facts WHERE document_id = %s;", (document_id,))
+            if facts:
+                execute_values(
+                    cursor,
+                    """
+                    INSERT INTO financial_facts (document_id, company, cik, statement, line_item,
+                                                 period, fiscal_year, fiscal_quarter, value)
+                    VALUES %s;
+                    """,
+                    [
+                        (document_id, company, cik, fact['statement'], fact['line_item'], fact['period'],
+                         fact['fiscal_year'], fact['fiscal_quarter'], fact['value'])
+                        for fact in facts
+                    ]
+                )
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"Error storing financial facts: {e}")
+            return False
+        finally:
+            conn.close()
+    
+    def get_financial_facts(self, document_ids: List[int] = None, companies: List[str] = None,
+                            ciks: List[str] = None, statements: List[str] = None,
+                            line_items: List[str] = None, year_from: int = None, year_to: int = None,
+                            limit: int = 100000) -> Dict[str, List[Any]]:
+        """Get matching financial facts as columns: {column: [one value per fact]}.
+        
+        The columns are aggregated into arrays by Postgres, so the result is
+        a single row however many facts match. Facts are ordered by company,
+        period, document, statement and line item; empty filters match all.
+        """
+        filters = [
+            ("document_id = ANY(%s)", document_ids),
+            ("company = ANY(%s)", companies),
+            ("cik = ANY(%s)", ciks),
+            ("statement = ANY(%s)", statements),
+            ("line_item = ANY(%s)", line_items),
+            ("fiscal_year >= %s", year_from),
+            ("fiscal_year <= %s", year_to),
+        ]
+        conditions = [condition for condition, value in filters if value]
+        params = [list(value) if isinstance(value, (list, tuple)) else value for _, value in filters if value]
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        columns = self.FINANCIAL_FACT_COLUMNS
+        aggregates = ', '.join(f"array_agg({column} ORDER BY fact_order) AS {column}" for column in columns)
+        
+        conn = self.get_connection()
+        if not conn:
+            return {column: [] for column in columns}
+        
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"""
+                SELECT {aggregates}
+                FROM (
+                    SELECT *, row_number() OVER (
+                        ORDER BY company, fiscal_year, fiscal_quarter NULLS LAST, document_id, statement, line_item
+                    ) AS fact_order
+                    FROM financial_facts
+                    {where}
+                    ORDER BY fact_order
+                    LIMIT %s
+                ) facts;
+                """,
+                params + [limit]
+            )
+            row = cursor.fetchone()
+            # array_agg over no rows is NULL
+            return {column: row[column] or [] for column in columns}
+        except Exception as e:
+            print(f"Error getting financial facts: {e}")
+            return {column: [] for column in columns}
+        finally:
+            conn.close()
+
+
+class ChunkChanges:
+    """Chunk writes of one reconcile, made inside the transaction of PgVectorDB.chunk_changes"""
+    
+    def __init__(self, db: PgVectorDB, cursor, document_id: int):
+        self.db = db
+        self.cursor = cursor
+        self.document_id = document_id
+    
+    def insert(self, chunks: List[Dict[str, Any]]):
+        """Store chunks and their embeddings.
+        
+        Each chunk needs 'chunk_index' and 'embedding', plus either
+        'chunk_text' or 'section_id', 'start_offset' and 'end_offset' locating
+        its text in document_sections. It may also carry 'section_name',
+        'section_hash', 'chunker_config' and 'text_hash'.
+        """
+        if chunks:
+            self.db._insert_chunks(self.cursor, self.document_id, chunks)
+    
+    def update(self, rows: List[Dict[str, Any]]):
+        """Point existing chunks at new text; rows need 'id' and the fields of an inserted section chunk"""
+        if not rows:
+            return
+        
+        execute_values(
+            self.cursor,
+            """
+            UPDATE document_chunks AS dc
+            SET chunk_text = NULL,
+                chunk_index = v.chunk_index,
+                section_id = v.section_id,
+                start_offset = v.start_offset,
+                end_offset = v.end_offset,
+                section_name = v.section_name,
+                section_hash = v.section_hash,
+                chunker_config = v.chunker_config
+            FROM (VALUES %s) AS v(id, chunk_index, section_id, start_offset, end_offset,
+                                  section_name, section_hash, chunker_config)
+            WHERE dc.id = v.id;
+            """,
+            [
+                (row['id'], row['chunk_index'], row['section_id'], row['start_offset'],
+                 row['end_offset'], row['section_name'], row['section_hash'], row['chunker_config'])
+                for row in rows
+            ]
+        )
+    
+    def delete(self, chunk_ids: List[int]):
+        if chunk_ids:
+            # Embeddings go with their chunks (ON DELETE CASCADE)
+            self.cursor.execute("DELETE FROM document_chunks WHERE id = ANY(%s);", (chunk_ids,))
+    
+    def retire_sections(self, generation: int):
+        """Delete the document's section generations older than `generation`"""
+        self.cursor.execute(
+            "DELETE FROM document_sections WHERE document_id = %s AND generation < %s;",
+            (self.document_id, generation)
+        )
@@ -0,0 +1,137 @@
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# processing_progress entry holding the ingest's memory peak rather than a stage
+MEMORY_ENTRY = 'memory'
+
+
+class StageProgress:
+    """Count finished work units for one ingest stage and publish them to the database.
+
+    Counts are merged into the stage's own entry of
+    `documents.processing_progress`, so stages running concurrently don't
+    overwrite each other. Writes are throttled to one per `min_interval`
+    seconds; the last one is always sent.
+    """
+
+    def __init__(self, db, document_id: int, stage: str, unit: str,
+                 total: Optional[int] = None, min_interval: float = 1.0):
+        self.db = db
+        self.document_id = document_id
+        self.stage = stage
+        self.unit = unit
+        self.total = total
+        self.min_interval = min_interval
+
+        self.done = 0
+        self._finished = False
+        self.started_at = time.time()
+        self._last_write = 0.0
+        self._lock = threading.Lock()
+
+        self._write(force=True)
+
+    def set_total(self, total: int):
+        with self._lock:
+            self.total = total
+        self._write(force=True)
+
+    def update(self, done: int, total: Optional[int] = None):
+        """Record an absolute count, e.g. from a callback that reports (done, total)"""
+        with self._lock:
+            self.done = done
+            if total is not None:
+                self.total = total
+        self._write()
+
+    def advance(self, count: int = 1):
+        with self._lock:
+            self.done += count
+        self._write()
+
+    def finish(self):
+        with self._lock:
+            self._finished = True
+            if self.total is None or self.done < self.total:
+                self.total = self.done
+        self._write(force=True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current counts, throughput and ETA for this stage"""
+        with self._lock:
+            now = time.time()
+            elapsed = now - self.started_at
+            rate = self.done / elapsed if self.done and elapsed > 0 else None
+
+            eta_seconds = None
+            if rate and self.total is not None:
+                eta_seconds = round(max(self.total - self.done, 0) / rate, 1)
+
+            return {
+                'state': 'complete' if self._finished else 'running',
+                'unit': self.unit,
+                'done': self.done,
+                'total': self.total,
+                'rate_per_second': round(rate, 3) if rate else None,
+                'eta_seconds': eta_seconds,
+                'started_at': self.started_at,
+                'updated_at': now,
+            }
+
+    def _write(self, force: bool = False):
+        now = time.time()
+        finished = self.total is not None and self.done >= self.total
+        if not (force or finished) and now - self._last_write < self.min_interval:
+            return
+        self._last_write = now
+        self.db.update_processing_progress(self.document_id, self.stage, self.snapshot())
+
+
+def summarize_progress(progress: Optional[Dict[str, Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """Combine per-stage progress into an overall percentage and ETA.
+
+    Finished and reused stages count as complete, running stages by their
+    done/total units and pending stages as zero. Stages run concurrently, so
+    the ETA is that of the slowest running stage, counted down by the time
+    since it last reported; stages that have not started yet are not
+    included. The ingest's memory peak, once recorded, is passed through.
+    Returns None when nothing has been reported.
+    """
+    stages = {name: stage for name, stage in (progress or {}).items() if name != MEMORY_ENTRY}
+    if not stages:
+        return None
+
+    now = time.time()
+    fractions = []
+    eta_seconds = None
+    seconds_since_update = None
+
+    for stage in stages.values():
+        state = stage.get('state')
+        total = stage.get('total')
+        done = stage.get('done', 0)
+
+        if state in ('complete', 'reused'):
+            fractions.append(1.0)
+            continue
+
+        fractions.append(min(done / total, 1.0) if total else 0.0)
+        if state != 'running':
+            continue
+
+        # Time since the last report of a running stage is what flags a stuck job
+        idle = max(now - stage.get('updated_at', now), 0.0)
+        seconds_since_update = idle if seconds_since_update is None else min(seconds_since_update, idle)
+
+        if stage.get('eta_seconds') is not None:
+            remaining = max(stage['eta_seconds'] - idle, 0.0)
+            eta_seconds = remaining if eta_seconds is None else max(eta_seconds, remaining)
+
+    return {
+        'percent': round(100 * sum(fractions) / len(fractions)),
+        'eta_seconds': round(eta_seconds, 1) if eta_seconds is not None else None,
+        'seconds_since_update': round(seconds_since_update, 1) if seconds_since_update is not None else None,
+        'stages': stages,
+        'memory': progress.get(MEMORY_ENTRY),
+    }
@@ -0,0 +1,174 @@
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, List, Optional
+
+from .utils.pgvector_db import PgVectorDB
+
+# Job types understood by the worker
+JOB_PROCESS_SEC_FILING = "process_sec_filing"
+JOB_PROCESS_DOCUMENT = "process_document"
+JOB_PROCESS_STANDARD_DOCUMENT = "process_standard_document"
+JOB_PROCESS_BATCH = "process_batch"
+JOB_CREATE_EXTENDED_TLDR = "create_extended_tldr"
+
+# Seconds between lease renewals while the database can't be reached
+HEARTBEAT_RETRY_INTERVAL = 5.0
+
+
+class JobWorker:
+    """Run queued ingest jobs from the Postgres `jobs` table.
+
+    Each worker process claims one job at a time and keeps its lease alive
+    from a heartbeat thread while the job runs. If the process dies, the
+    lease expires and another worker picks the job up again. Start as many
+    workers as needed, on any host that can reach the database and the
+    upload directory.
+    """
+
+    def __init__(self, db: PgVectorDB = None, ml_manager=None, worker_id: str = None,
+                 poll_interval: float = 2.0, visibility_timeout: int = 300,
+                 retry_base_delay: float = 30.0, retry_max_delay: float = 3600.0):
+        self.db = db or PgVectorDB.from_env()
+        self._ml_manager = ml_manager
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+
+        self._stopping = False
+
+        self.handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {
+            JOB_PROCESS_SEC_FILING: self._process_sec_filing,
+            JOB_PROCESS_DOCUMENT: self._process_document,
+            JOB_PROCESS_STANDARD_DOCUMENT: self._process_standard_document,
+            JOB_PROCESS_BATCH: self._process_batch,
+            JOB_CREATE_EXTENDED_TLDR: self._create_extended_tldr,
+        }
+
+    @property
+    def ml_manager(self):
+        """Load the models once per worker, on the first job that needs them"""
+        if self._ml_manager is None:
+            from .models.ml_manager import MLManager
+            self._ml_manager = MLManager()
+        return self._ml_manager
+
+    def run_forever(self):
+        """Poll for jobs until SIGINT/SIGTERM; the current job is allowed to finish"""
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        print(f"Worker {self.worker_id} started")
+
+        while not self._stopping:
+            if not self.run_once():
+                time.sleep(self.poll_interval)
+
+        print(f"Worker {self.worker_id} stopped")
+
+    def run_once(self) -> bool:
+        """Claim and run a single job. Returns False if there was nothing to do."""
+        job = self.db.claim_job(self.worker_id, self.visibility_timeout, list(self.handlers))
+        if not job:
+            return False
+
+        print(f"Worker {self.worker_id} running job {job['id']} ({job['job_type']}), attempt {job['attempts']}")
+
+        # Jobs run on the main thread, where the pipeline's inline tables
+        # stage can use SIGALRM for its per-page budget (batch documents run
+        # on threads and fall back to a killable child process per page);
+        # the lease is renewed from a background thread
+        stop_heartbeat = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job['id'], stop_heartbeat), daemon=True)
+        heartbeat.start()
+
+        try:
+            self.handlers[job['job_type']](job['payload'])
+        except Exception as e:
+            traceback.print_exc()
+            self._handle_failure(job, e)
+        else:
+            self.db.complete_job(job['id'], self.worker_id)
+        finally:
+            stop_heartbeat.set()
+            heartbeat.join()
+
+        return True
+
+    def retry_delay(self, attempts: int) -> float:
+        """Exponential backoff: base, 2 x base, 4 x base, ... capped at retry_max_delay"""
+        return min(self.retry_base_delay * 2 ** max(attempts - 1, 0), self.retry_max_delay)
+
+    def _handle_failure(self, job: Dict[str, Any], error: Exception):
+        status = self.db.fail_job(job['id'], self.worker_id, str(error), self.retry_delay(job['attempts']))
+
+        for document_id in self._job_document_ids(job):
+            if status == 'dead':
+                self.db.update_processing_status(
+                    document_id=document_id,
+                    status="error",
+                    message="Processing failed after all retries",
+                    error=str(error)
+                )
+            elif status == 'queued':
+                self.db.update_processing_status(
+                    document_id=document_id,
+                    status="queued",
+                    message=f"Retrying after error (attempt {job['attempts']} of {job['max_attempts']})",
+                    error=str(error)
+                )
+
+    def _job_document_ids(self, job: Dict[str, Any]) -> List[int]:
+        """Documents a failed job leaves unfinished"""
+        if job['job_type'] == JOB_CREATE_EXTENDED_TLDR:
+            # The document itself is finished; /extended-tldr reports the failure
+            return []
+
+        if job.get('document_id'):
+            return [job['document_id']]
+
+        # Batch jobs list their documents in the payload; some may be done
+        document_ids = []
+        for document in job['payload'].get('documents', []):
+            status = self.db.get_processing_status(document['document_id'])
+            if not status or status['status'] != 'complete':
+                document_ids.append(document['document_id'])
+        return document_ids
+
+    def _heartbeat(self, job_id: int, stop: threading.Event):
+        # Renew well before the lease runs out
+        renew_interval = self.visibility_timeout / 3
+        interval = renew_interval
+        while not stop.wait(interval):
+            extended = self.db.extend_job_lease(job_id, self.worker_id, self.visibility_timeout)
+            if extended is False:
+                print(f"Worker {self.worker_id} lost the lease on job {job_id}")
+                return
+
+            # A database error says nothing about the lease, so keep trying,
+            # sooner than usual; only a renewal that matches no row ends it
+            interval = renew_interval if extended else min(renew_interval, HEARTBEAT_RETRY_INTERVAL)
+
+    def _request_stop(self, signum, frame):
+        print(f"Worker {self.worker_id} stopping after the current job")
+        self._stopping = True
+
+    def _process_sec_filing(self, payload: Dict[str, Any]):
+        self.ml_manager.process_sec_filing_background(payload['file_path'], payload['document_id'])
+
+    def _process_document(self, payload: Dict[str, Any]):
+        self.ml_manager.process_document_background(payload['document_id'])
+
+    def _process_standard_document(self, payload: Dict[str, Any]):
+        self.ml_manager.process_standard_document_background(payload['file_path'], payload['document_id'])
+
+    def _process_batch(self, payload: Dict[str, Any]):
+        self.ml_manager.process_batch_background(payload['documents'])
+
+    def _create_extended_tldr(self, payload: Dict[str, Any]):
+        self.ml_manager.create_extended_tldr_background(payload['document_id'])